@@ -0,0 +1,267 @@
+"""
+Offline benchmark of a full review on synthetic repositories.
+
+A scripted fake LLM client (canned plans, configurable latency) stands in for
+Groq, so the run needs no network or API key. For each diff size the benchmark
+generates a git repository and reviews its head commit. It reports wall time
+per graph node, diff read/parse time, prompt sizes, iterations and peak memory.
+
+    python benchmarks/review_graph.py                          # all sizes
+    python benchmarks/review_graph.py --sizes small,large --out run.json
+    python benchmarks/review_graph.py --compare baseline.json  # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "src"))
+
+from pr_review_agent.agent.graph import compiled_workflow  # noqa: E402
+from pr_review_agent.agent.orchestrator import ReviewOrchestrator, build_review_request  # noqa: E402
+from pr_review_agent.prompts.builder import estimate_tokens  # noqa: E402
+from pr_review_agent.schemas import ModelSettings  # noqa: E402
+
+# name -> (changed lines, changed files)
+SIZES: Dict[str, Tuple[int, int]] = {
+    "tiny": (10, 1),
+    "small": (200, 10),
+    "medium": (2_000, 100),
+    "large": (10_000, 500),
+    "xlarge": (50_000, 2_000),
+}
+
+# Tool rounds the fake planner asks for before it is ready to review; all run offline
+DEFAULT_PLANS: List[List[Dict[str, Any]]] = [
+    [{"name": "explore_workspace", "args": {"repo_root": "{repo}"}}],
+    [
+        {"name": "run_command", "args": {"command": "git log --oneline -5", "repo_root": "{repo}"}},
+        {"name": "run_command", "args": {"command": "git status --short", "repo_root": "{repo}"}},
+    ],
+]
+
+PLUS_FILE = re.compile(r"^\+\+\+ b/(\S+)", re.MULTILINE)
+HUNK_START = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)", re.MULTILINE)
+
+
+class FakeGroqClient:
+    """
+    Scripted stand-in for `GroqClient`. Planning calls return `plans` in order and
+    then an empty plan; review calls return one comment for each of the first
+    files in the prompt's diff. Every call sleeps `latency` seconds plus
+    `latency_per_1k_tokens` per thousand prompt tokens.
+    """
+
+    def __init__(self, repo: str, plans: List[List[Dict[str, Any]]], latency: float = 0.05, latency_per_1k_tokens: float = 0.0):
+        self.models = ["fake-model"]
+        self.plans = [json.loads(json.dumps(plan).replace("{repo}", repo)) for plan in plans]
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.calls: List[Dict[str, Any]] = []
+        self._plan_calls = 0
+
+    def chat_completion(self, messages: List[Dict[str, str]], json_mode: bool = True, temperature: float = 0.1, validate: Any = None) -> str:
+        prompt = messages[-1]["content"]
+        tokens = estimate_tokens(prompt)
+        time.sleep(self.latency + self.latency_per_1k_tokens * tokens / 1000)
+        if "Planning Agent" in prompt:
+            kind = "plan"
+            plan = self.plans[self._plan_calls] if self._plan_calls < len(self.plans) else []
+            self._plan_calls += 1
+            response = json.dumps({"reasoning": "scripted", "hypotheses": ["scripted"], "tools": plan})
+        else:
+            kind = "review"
+            response = json.dumps(_canned_review(prompt))
+        self.calls.append({"kind": kind, "prompt_chars": len(prompt), "prompt_tokens": tokens})
+        return response
+
+    async def achat_completion(self, messages: List[Dict[str, str]], json_mode: bool = True, temperature: float = 0.1, validate: Any = None) -> str:
+        return self.chat_completion(messages, json_mode, temperature)
+
+    def stream_chat_completion(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.1, validate: Any = None) -> Iterator[str]:
+        yield self.chat_completion(messages, json_mode, temperature)
+
+
+def _canned_review(prompt: str, max_comments: int = 5) -> Dict[str, Any]:
+    files = PLUS_FILE.findall(prompt)[:max_comments]
+    starts = HUNK_START.findall(prompt)
+    comments = [
+        {"file": path, "start_line": int(starts[i]) if i < len(starts) else 1, "end_line": None,
+         "severity": "low", "message": f"Scripted comment on {path}"}
+        for i, path in enumerate(files)
+    ]
+    return {"summary": [f"Scripted review of {len(files)} file(s)"], "comments": comments}
+
+
+def make_repo(path: str, lines: int, files: int) -> None:
+    """
+    Create a repository whose `base..head` diff touches `files` files with about
+    `lines` added lines in total, in one hunk per 20 added lines.
+    """
+    def git(*args: str) -> None:
+        subprocess.run(["git", "-C", path, *args], check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "user.email", "bench@example.com")
+    git("config", "user.name", "bench")
+    per_file = max(1, lines // files)
+    for i in range(files):
+        module = os.path.join(path, "src", f"pkg_{i // 50}", f"mod_{i}.py")
+        os.makedirs(os.path.dirname(module), exist_ok=True)
+        with open(module, "w") as f:
+            f.writelines(f"def base_{i}_{n}(x):\n    return x + {n}\n\n" for n in range((per_file + 19) // 20 + 1))
+    git("add", "-A")
+    git("commit", "-q", "-m", "base")
+    git("tag", "base")
+
+    for i in range(files):
+        module = os.path.join(path, "src", f"pkg_{i // 50}", f"mod_{i}.py")
+        with open(module) as f:
+            original = f.read().split("\n\n")
+        added = [f"    total_{i}_{n} = x * {n}" for n in range(per_file)]
+        # Interleave blocks of 20 new lines with the unchanged functions
+        blocks = [added[k:k + 20] for k in range(0, len(added), 20)]
+        out = []
+        for k, function in enumerate(original):
+            out.append(function)
+            if k < len(blocks):
+                out.append(f"def new_{i}_{k}(x):\n" + "\n".join(blocks[k]) + "\n    return x")
+        with open(module, "w") as f:
+            f.write("\n\n".join(out))
+    git("add", "-A")
+    git("commit", "-q", "-m", "head")
+
+
+def run_size(name: str, lines: int, files: int, args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        os.makedirs(repo)
+        make_repo(repo, lines, files)
+        settings = ModelSettings(model="fake-model", max_iters=args.max_iters, tool_cache=False)
+        client = FakeGroqClient(repo, DEFAULT_PLANS[:args.tool_rounds], args.latency_ms / 1000, args.latency_ms_per_1k_tokens / 1000)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        request = build_review_request(repo, "commit-range", "base", "HEAD", settings)
+        read_s = time.perf_counter() - start
+        assert request is not None, "synthetic repo has no diff"
+
+        start = time.perf_counter()
+        orchestrator = ReviewOrchestrator(request, client)
+        setup_s = time.perf_counter() - start
+
+        # Nodes run one at a time, so the gap between two updates is the node's wall time
+        node_s: Dict[str, float] = defaultdict(float)
+        node_runs: Dict[str, int] = defaultdict(int)
+        final: Dict[str, Any] = {}
+        start = last = time.perf_counter()
+        for chunk in orchestrator.graph.workflow.stream(orchestrator.initial_state, stream_mode="updates"):
+            now = time.perf_counter()
+            for node, update in chunk.items():
+                node_s[node] += now - last
+                node_runs[node] += 1
+                final.update(update)
+            last = now
+        graph_s = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    review = final.get("review_draft")
+    plan_prompts = [c["prompt_tokens"] for c in client.calls if c["kind"] == "plan"]
+    review_prompts = [c["prompt_tokens"] for c in client.calls if c["kind"] == "review"]
+    return {
+        "size": name,
+        "diff_lines": lines,
+        "diff_files": files,
+        "diff_bytes": len(request.diff),
+        "read_diff_s": round(read_s, 4),
+        "setup_s": round(setup_s, 4),
+        "graph_s": round(graph_s, 4),
+        "node_s": {node: round(seconds, 4) for node, seconds in node_s.items()},
+        "node_runs": dict(node_runs),
+        "iterations": final.get("iteration", 0),
+        "llm_calls": len(client.calls),
+        "plan_prompt_tokens": {"max": max(plan_prompts, default=0), "total": sum(plan_prompts)},
+        "review_prompt_tokens": {"max": max(review_prompts, default=0), "total": sum(review_prompts)},
+        "review_shards": review.metadata.get("review_shards", 1) if review else None,
+        "comments": len(review.comments) if review else 0,
+        "peak_traced_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, max_ratio: float, slack_s: float) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["size"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["size"])
+        if before is None:
+            continue
+        for metric in ("read_diff_s", "setup_s", "graph_s"):
+            if result[metric] > before[metric] * max_ratio and result[metric] > before[metric] + slack_s:
+                regressions.append(f"{result['size']}.{metric}: {result[metric]} s (baseline {before[metric]} s)")
+        if result["peak_traced_mb"] > before["peak_traced_mb"] * max_ratio and result["peak_traced_mb"] > before["peak_traced_mb"] + 1:
+            regressions.append(f"{result['size']}.peak_traced_mb: {result['peak_traced_mb']} (baseline {before['peak_traced_mb']})")
+        for metric in ("plan_prompt_tokens", "review_prompt_tokens"):
+            if result[metric]["max"] > before[metric]["max"] * max_ratio:
+                regressions.append(f"{result['size']}.{metric}.max: {result[metric]['max']} (baseline {before[metric]['max']})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Comma-separated sizes: {', '.join(SIZES)}")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake LLM latency per call")
+    parser.add_argument("--latency-ms-per-1k-tokens", type=float, default=0.0, help="Extra fake latency per 1k prompt tokens")
+    parser.add_argument("--tool-rounds", type=int, default=len(DEFAULT_PLANS), help=f"Scripted tool rounds (0-{len(DEFAULT_PLANS)})")
+    parser.add_argument("--max-iters", type=int, default=7)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON; exit 1 on regressions")
+    parser.add_argument("--max-ratio", type=float, default=1.25, help="Allowed slowdown/growth against the baseline")
+    parser.add_argument("--slack-s", type=float, default=0.05, help="Timing differences below this are never regressions")
+    args = parser.parse_args()
+
+    # Compile outside the measured runs so the first size doesn't pay for it
+    compiled_workflow()
+    results = []
+    for name in args.sizes.split(","):
+        lines, files = SIZES[name.strip()]
+        result = run_size(name.strip(), lines, files, args)
+        results.append(result)
+        print(f"{name:>7}: graph {result['graph_s']:.3f}s  nodes {result['node_s']}  "
+              f"peak {result['peak_traced_mb']} MB  llm calls {result['llm_calls']}", file=sys.stderr)
+
+    report: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "latency_ms": args.latency_ms,
+        "results": results,
+    }
+    regressions: Optional[List[str]] = None
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_ratio, args.slack_s)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Cold-start benchmark for the pr-agent CLI.
+
+Each scenario runs in a fresh interpreter several times and the median wall time
+is compared with `startup_baseline.json`. The check fails when a scenario gets
+slower than its baseline by more than the tolerance, or when importing the CLI
+loads a module that should only be imported once there is a diff to review.
+
+    python benchmarks/startup.py              # measure and print a report
+    python benchmarks/startup.py --check      # also fail on regressions
+    python benchmarks/startup.py --update     # re-record the baseline
+    python benchmarks/startup.py --json out.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "startup_baseline.json")
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+# Must not be imported by `import pr_review_agent.cli`
+HEAVY_MODULES = [
+    "langgraph",
+    "langchain_groq",
+    "langchain_community",
+    "langchain_core",
+    "groq",
+    "httpx",
+    "duckduckgo_search",
+]
+
+# A slower run is a regression only past both limits, so timer noise on fast
+# scenarios doesn't fail the check
+DEFAULT_TOLERANCE = 1.3
+DEFAULT_SLACK_MS = 60.0
+
+
+def scenarios(repo: str) -> Dict[str, List[str]]:
+    return {
+        "import": [sys.executable, "-c", "import pr_review_agent.cli"],
+        "help": [sys.executable, "-m", "pr_review_agent.cli", "--help"],
+        "no_changes": [sys.executable, "-m", "pr_review_agent.cli", "review", "--repo-root", repo, "--no-server"],
+    }
+
+
+def measure(command: List[str], runs: int, env: Dict[str, str]) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 1)
+
+
+def import_profile(env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """
+    Run `-X importtime` on the CLI import and return the slowest modules
+    (cumulative microseconds) and any heavy module that got loaded.
+    """
+    code = "import sys, json, pr_review_agent.cli; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, check=True
+    )
+    loaded = json.loads(result.stdout)
+    cumulative = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            cumulative.append((int(parts[1]), parts[2].strip()))
+    cumulative.sort(reverse=True)
+    return {
+        "slowest_us": [{"module": name, "cumulative_us": us} for us, name in cumulative[:top]],
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+    }
+
+
+def make_clean_repo(path: str) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", "-C", path, *args], check=True, capture_output=True)
+    git("init", "-q")
+    git("-c", "user.email=bench@example.com", "-c", "user.name=bench", "commit", "-q", "--allow-empty", "-m", "init")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--check", action="store_true", help="Exit 1 on a regression against the baseline")
+    parser.add_argument("--update", action="store_true", help="Write the measured medians as the new baseline")
+    parser.add_argument("--json", dest="json_out", help="Also write the report to this file")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to report")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC + os.pathsep + env.get("PYTHONPATH", "")
+    # Never hit a running review server or the user's caches
+    env["PR_AGENT_SERVER"] = os.path.join(tempfile.gettempdir(), "pr-agent-bench-no-server.sock")
+
+    with tempfile.TemporaryDirectory() as repo:
+        env["PR_AGENT_CACHE_DIR"] = os.path.join(repo, ".cache")
+        make_clean_repo(repo)
+        # Warm the OS file cache so the first scenario isn't penalized
+        subprocess.run(scenarios(repo)["import"], env=env, check=True)
+        timings = {name: measure(command, args.runs, env) for name, command in scenarios(repo).items()}
+    profile = import_profile(env, args.top)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    slack_ms = baseline.get("slack_ms", DEFAULT_SLACK_MS)
+
+    regressions = []
+    for name, median_ms in timings.items():
+        expected = baseline.get("median_ms", {}).get(name)
+        if expected is not None and median_ms > expected * tolerance and median_ms > expected + slack_ms:
+            regressions.append(f"{name}: {median_ms} ms (baseline {expected} ms)")
+    regressions += [f"heavy module imported at startup: {m}" for m in profile["heavy_loaded"]]
+
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "median_ms": timings,
+        "baseline_ms": baseline.get("median_ms", {}),
+        "regressions": regressions,
+        **profile,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({"tolerance": tolerance, "slack_ms": slack_ms, "median_ms": timings}, f, indent=2)
+            f.write("\n")
+    if args.check and regressions:
+        print("Startup regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,29 @@
-from .schemas import ReviewRequest, ReviewResponse, AgentState
-from .agent.orchestrator import ReviewOrchestrator
-from .agent.client import GroqClient
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .schemas import ReviewRequest, ReviewResponse, AgentState
+    from .agent.orchestrator import ReviewOrchestrator
+    from .agent.client import GroqClient
 
 __all__ = ["ReviewRequest", "ReviewResponse", "AgentState", "ReviewOrchestrator", "GroqClient"]
 
+# Exports are resolved on first access, so importing the package (or the CLI)
+# doesn't load langgraph and the LLM clients
+_LAZY_EXPORTS = {
+    "ReviewRequest": ".schemas",
+    "ReviewResponse": ".schemas",
+    "AgentState": ".schemas",
+    "ReviewOrchestrator": ".agent.orchestrator",
+    "GroqClient": ".agent.client",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 __version__ = "0.1.0"
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+from pydantic import ValidationError
+from ..cache import ToolResultCache
+from ..schemas import BatchItem, ModelSettings
+from ..git import MAX_DIFF_FILE_BYTES, MAX_DIFF_TOTAL_BYTES
+from .client import GroqClient
+from .orchestrator import ReviewOrchestrator, build_review_request
+
+
+def read_manifest(stream: TextIO) -> List[Any]:
+    """
+    Parse a JSONL manifest. Invalid lines are returned as error strings so they
+    show up as failed results instead of aborting the whole batch.
+    """
+    items: List[Any] = []
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(BatchItem(**json.loads(line)))
+        except (ValueError, TypeError, ValidationError) as e:
+            items.append(f"manifest line {number}: {e}")
+    return items
+
+
+class BatchRunner:
+    """
+    Run many reviews in one process. All reviews share one client (connection
+    pool, LLM cache, rate-limit handling) and one tool-result cache; results
+    are streamed to a JSONL sink as each review finishes.
+    """
+
+    def __init__(
+        self,
+        client: GroqClient,
+        settings: ModelSettings,
+        concurrency: int = 4,
+        tool_cache: Optional[ToolResultCache] = None,
+        max_file_bytes: int = MAX_DIFF_FILE_BYTES,
+        max_total_bytes: int = MAX_DIFF_TOTAL_BYTES
+    ):
+        self.client = client
+        self.settings = settings
+        self.concurrency = max(1, concurrency)
+        if tool_cache is None and settings.tool_cache:
+            tool_cache = ToolResultCache(max_bytes=settings.tool_cache_max_mb * 1024 * 1024, ttl=settings.tool_cache_ttl)
+        self.tool_cache = tool_cache
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self._write_lock = threading.Lock()
+
+    def run(self, items: Iterable[Any], out: TextIO) -> Dict[str, Any]:
+        """
+        Review every manifest item and write one JSON line per item to `out`.
+        Returns throughput, failure and latency statistics.
+        """
+        items = list(items)
+        start = time.monotonic()
+        results: List[Dict[str, Any]] = []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pr-agent-batch") as executor:
+            futures = [executor.submit(self.review_one, index, item) for index, item in enumerate(items)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                with self._write_lock:
+                    out.write(json.dumps(result, default=str) + "\n")
+                    out.flush()
+
+        return summarize(results, time.monotonic() - start)
+
+    def review_one(self, index: int, item: Any) -> Dict[str, Any]:
+        """
+        Review a single manifest item. Never raises.
+        """
+        if not isinstance(item, BatchItem):
+            return {"index": index, "status": "error", "error": str(item)}
+
+        result: Dict[str, Any] = {"index": index, **item.model_dump()}
+        start = time.monotonic()
+        try:
+            request = build_review_request(
+                item.repo_root, item.mode, item.base_ref, item.head_ref, self.settings,
+                max_file_bytes=self.max_file_bytes,
+                max_total_bytes=self.max_total_bytes
+            )
+            if request is None:
+                result["status"] = "no_changes"
+            else:
+                response = ReviewOrchestrator(request, self.client, tool_cache=self.tool_cache).run()
+                result["status"] = "ok"
+                result["review"] = response.model_dump()
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+        result["latency_s"] = round(time.monotonic() - start, 3)
+        return result
+
+
+def summarize(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    # Manifest errors never ran, so they have no latency
+    latencies = sorted(r["latency_s"] for r in results if "latency_s" in r)
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "no_changes", "error")}
+    return {
+        "total": len(results),
+        **counts,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_min": round(len(results) / wall_time * 60, 2) if wall_time > 0 else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
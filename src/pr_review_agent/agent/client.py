@@ -1,78 +1,368 @@
-from typing import List, Dict
+import asyncio
+import contextvars
+import itertools
+import sys
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import groq
+import httpx
 from pydantic import SecretStr
 from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
+from langchain_core.runnables import Runnable
 from dotenv import load_dotenv
 from ..config import AgentConfig
+from ..cache import LLMResponseCache
+from ..prompts.builder import estimate_tokens
+from ..tracing import span
+from .router import ModelRouter
 
 load_dotenv()
 
+# (model, temperature, json_mode)
+LLMKey = Tuple[str, float, bool]
+
+# The model and response status of the call in progress, seen by the HTTP response hook
+_current_call: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("pr_agent_llm_call", default=None)
+
+
 class GroqClient:
-    def __init__(self, model: str = "qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant"):
-        self.config = AgentConfig()
+    def __init__(
+        self,
+        model: str = "qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant",
+        max_connections: int = 20,
+        llm_cache: Optional[LLMResponseCache] = None,
+        max_rate_limit_wait: float = 120.0,
+    ):
+        # Replaying recorded responses needs neither network nor an API key
+        self.llm_cache = llm_cache
+        self.config = AgentConfig(require_api_key=not (llm_cache and llm_cache.mode == "replay"))
         # Parse comma-separated models
         self.models = [m.strip() for m in model.split(",")]
         self.current_model_index = 0
         # Initialize with the first model
         self.model = self.models[0]
+        # Routes each call to a model with rate-limit capacity, fed by response headers
+        self.router = ModelRouter(self.models)
+        # Total time a call may spend waiting for a rate-limited model to free up
+        self.max_rate_limit_wait = max_rate_limit_wait
 
-    def _get_llm(self, model: str, temperature: float = 0.1):
-        return ChatGroq(
+        # Long-lived LLM clients, one per (model, temperature, json_mode), all sharing
+        # a single keep-alive connection pool instead of a new TLS session per call.
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        )
+        self._http_client = groq.DefaultHttpxClient(limits=self._limits, event_hooks={"response": [self._on_response]})
+        self._llms: Dict[LLMKey, Runnable] = {}
+        self._lock = threading.Lock()
+        # Async connections are bound to the event loop that opened them, so the
+        # async pool (and the LLMs using it) is kept per running loop.
+        self._async_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[LLMKey, Runnable]]" = weakref.WeakKeyDictionary()
+        self._async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    def _build_llm(self, model: str, temperature: float, json_mode: bool, **clients: Any) -> Runnable:
+        llm: Runnable = ChatGroq(
             model=model,
             api_key=SecretStr(self.config.groq_api_key) if self.config.groq_api_key else None,
-            temperature=temperature
+            temperature=temperature,
+            # The router handles 429s; SDK retries would hit the exhausted model again
+            max_retries=0,
+            **clients
         )
+        if json_mode:
+            llm = llm.bind(response_format={"type": "json_object"})
+        return llm
+
+    def _get_llm(self, model: str, temperature: float = 0.1, json_mode: bool = False) -> Runnable:
+        key = (model, temperature, json_mode)
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                llm = self._build_llm(model, temperature, json_mode, http_client=self._http_client)
+                self._llms[key] = llm
+            return llm
+
+    def _get_async_llm(self, model: str, temperature: float = 0.1, json_mode: bool = False) -> Runnable:
+        loop = asyncio.get_running_loop()
+        key = (model, temperature, json_mode)
+        with self._lock:
+            llms = self._async_llms.setdefault(loop, {})
+            llm = llms.get(key)
+            if llm is None:
+                http_async_client = self._async_http_clients.get(loop)
+                if http_async_client is None:
+                    http_async_client = groq.DefaultAsyncHttpxClient(
+                        limits=self._limits, event_hooks={"response": [self._aon_response]}
+                    )
+                    self._async_http_clients[loop] = http_async_client
+                llm = self._build_llm(model, temperature, json_mode, http_async_client=http_async_client)
+                llms[key] = llm
+            return llm
 
     def chat_completion(
-        self, 
-        messages: List[Dict[str, str]], 
+        self,
+        messages: List[Dict[str, str]],
         json_mode: bool = True,
-        temperature: float = 0.1
+        temperature: float = 0.1,
+        validate: Optional[Callable[[str], Any]] = None
     ) -> str:
         """
         Send a chat completion request to Groq using LangChain with fallback.
+
+        With a response cache, `validate` is called on the response (the caller's
+        parser): the response is only stored if it doesn't raise, and a cached
+        response that raises is dropped and requested again.
+        """
+        cache_key = self._cache_key(messages, json_mode, temperature)
+        cached = self._lookup(cache_key, validate)
+        if cached is not None:
+            return cached
+
+        lc_messages = _to_lc_messages(messages)
+        estimated = _estimate_tokens(messages)
+
+        errors: List[str] = []
+        waited = 0.0
+        attempt = 0
+        while True:
+            # Models with capacity, best first; rate-limited ones are skipped without a request
+            for model in self.router.candidates(estimated):
+                call = {"model": model}
+                token = _current_call.set(call)
+                with span("llm", model=model, attempt=len(errors), estimated_tokens=estimated) as llm_span:
+                    try:
+                        llm = self._get_llm(model, temperature, json_mode)
+                        response = llm.invoke(lc_messages)
+                        _record_usage(llm_span, response)
+                        return self._remember(cache_key, model, str(response.content), validate)
+                    except Exception as e:
+                        if not _is_rate_limit(e):
+                            # Non-rate-limit error (e.g. context length, invalid request) -> Raise immediately
+                            raise e
+                        llm_span.set(status="rate_limited")
+                        self._rate_limited(call, e, errors)
+                    finally:
+                        _current_call.reset(token)
+
+            delay = self._backoff(estimated, attempt, waited, errors)
+            with span("llm:backoff", attempt=attempt):
+                time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        json_mode: bool = False,
+        temperature: float = 0.1,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> Iterator[str]:
+        """
+        Stream a chat completion chunk by chunk, with the same routing, fallback
+        and caching as `chat_completion`. A model is only fallen back from before
+        its first chunk; cached responses arrive as a single chunk.
+        """
+        cache_key = self._cache_key(messages, json_mode, temperature)
+        cached = self._lookup(cache_key, validate)
+        if cached is not None:
+            yield cached
+            return
+
+        lc_messages = _to_lc_messages(messages)
+        estimated = _estimate_tokens(messages)
+
+        errors: List[str] = []
+        waited = 0.0
+        attempt = 0
+        while True:
+            for model in self.router.candidates(estimated):
+                call = {"model": model}
+                token = _current_call.set(call)
+                # Spans until the first chunk: the rest of the stream is paced by the consumer
+                with span("llm", model=model, attempt=len(errors), estimated_tokens=estimated, streamed=True) as llm_span:
+                    try:
+                        chunks = self._get_llm(model, temperature, json_mode).stream(lc_messages)
+                        # The request is sent (and a 429 raised) when the first chunk is pulled
+                        first = next(chunks, None)
+                    except Exception as e:
+                        if not _is_rate_limit(e):
+                            raise e
+                        llm_span.set(status="rate_limited")
+                        self._rate_limited(call, e, errors)
+                        continue
+                    finally:
+                        _current_call.reset(token)
+                    llm_span.set(status="ok")
+
+                parts: List[str] = []
+                for chunk in itertools.chain([first] if first is not None else [], chunks):
+                    # Content-less chunks (usage, tool calls) carry None or a list
+                    text = chunk.content if isinstance(chunk.content, str) else ""
+                    if text:
+                        parts.append(text)
+                        yield text
+                if parts:
+                    # An empty stream is not worth replaying
+                    self._remember(cache_key, model, "".join(parts), validate)
+                return
+
+            delay = self._backoff(estimated, attempt, waited, errors)
+            with span("llm:backoff", attempt=attempt):
+                time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        json_mode: bool = True,
+        temperature: float = 0.1,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> str:
+        """
+        Async variant of `chat_completion`, reusing pooled clients for the running loop.
+        """
+        cache_key = self._cache_key(messages, json_mode, temperature)
+        cached = self._lookup(cache_key, validate)
+        if cached is not None:
+            return cached
+
+        lc_messages = _to_lc_messages(messages)
+        estimated = _estimate_tokens(messages)
+
+        errors: List[str] = []
+        waited = 0.0
+        attempt = 0
+        while True:
+            for model in self.router.candidates(estimated):
+                call = {"model": model}
+                token = _current_call.set(call)
+                with span("llm", model=model, attempt=len(errors), estimated_tokens=estimated) as llm_span:
+                    try:
+                        llm = self._get_async_llm(model, temperature, json_mode)
+                        response = await llm.ainvoke(lc_messages)
+                        _record_usage(llm_span, response)
+                        return self._remember(cache_key, model, str(response.content), validate)
+                    except Exception as e:
+                        if not _is_rate_limit(e):
+                            raise e
+                        llm_span.set(status="rate_limited")
+                        self._rate_limited(call, e, errors)
+                    finally:
+                        _current_call.reset(token)
+
+            delay = self._backoff(estimated, attempt, waited, errors)
+            with span("llm:backoff", attempt=attempt):
+                await asyncio.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    def _rate_limited(self, call: Dict[str, Any], error: Exception, errors: List[str]) -> None:
+        model = call["model"]
+        # stderr: stdout carries the review, e.g. as jsonl events
+        print(f"⚠️ Rate limit hit for {model}. Trying next model...", file=sys.stderr)
+        errors.append(f"{model}: {str(error)}")
+        if call.get("status") != 429:
+            # The response hook didn't see the 429 (no HTTP response), so open the circuit here
+            self.router.record_rate_limit(model)
+
+    def _backoff(self, estimated: int, attempt: int, waited: float, errors: List[str]) -> float:
+        """
+        Jittered wait before retrying once every model is rate limited. Raises when
+        the wait budget is used up.
+        """
+        remaining = self.max_rate_limit_wait - waited
+        if remaining <= 0:
+            raise Exception(f"All models failed due to rate limits. Errors: {errors}")
+        delay = min(self.router.backoff(estimated, attempt), remaining)
+        print(f"⚠️ All models rate limited. Retrying in {delay:.1f}s...", file=sys.stderr)
+        return delay
+
+    def _on_response(self, response: httpx.Response) -> None:
+        call = _current_call.get()
+        if call is not None:
+            call["status"] = response.status_code
+            self.router.observe(call["model"], response.headers, response.status_code)
+
+    async def _aon_response(self, response: httpx.Response) -> None:
+        self._on_response(response)
+
+    def _cache_key(self, messages: List[Dict[str, str]], json_mode: bool, temperature: float) -> Optional[str]:
+        if self.llm_cache is None:
+            return None
+        return self.llm_cache.key(self.models, temperature, json_mode, messages)
+
+    def _lookup(self, cache_key: Optional[str], validate: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        if cache_key is None or self.llm_cache is None:
+            return None
+        cached = self.llm_cache.lookup(cache_key)
+        if cached is not None and self.llm_cache.mode != "replay" and not _valid(cached, validate):
+            # Stored before responses were validated, or by another parser
+            self.llm_cache.discard(cache_key)
+            return None
+        return cached
+
+    def _remember(self, cache_key: Optional[str], model: str, content: str, validate: Optional[Callable[[str], Any]] = None) -> str:
+        if cache_key and self.llm_cache is not None and _valid(content, validate):
+            self.llm_cache.store(cache_key, model, content)
+        return content
+
+    def close(self) -> None:
+        """
+        Close the shared sync connection pool.
         """
-        lc_messages: List[BaseMessage] = []
-        for msg in messages:
-            if msg["role"] == "system":
-                lc_messages.append(SystemMessage(content=msg["content"]))
-            elif msg["role"] == "user":
-                lc_messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                lc_messages.append(AIMessage(content=msg["content"]))
-        
-        # Try models in order starting from the current preference
-        # We don't reset index on every call to avoid "flapping", 
-        # but if we wanted to always try best model first, we would iter from 0.
-        # Logic: iterate from 0 to end. If 0 fails, we try 1. 
-        # Note: If we want to prioritize the *best* model, we should always start from 0.
-        # User request: "tries the next model" implies fallback chain for THIS request.
-        
-        errors = []
-        for model in self.models:
-            try:
-                llm = self._get_llm(model, temperature)
-                chain = llm
-                
-                if json_mode:
-                    chain = chain.bind(response_format={"type": "json_object"})
-                    
-                response = chain.invoke(lc_messages)
-                return str(response.content)
-                
-            except Exception as e:
-                error_str = str(e)
-                # Check for rate limit indicators
-                is_rate_limit = "429" in error_str or "rate_limit" in error_str.lower() or "too many requests" in error_str.lower()
-                
-                if is_rate_limit:
-                    print(f"⚠️ Rate limit hit for {model}. Trying next model...")
-                    errors.append(f"{model}: {error_str}")
-                    continue
-                else:
-                    # Non-rate-limit error (e.g. context length, invalid request) -> Raise immediately
-                    raise e
-        
-        # If we get here, all models failed
-        raise Exception(f"All models failed due to rate limits. Errors: {errors}")
+        with self._lock:
+            self._llms.clear()
+        self._http_client.close()
+
+    async def aclose(self) -> None:
+        """
+        Close the async connection pool of the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._async_llms.pop(loop, None)
+            http_async_client = self._async_http_clients.pop(loop, None)
+        if http_async_client is not None:
+            await http_async_client.aclose()
+
+
+def _valid(content: str, validate: Optional[Callable[[str], Any]]) -> bool:
+    if validate is None:
+        return True
+    try:
+        validate(content)
+    except Exception:
+        return False
+    return True
+
+
+def _to_lc_messages(messages: List[Dict[str, str]]) -> List[BaseMessage]:
+    lc_messages: List[BaseMessage] = []
+    for msg in messages:
+        if msg["role"] == "system":
+            lc_messages.append(SystemMessage(content=msg["content"]))
+        elif msg["role"] == "user":
+            lc_messages.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] == "assistant":
+            lc_messages.append(AIMessage(content=msg["content"]))
+    return lc_messages
+
+
+def _record_usage(llm_span: Any, response: Any) -> None:
+    usage = getattr(response, "usage_metadata", None) or {}
+    llm_span.set(status="ok", input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
 
+def _is_rate_limit(error: Exception) -> bool:
+    # Check for rate limit indicators
+    error_str = str(error)
+    return "429" in error_str or "rate_limit" in error_str.lower() or "too many requests" in error_str.lower()
@@ -1,161 +1,708 @@
+import asyncio
+import hashlib
 import json
-from rich import print
-from typing import Dict, Any, Literal
+import os
+import re
+import shlex
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from rich.console import Console
+from typing import Awaitable, Callable, Dict, Any, List, Literal, Optional, Set, Tuple, cast
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
-from ..schemas import AgentState, ReviewResponse, ReviewRequest
+from ..diff import DiffIndex, parse_diff
+from ..schemas import AgentState, ReviewComment, ReviewResponse, ReviewRequest
 from ..agent.client import GroqClient
-from ..prompts import PLANNING_PROMPT, REVIEW_PROMPT
+from ..cache import BlobStore, ToolResultCache, blob_digest
+from ..agent.sharding import merge_reviews, split_diff
+from ..agent.streaming import CommentStreamParser, extract_json_object
+from ..prompts.builder import PromptBuilder
+from ..shell import ShellPool
+from ..tracing import in_context, span
 from ..tools.workspace import explore_workspace
 from ..tools.web import search_web
 from ..tools.terminal import run_command
+from ..git import tree_fingerprint
+from ..lint import scope_command, scope_result
 from ..tools.git import git_diff
+from ..tools.index import find_files, find_impacted_tests, find_references, find_symbol, read_file_range
+
+# Verbose diagnostics; stdout carries the review (e.g. `--format jsonl`)
+console = Console(stderr=True)
+
+# Tools whose results depend only on the arguments and the working tree
+CACHEABLE_TOOLS = {"run_command", "explore_workspace"}
+
+# Lookups answered from the on-disk repository index
+INDEX_TOOLS = {
+    tool.name: tool
+    for tool in (find_symbol, find_references, find_files, find_impacted_tests, read_file_range)
+}
+
+# Commands run for their effect on a persistent shell; replaying them from the
+# cache would skip that effect
+SHELL_STATE_COMMANDS = {
+    "cd", "pushd", "popd", "export", "unset", "source", ".", "alias", "set", "eval",
+    "nvm", "conda", "pyenv", "exec", "shopt", "ulimit", "umask",
+}
+
+# Separators between the simple commands of a command line
+COMMAND_SEPARATOR = re.compile(r"&&|\|\||[;&|\n()]")
+
+# Package manager commands that change what later commands see; they are never
+# answered from earlier results and invalidate earlier run_command results
+INSTALL_COMMAND = re.compile(
+    r"\b(?:pip3?|uv|poetry|pdm|pipenv|npm|pnpm|yarn|bun|cargo|go|gem|bundle|composer|apt(?:-get)?|brew|conda)"
+    r"\s+(?:[^\s;&|]+\s+){0,3}?(?:install|add|sync|get|update|upgrade|remove|uninstall|ci)\b"
+)
+
+# Check runners whose verbosity flags don't change what they check, so
+# `pytest` and `python -m pytest -q` are the same call
+CHECK_RUNNERS = {
+    "pytest", "py.test", "mypy", "ruff", "flake8", "pylint", "pyright", "unittest", "tox", "nox",
+    "eslint", "tsc", "jest", "vitest", "npm", "pnpm", "yarn", "cargo", "go", "golangci-lint",
+}
+VERBOSITY_FLAGS = {
+    "-q", "-qq", "-v", "-vv", "-vvv", "--quiet", "--verbose", "--no-header",
+    "--color", "--no-color", "-y", "--yes",
+}
+
+# CPU priority decrease for speculative checks, so they yield to everything else
+SPECULATIVE_NICENESS = 10
+
+# Arguments that don't change a tool's result
+UNKEYED_ARGS = {"timeout"}
+
+# Durations in tool output ("in 0.42s"), ignored when comparing results
+DURATION = re.compile(r"\d+(?:\.\d+)?\s?(?:ms|s|sec|secs|seconds)\b")
+
+
+@lru_cache(maxsize=None)
+def compiled_workflow() -> Any:
+    """
+    Compile the review graph once per process.
+
+    Nodes and routers look up the `ReviewGraph` for the current run in
+    `config["configurable"]["review_graph"]`, so one compiled graph serves every
+    review (and every concurrent review in batch or server mode).
+    """
+    workflow = StateGraph(AgentState)
+    
+    # Add nodes. LLM nodes carry both sync and async implementations so the
+    # same graph serves `invoke` and `ainvoke`; tools run on a thread pool either way.
+    workflow.add_node("plan", RunnableLambda(_dispatch("plan_step"), afunc=_adispatch("aplan_step")))
+    workflow.add_node("execute_tools", RunnableLambda(_dispatch("execute_tools_step")))
+    workflow.add_node("review", RunnableLambda(_dispatch("review_step"), afunc=_adispatch("areview_step")))
+    
+    # Set entry point
+    workflow.set_entry_point("plan")
+    
+    # Add conditional edges
+    workflow.add_conditional_edges(
+        "plan",
+        _dispatch("should_continue"),
+        {
+            "tools": "execute_tools",
+            "review": "review"
+        }
+    )
+    
+    workflow.add_conditional_edges(
+        "execute_tools",
+        _dispatch("check_iteration"),
+        {
+            "continue": "plan",
+            "end": "review"
+        }
+    )
+    
+    workflow.add_edge("review", END)
+    
+    return workflow.compile()
+
+
+def _review_graph(config: RunnableConfig) -> "ReviewGraph":
+    return config["configurable"]["review_graph"]
+
+
+def _dispatch(method: str) -> Callable[[AgentState, RunnableConfig], Any]:
+    def call(state: AgentState, config: RunnableConfig) -> Any:
+        return getattr(_review_graph(config), method)(state)
+    call.__name__ = method
+    return call
+
+
+def _adispatch(method: str) -> Callable[[AgentState, RunnableConfig], Awaitable[Any]]:
+    async def call(state: AgentState, config: RunnableConfig) -> Any:
+        return await getattr(_review_graph(config), method)(state)
+    call.__name__ = method
+    return call
+
 
 class ReviewGraph:
-    def __init__(self, request: ReviewRequest, client: GroqClient):
+    def __init__(
+        self,
+        request: ReviewRequest,
+        client: GroqClient,
+        tool_cache: Optional[ToolResultCache] = None
+    ):
         self.request = request
         self.client = client
-        self.workflow = self._build_graph()
-        
-    def _build_graph(self) -> Any:
-        workflow = StateGraph(AgentState)
-        
-        # Add nodes
-        workflow.add_node("plan", self.plan_step)
-        workflow.add_node("execute_tools", self.execute_tools_step)
-        workflow.add_node("review", self.review_step)
-        
-        # Set entry point
-        workflow.set_entry_point("plan")
-        
-        # Add conditional edges
-        workflow.add_conditional_edges(
-            "plan",
-            self.should_continue,
-            {
-                "tools": "execute_tools",
-                "review": "review"
-            }
-        )
-        
-        workflow.add_conditional_edges(
-            "execute_tools",
-            self.check_iteration,
-            {
-                "continue": "plan",
-                "end": "review"
-            }
-        )
-        
-        workflow.add_edge("review", END)
-        
-        return workflow.compile()
+        settings = request.settings
+        # Large tool output, out of the graph state; observations keep handles
+        self.blobs = BlobStore.temporary() if settings.blob_store == "file" else BlobStore()
+        self.prompts = PromptBuilder(settings, blobs=self.blobs)
+        if tool_cache is None and settings.tool_cache:
+            tool_cache = ToolResultCache(
+                max_bytes=settings.tool_cache_max_mb * 1024 * 1024, ttl=settings.tool_cache_ttl
+            )
+        self.tool_cache = tool_cache
+        self.tool_cache_stats = {"hits": 0, "misses": 0}
+        # Warm shells shared by this review's run_command calls, across iterations
+        self.shells = ShellPool() if settings.persistent_shell else None
+        self._tree_fingerprints: Dict[str, Optional[str]] = {}
+        self._cache_lock = threading.Lock()
+        # Tool calls already answered in this review: call key -> (iteration, result)
+        self._memo: Dict[Tuple[str, str], Tuple[int, Any]] = {}
+        # Digests of every tool result seen in this review, to spot rounds that add nothing new
+        self._result_digests: Set[str] = set()
+        # Keys of every call run in this review, memoized or not
+        self._called: Set[Tuple[str, str]] = set()
+        # Set once a package manager changed the environment during this review
+        self._installed = False
+        # Set once a command may have changed a persistent shell's environment;
+        # later run_command results then depend on more than their arguments
+        self._shell_state_changed = False
+        # Checks started alongside the first plan, by call key, until the planner asks for them
+        self._speculation: Optional[ThreadPoolExecutor] = None
+        self._speculative: Dict[Tuple[str, str], "Future[Dict[str, Any]]"] = {}
+        self._cancel_speculation = threading.Event()
+        self.speculative_stats = {"started": 0, "used": 0}
+        # The review's diff, once bound from the state; linter runs and their
+        # output are narrowed to it
+        self._lint_scope: Optional[DiffIndex] = None
+        # Set by `ReviewOrchestrator.stream` to emit comments while the review is generated
+        self.stream_comments = False
+        # The graph is compiled once per process; this binding routes its nodes
+        # back to this instance
+        self.workflow = compiled_workflow().with_config(configurable={"review_graph": self})
 
     def compile(self):
         return self.workflow
 
+    def close(self) -> None:
+        """
+        Stop this review's speculative checks and shell sessions, and drop its blobs.
+        """
+        self._stop_speculation()
+        if self.shells is not None:
+            self.shells.close()
+        self.blobs.close()
+
     def plan_step(self, state: AgentState) -> Dict[str, Any]:
         """
         Planning step: decide what to do next.
         """
+        if state.iteration == 0:
+            self._bind_lint_scope(state)
+            self._start_speculation(state)
+        with span("plan", iteration=state.iteration):
+            prompt, usage = self._planning_prompt(state)
+            messages = [{"role": "user", "content": prompt}]
+            response_str = self.client.chat_completion(messages, validate=_plan_json)
+            return self._apply_plan(response_str, state, usage)
+
+    async def aplan_step(self, state: AgentState) -> Dict[str, Any]:
+        """
+        Async planning step, awaiting the client's pooled async API.
+        """
+        if state.iteration == 0:
+            self._bind_lint_scope(state)
+            self._start_speculation(state)
+        with span("plan", iteration=state.iteration):
+            prompt, usage = self._planning_prompt(state)
+            messages = [{"role": "user", "content": prompt}]
+            response_str = await self.client.achat_completion(messages, validate=_plan_json)
+            return self._apply_plan(response_str, state, usage)
+
+    def _start_speculation(self, state: AgentState) -> None:
+        """
+        Start the checks in `repo_facts["speculative_checks"]` in the background,
+        so they run while the first plan is generated. A check the planner asks
+        for is answered from its run; the others are killed before the review.
+        """
+        commands = state.repo_facts.get("speculative_checks") or []
+        if self._speculation is not None or not commands:
+            return
+        settings = self.request.settings
+        self._speculation = ThreadPoolExecutor(
+            max_workers=max(1, settings.speculative_parallelism), thread_name_prefix="pr-agent-speculative"
+        )
+        for command in commands[:settings.speculative_max_commands]:
+            call = {"name": "run_command", "args": {"command": command, "repo_root": self.request.repo_root}}
+            key = _call_key(call)
+            if key is not None and key not in self._speculative:
+                self._speculative[key] = self._speculation.submit(in_context(self._run_tool), call, True)
+                self.speculative_stats["started"] += 1
+        if settings.verbose:
+            console.print(f"[dim]Speculative checks:[/dim] {commands}")
+
+    def _bind_lint_scope(self, state: AgentState) -> None:
+        if self._lint_scope is None and self.request.settings.diff_scoped_lint:
+            self._lint_scope = _diff_index(state)
+
+    def _stop_speculation(self) -> None:
+        """
+        Kill speculative checks the planner never asked for; their results are discarded.
+        """
+        if self._speculation is None:
+            return
+        self._cancel_speculation.set()
+        self._speculative.clear()
+        self._speculation.shutdown(wait=True, cancel_futures=True)
+
+    def _planning_prompt(self, state: AgentState) -> Tuple[str, Dict[str, int]]:
         if self.request.settings.verbose:
-            print("\n[bold cyan]─── Planning ───[/bold cyan]")
+            console.print("\n[bold cyan]─── Planning ───[/bold cyan]")
             
-        prompt = PLANNING_PROMPT.format(
-            diff=state.diff,
-            changed_files=state.changed_files,
-            repo_facts=state.repo_facts,
-            observations=state.tool_observations
-        )
-        response_str = self.client.chat_completion(
-            [{"role": "user", "content": prompt}]
-        )
-        plan = json.loads(response_str)
+        prompt, usage = self.prompts.planning(state)
+        if self.request.settings.verbose:
+            console.print(f"[dim]Prompt tokens (est.):[/dim] {usage}")
+        return prompt, usage
+
+    def _apply_plan(self, response_str: str, state: AgentState, usage: Dict[str, int]) -> Dict[str, Any]:
+        plan = _plan_json(response_str)
         
         if self.request.settings.verbose:
-            print(f"[dim]Hypotheses:[/dim] {plan.get('hypotheses', [])}")
-            print(f"[dim]Tools:[/dim] {json.dumps(plan.get('tools', []), indent=2)}")
+            console.print(f"[dim]Hypotheses:[/dim] {plan.get('hypotheses', [])}")
+            console.print(f"[dim]Tools:[/dim] {json.dumps(plan.get('tools', []), indent=2)}")
         
         updates: Dict[str, Any] = {
             "hypotheses": plan.get("hypotheses", []),
-            "candidates": plan.get("tools", []) 
+            "candidates": plan.get("tools", []),
+            "metadata": _with_prompt_usage(state.metadata, "plan", [usage])
         }
+        if not updates["candidates"]:
+            updates["metadata"]["stop_reason"] = "plan_complete"
         return updates
 
     def execute_tools_step(self, state: AgentState) -> Dict[str, Any]:
         """
-        Execute selected tools.
+        Execute selected tools concurrently, keeping observations in plan order.
+
+        Calls already made in this review (including near-duplicates such as
+        `pytest` and `pytest -q`) are answered from the earlier result. A round
+        whose calls all repeat earlier ones (memoized, or retried after an error
+        or timeout) and returned nothing that wasn't seen before has converged:
+        the loop then goes straight to review. A new call whose output happens
+        to match an earlier one (`ruff check src` after `ruff check .`) does
+        not end the loop.
         """
-        tools_to_run = state.candidates
-        new_observations = []
+        self._bind_lint_scope(state)
+        candidates = state.candidates
+        keys = [_call_key(call) for call in candidates]
+        # A setup command (`cd`, `export`, `source`) must run before the commands
+        # planned after it, in the same shell: such a round runs in plan order
+        sequential = self.shells is not None and any(
+            call.get("name") == "run_command" and _changes_shell_state(_command(call)) for call in candidates
+        )
+        if sequential:
+            # None of this round's results may be cached either
+            self._shell_state_changed = True
+        repeats = all(key is not None and (key in self._memo or key in self._called) for key in keys)
+        observations: List[Optional[Dict[str, Any]]] = [None] * len(candidates)
+        # Index of the first call of this round per key; later ones reuse its result
+        first: Dict[Tuple[str, str], int] = {}
+        to_run: List[int] = []
+        speculated: List[int] = []
+        for i, key in enumerate(keys):
+            if key is not None and key in self._memo:
+                observations[i] = _memoized(candidates[i], *self._memo[key])
+            elif key is None or key not in first:
+                if key is not None:
+                    first[key] = i
+                (speculated if key in self._speculative else to_run).append(i)
         
         if self.request.settings.verbose:
-            print(f"\n[bold cyan]─── Executing {len(tools_to_run)} Tool(s) ───[/bold cyan]")
+            console.print(f"\n[bold cyan]─── Executing {len(to_run)} Tool(s) ───[/bold cyan]")
         
-        for tool_call in tools_to_run:
-            name = tool_call["name"]
-            args = tool_call.get("args", {})
-            
-            if self.request.settings.verbose:
-                print(f"[bold] Running:[/bold] {name} {args}")
-            
-            observation = {"tool": name, "args": args}
-            
+        reused = len(candidates) - len(to_run) - len(speculated)
+        counts = {"tools": len(to_run), "speculative": len(speculated), "memoized": reused}
+        with span("execute_tools", iteration=state.iteration, **counts):
+            if to_run:
+                max_workers = max(1, min(self.request.settings.max_tool_concurrency, len(to_run)))
+                if sequential:
+                    max_workers = 1
+                with ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="pr-agent-tool"
+                ) as executor:
+                    # map() yields results in submission order, regardless of completion order
+                    results = executor.map(in_context(self._run_tool), [candidates[i] for i in to_run])
+                    for i, observation in zip(to_run, results):
+                        observations[i] = observation
+            for i in speculated:
+                # Already running (or done) since the first plan; waiting beats a second run
+                key = cast(Tuple[str, str], keys[i])
+                observation = self._speculative.pop(key).result()
+                args = dict(candidates[i].get("args", {}))
+                observations[i] = {**observation, "args": args, "speculative": True}
+                self.speculative_stats["used"] += 1
+        for i, key in enumerate(keys):
+            if observations[i] is None and key is not None:
+                result = cast(Dict[str, Any], observations[first[key]])["result"]
+                observations[i] = _memoized(candidates[i], state.iteration, result)
+
+        new_observations = [cast(Dict[str, Any], o) for o in observations]
+        for observation in new_observations:
+            # Lets the prompt builder tell fresh observations from old ones
+            observation["iteration"] = state.iteration
+        executed = sorted(to_run + speculated)
+        self._called.update(keys[i] for i in executed if keys[i] is not None)
+        executed_observations = [(keys[i], new_observations[i]) for i in executed]
+        new_information = self._remember(state.iteration, executed_observations, candidates)
+
+        metadata = dict(state.metadata)
+        memoized = len(candidates) - len(executed)
+        if memoized:
+            metadata["memoized_tool_calls"] = metadata.get("memoized_tool_calls", 0) + memoized
+        if candidates and repeats and not new_information:
+            metadata["stop_reason"] = "converged"
+        elif state.iteration + 1 >= self.request.settings.max_iters:
+            metadata["stop_reason"] = "max_iters"
+        
+        return {
+            # Appended to the state's list by its reducer
+            "tool_observations": new_observations,
+            "iteration": state.iteration + 1,
+            "metadata": metadata
+        }
+
+    def _remember(
+        self,
+        iteration: int,
+        executed: List[Tuple[Optional[Tuple[str, str]], Dict[str, Any]]],
+        candidates: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        Memoize this round's results and return whether any of them was new.
+        """
+        commands = [_command(call) for call in candidates if call.get("name") == "run_command"]
+        if any(INSTALL_COMMAND.search(command) for command in commands):
+            self._installed = True
+        if any(_changes_environment(command) for command in commands):
+            self._stop_speculation()
+            # Earlier command output may no longer hold (including this round's)
+            self._memo = {key: value for key, value in self._memo.items() if key[0] != "run_command"}
+            executed = [(None if key and key[0] == "run_command" else key, o) for key, o in executed]
+
+        new_information = False
+        for key, observation in executed:
+            result = observation.get("result")
+            digest = _result_digest(result)
+            if digest not in self._result_digests:
+                self._result_digests.add(digest)
+                new_information = True
+            # Errors and timeouts may be transient; let the planner retry them
+            if key is not None and not (isinstance(result, dict) and "error" in result):
+                self._memo[key] = (iteration, result)
+        return new_information
+
+    def _run_tool(self, tool_call: Dict[str, Any], speculative: bool = False) -> Dict[str, Any]:
+        """
+        Run a single planned tool call. Never raises: failures become error observations
+        so one crashing tool doesn't cancel the others.
+        """
+        name = tool_call.get("name", "")
+        # Copy so injected settings don't leak back into the planner's candidates
+        args = dict(tool_call.get("args", {}))
+        observation: Dict[str, Any] = {"tool": name, "args": args}
+        # Arguments the tool runs with: a linter is narrowed to the changed files
+        run_args = args
+        scope = self._lint_scope if name == "run_command" else None
+        if name == "run_command":
+            # Inject unsafe_mode from settings
+            args["unsafe_mode"] = self.request.settings.unsafe_mode
+            if scope is not None:
+                scoped = scope_command(_command(tool_call), scope.changed_files, args.get("repo_root") or ".")
+                if scoped is not None:
+                    run_args = {**args, "command": scoped}
+                    observation["scoped_command"] = scoped
+        
+        if self.request.settings.verbose:
+            console.print(f"[bold] Running:[/bold] {name} {run_args}")
+        
+        with span(f"tool:{name}") as tool_span:
             try:
-                result = None
-                if name == "explore_workspace":
-                    result = explore_workspace.invoke(args)
-                elif name == "search_web":
-                    result = search_web.invoke(args)
-                elif name == "run_command":
-                    # Inject unsafe_mode from settings
-                    args["unsafe_mode"] = self.request.settings.unsafe_mode
-                    result = run_command.invoke(args)
-                elif name == "git_diff":
-                    result = git_diff.invoke(args)
+                cache_key = self._tool_cache_key(name, run_args)
+                result = self.tool_cache.get(cache_key) if cache_key else None
+                if result is not None:
+                    observation["cached"] = True
+                    self._count_cache("hits")
                 else:
-                    result = {"error": f"Unknown tool: {name}"}
-                
+                    if cache_key:
+                        self._count_cache("misses")
+                    result = self._invoke_tool(name, run_args, speculative)
+                    # A run that rewrote files (`ruff --fix`) would be replayed without its edits
+                    if name == "run_command" and self._tree_changed(run_args):
+                        cache_key = None
+                    # Only completed runs are worth replaying; errors and timeouts are retried
+                    if cache_key and isinstance(result, dict) and "error" not in result:
+                        self.tool_cache.put(cache_key, result)
+                if scope is not None:
+                    # Only findings inside the changed hunks reach the prompts
+                    result = scope_result(_command(tool_call), result, scope, args.get("repo_root") or ".")
+                # Handles keep the duration-free digest of their text for `_result_digest`
+                result = self.blobs.offload(result, self.request.settings.blob_min_bytes, _text_digest)
+            
                 observation["result"] = result
-                
+            
                 if self.request.settings.verbose:
                     # Truncate long outputs for readability
                     res_str = str(result)
                     if len(res_str) > 500:
                         res_str = res_str[:500] + "... [truncated]"
-                    print(f"[green] Result:[/green] {res_str}")
-                    
+                    cached = " (cached)" if observation.get("cached") else ""
+                    console.print(f"[green] Result ({name}){cached}:[/green] {res_str}")
+                
             except Exception as e:
                 observation["result"] = {"error": str(e)}
                 if self.request.settings.verbose:
-                    print(f"[red] Error:[/red] {str(e)}")
-                
-            new_observations.append(observation)
+                    console.print(f"[red] Error ({name}):[/red] {str(e)}")
+
+            result = observation["result"]
+            failed = isinstance(result, dict) and "error" in result
+            tool_span.set(cached=bool(observation.get("cached")), failed=failed, speculative=speculative)
         
-        return {
-            "tool_observations": state.tool_observations + new_observations,
-            "iteration": state.iteration + 1
-        }
+        return observation
+
+    def _invoke_tool(self, name: str, args: Dict[str, Any], speculative: bool = False) -> Any:
+        if name == "explore_workspace":
+            return explore_workspace.invoke(args)
+        elif name == "search_web":
+            return search_web.invoke(args)
+        elif name == "run_command":
+            if speculative:
+                # Outside the shell pool: a speculative run must not hold a session the planner needs
+                niced = {**args, "niceness": SPECULATIVE_NICENESS, "cancel": self._cancel_speculation}
+                return run_command.invoke(niced)
+            if self.shells is not None:
+                # Concurrent calls get a session each from the pool
+                with self.shells.session(args.get("repo_root") or ".") as shell:
+                    return run_command.invoke({**args, "shell": shell})
+            return run_command.invoke(args)
+        elif name == "git_diff":
+            return git_diff.invoke(args)
+        elif name in INDEX_TOOLS:
+            return INDEX_TOOLS[name].invoke(args)
+        return {"error": f"Unknown tool: {name}"}
+
+    def _tool_cache_key(self, name: str, args: Dict[str, Any]) -> Optional[str]:
+        """
+        Cache key for a tool call, or None if the call can't be cached (tool not
+        cacheable, cache disabled, or the cwd is not a git work tree).
+        """
+        if self.tool_cache is None or name not in CACHEABLE_TOOLS:
+            return None
+        if name == "run_command":
+            command = args.get("command", "")
+            # The key doesn't cover a session's environment: once a command may
+            # have changed it, results are not cached for the rest of the review
+            if self.shells is not None and (self._shell_state_changed or _changes_shell_state(command)):
+                self._shell_state_changed = True
+                return None
+            # Results cached before an install in this review may not hold after it
+            if self._installed or INSTALL_COMMAND.search(command):
+                return None
+        cwd = os.path.abspath(args.get("repo_root") or os.getcwd())
+        with self._cache_lock:
+            if cwd not in self._tree_fingerprints:
+                # Computed once per review, then refreshed by `_tree_changed` after each command
+                self._tree_fingerprints[cwd] = tree_fingerprint(cwd)
+            fingerprint = self._tree_fingerprints[cwd]
+        if fingerprint is None:
+            return None
+        return self.tool_cache.key(name, args, cwd, fingerprint)
+
+    def _tree_changed(self, args: Dict[str, Any]) -> bool:
+        """
+        Refresh the tree fingerprint after a command ran, so later cache keys
+        see its edits. True if the command changed the tree.
+        """
+        cwd = os.path.abspath(args.get("repo_root") or os.getcwd())
+        with self._cache_lock:
+            if self.tool_cache is None or cwd not in self._tree_fingerprints:
+                return False
+        fingerprint = tree_fingerprint(cwd)
+        with self._cache_lock:
+            before = self._tree_fingerprints.get(cwd)
+            self._tree_fingerprints[cwd] = fingerprint
+        return fingerprint != before
+
+    def _count_cache(self, stat: str) -> None:
+        with self._cache_lock:
+            self.tool_cache_stats[stat] += 1
 
     def review_step(self, state: AgentState) -> Dict[str, Any]:
         """
-        Generate final review.
+        Generate final review, map-reducing over diff shards for large PRs.
+
+        When streaming, comments are emitted as `{"event": "comment"}` custom
+        stream events as soon as they are complete (per shard in map-reduce mode).
         """
+        self._stop_speculation()
+        with span("review", iteration=state.iteration):
+            prompts = [self.prompts.review(state, shard) for shard in self._review_shards(state)]
+            usages = [usage for _, usage in prompts]
+            # Fetched on the node's thread: the writer is bound to its context
+            emit = get_stream_writer() if self.stream_comments else None
+            if len(prompts) == 1:
+                if emit is not None:
+                    review = self._stream_review(prompts[0][0], emit)
+                else:
+                    review = self._complete_review(prompts[0][0])
+                return self._apply_review(review, state, usages)
+
+            def review_shard(prompt: str) -> ReviewResponse:
+                with span("review:shard"):
+                    return self._complete_review(prompt)
+
+            max_workers = max(1, min(self.request.settings.review_parallelism, len(prompts)))
+            with ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="pr-agent-review"
+            ) as executor:
+                futures = [executor.submit(in_context(review_shard), prompt) for prompt, _ in prompts]
+                if emit is not None:
+                    emitted: Set[Tuple] = set()
+                    for future in as_completed(futures):
+                        if future.exception() is None:
+                            for comment in future.result().comments:
+                                _emit_comment(emit, comment, emitted)
+                outcomes = [_outcome(future) for future in futures]
+            return self._apply_review(self._reduce_reviews(outcomes), state, usages)
+
+    def _stream_review(self, prompt: str, emit: Callable[[Any], None]) -> ReviewResponse:
+        """
+        Review with a streamed completion, emitting comments as they complete.
+        Only used when `stream_comments` is set; if the streamed text holds no
+        valid review, the review is asked for again in JSON mode, streamed
+        comments it doesn't repeat are retracted and its new ones emitted.
+        """
+        parser = CommentStreamParser()
+        emitted: Set[Tuple] = set()
+        streamed: List[ReviewComment] = []
+        parts: List[str] = []
+        # JSON mode can't be streamed; the prompt still asks for a JSON object
+        messages = [{"role": "user", "content": prompt}]
+        for chunk in self.client.stream_chat_completion(messages, json_mode=False):
+            parts.append(chunk)
+            for comment in parser.feed(chunk):
+                streamed.append(comment)
+                _emit_comment(emit, comment, emitted)
+        try:
+            return self._parse_review(extract_json_object("".join(parts)))
+        except (ValueError, TypeError):
+            pass
+        # Empty or not a review object: the JSON-mode review is the one returned
+        review = self._complete_review(prompt)
+        kept = {_comment_key(comment) for comment in review.comments}
+        for comment in streamed:
+            key = _comment_key(comment)
+            if key in emitted and key not in kept:
+                emitted.discard(key)
+                emit({"event": "retract", "comment": comment.model_dump()})
+        for comment in review.comments:
+            _emit_comment(emit, comment, emitted)
+        return review
+
+    async def areview_step(self, state: AgentState) -> Dict[str, Any]:
+        """
+        Async review step, awaiting the client's pooled async API.
+        """
+        # Killing the checks waits on their threads; keep that off the event loop
+        await asyncio.to_thread(self._stop_speculation)
+        with span("review", iteration=state.iteration):
+            prompts = [self.prompts.review(state, shard) for shard in self._review_shards(state)]
+            usages = [usage for _, usage in prompts]
+            if len(prompts) == 1:
+                messages = [{"role": "user", "content": prompts[0][0]}]
+                response_str = await self.client.achat_completion(messages, validate=self._parse_review)
+                return self._apply_review(self._parse_review(response_str), state, usages)
+
+            semaphore = asyncio.Semaphore(max(1, self.request.settings.review_parallelism))
+
+            async def review_shard(prompt: str) -> ReviewResponse:
+                async with semaphore:
+                    with span("review:shard"):
+                        messages = [{"role": "user", "content": prompt}]
+                        response_str = await self.client.achat_completion(
+                            messages, validate=self._parse_review
+                        )
+                return self._parse_review(response_str)
+
+            shards = (review_shard(prompt) for prompt, _ in prompts)
+            results = await asyncio.gather(*shards, return_exceptions=True)
+            return self._apply_review(self._reduce_reviews(list(results)), state, usages)
+
+    def _review_shards(self, state: AgentState) -> List[str]:
+        settings = self.request.settings
         if self.request.settings.verbose:
-            print("\n[bold cyan]─── Generating Review ───[/bold cyan]")
-            
-        prompt = REVIEW_PROMPT.format(
-            diff=state.diff,
-            observations=state.tool_observations,
-            reflections=state.reflections
-        )
-        response_str = self.client.chat_completion(
-            [{"role": "user", "content": prompt}]
-        )
+            console.print("\n[bold cyan]─── Generating Review ───[/bold cyan]")
+
+        if settings.review_mode == "single":
+            return [state.diff]
+        if settings.review_mode == "auto" and state.diff.count("\n") <= settings.review_shard_max_lines:
+            return [state.diff]
+
+        shards = split_diff(_diff_index(state), settings.review_shard_max_lines) or [state.diff]
+        if settings.verbose and len(shards) > 1:
+            console.print(f"[dim]Reviewing {len(shards)} diff shards in parallel.[/dim]")
+        return shards
+
+    def _complete_review(self, prompt: str) -> ReviewResponse:
+        # Cached only once it parses
+        messages = [{"role": "user", "content": prompt}]
+        return self._parse_review(self.client.chat_completion(messages, validate=self._parse_review))
+
+    def _parse_review(self, response_str: str) -> ReviewResponse:
         data = json.loads(response_str)
-        review = ReviewResponse(**data)
+        return ReviewResponse(**data)
+
+    def _reduce_reviews(self, outcomes: List[Any]) -> ReviewResponse:
+        """
+        Merge shard reviews. A failed shard is recorded rather than failing the whole
+        review, unless every shard failed.
+        """
+        reviews = [o for o in outcomes if isinstance(o, ReviewResponse)]
+        errors = [str(o) for o in outcomes if isinstance(o, BaseException)]
+        if not reviews:
+            raise RuntimeError(f"All {len(outcomes)} review shards failed. Errors: {errors}")
+
+        review = merge_reviews(reviews)
+        review.metadata["review_shards"] = len(outcomes)
+        if errors:
+            review.metadata["failed_shards"] = errors
+            if self.request.settings.verbose:
+                console.print(f"[yellow]{len(errors)} of {len(outcomes)} review shards failed.[/yellow]")
+        return review
+
+    def _apply_review(
+        self, review: ReviewResponse, state: AgentState, usages: List[Dict[str, int]]
+    ) -> Dict[str, Any]:
+        review.metadata = {**_with_prompt_usage(state.metadata, "review", usages), **review.metadata}
+        if self.tool_cache is not None:
+            review.metadata["tool_cache"] = dict(self.tool_cache_stats)
+        if self.shells is not None:
+            review.metadata["shell_sessions"] = dict(self.shells.stats)
+        if self.speculative_stats["started"]:
+            review.metadata["speculative_checks"] = dict(self.speculative_stats)
+        unanchored = _unanchored_comments(_diff_index(state), review)
+        if unanchored:
+            review.metadata["unanchored_comments"] = unanchored
         
         if self.request.settings.verbose:
-            print(f"[dim]Generated {len(review.comments)} comments.[/dim]")
+            console.print(f"[dim]Generated {len(review.comments)} comments.[/dim]")
         
         return {"review_draft": review}
 
@@ -169,11 +716,151 @@ class ReviewGraph:
 
     def check_iteration(self, state: AgentState) -> Literal["continue", "end"]:
         """
-        Check if we exceeded max iterations.
+        Check if the loop converged or we exceeded max iterations.
         """
+        if state.metadata.get("stop_reason") == "converged":
+            if self.request.settings.verbose:
+                console.print("[yellow]Last round added no new information. Proceeding to review.[/yellow]")
+            return "end"
         if state.iteration < self.request.settings.max_iters:
             return "continue"
         
         if self.request.settings.verbose:
-            print("[yellow]Max iterations reached. Proceeding to review.[/yellow]")
+            console.print("[yellow]Max iterations reached. Proceeding to review.[/yellow]")
         return "end"
+
+
+def _comment_key(comment: ReviewComment) -> Tuple:
+    return (comment.file, comment.start_line, comment.end_line, comment.message)
+
+
+def _emit_comment(emit: Callable[[Any], None], comment: ReviewComment, emitted: Set[Tuple]) -> None:
+    key = _comment_key(comment)
+    if key not in emitted:
+        emitted.add(key)
+        emit({"event": "comment", "comment": comment.model_dump()})
+
+
+def _changes_shell_state(command: str) -> bool:
+    """
+    True if any simple command of `command` (`make && cd sub`, `export X=1; pytest`)
+    changes the shell it runs in. Separators inside quotes are not told apart,
+    which only errs on the side of not caching.
+    """
+    for segment in COMMAND_SEPARATOR.split(command):
+        words = segment.split()
+        # `VAR=value cmd` only sets VAR for cmd; a bare `VAR=value` sets it in the shell
+        while words and re.match(r"[A-Za-z_]\w*=", words[0]):
+            if len(words) == 1:
+                return True
+            words = words[1:]
+        if words and words[0] in SHELL_STATE_COMMANDS:
+            return True
+    return False
+
+
+def _changes_environment(command: str) -> bool:
+    return _changes_shell_state(command) or bool(INSTALL_COMMAND.search(command))
+
+
+def _call_key(call: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Identity of a planned tool call within a review, or None if it must always run.
+    """
+    name = call.get("name", "")
+    args = {k: v for k, v in (call.get("args") or {}).items() if v is not None and k not in UNKEYED_ARGS}
+    args["repo_root"] = os.path.abspath(args.get("repo_root") or ".")
+    if name == "run_command":
+        command = str(args.get("command", ""))
+        if _changes_environment(command):
+            return None
+        args["command"] = _normalize_command(command)
+    return name, json.dumps(args, sort_keys=True, default=str)
+
+
+def _normalize_command(command: str) -> str:
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return " ".join(command.split())
+    if len(words) > 2 and re.fullmatch(r"python[\d.]*", words[0]) and words[1] == "-m":
+        words = words[2:]
+    if words[:1] == ["npx"]:
+        program = next((w for w in words[1:] if not w.startswith("-")), "")
+    else:
+        program = words[0] if words else ""
+    if program in CHECK_RUNNERS:
+        flags = [w for w in words[1:] if w not in VERBOSITY_FLAGS and not w.startswith("--color=")]
+        words = words[:1] + flags
+    return shlex.join(words)
+
+
+def _plan_json(response: str) -> Dict[str, Any]:
+    """
+    The planner's JSON object; raises ValueError for anything else.
+    """
+    plan = json.loads(response)
+    if not isinstance(plan, dict):
+        raise ValueError(f"Expected a JSON object for the plan, got {type(plan).__name__}")
+    return plan
+
+
+def _command(call: Dict[str, Any]) -> str:
+    return str(call.get("args", {}).get("command", ""))
+
+
+def _memoized(call: Dict[str, Any], iteration: int, result: Any) -> Dict[str, Any]:
+    args = dict(call.get("args", {}))
+    return {"tool": call.get("name", ""), "args": args, "result": result, "memoized_from": iteration}
+
+
+def _result_digest(result: Any) -> str:
+    if isinstance(result, dict):
+        # An offloaded field counts by its text's fingerprint, not the exact blob
+        result = {k: v.get("fingerprint", v) if blob_digest(v) is not None else v for k, v in result.items()}
+    return _text_digest(json.dumps(result, sort_keys=True, default=str))
+
+
+def _text_digest(text: str) -> str:
+    """
+    Digest of `text` with its durations removed, so reruns that only differ
+    in timings compare equal.
+    """
+    return hashlib.sha256(DURATION.sub("", text).encode("utf-8", "replace")).hexdigest()
+
+
+def _diff_index(state: AgentState) -> DiffIndex:
+    return state.diff_index if state.diff_index is not None else parse_diff(state.diff)
+
+
+def _unanchored_comments(index: DiffIndex, review: ReviewResponse) -> List[str]:
+    """
+    List comments that don't point into the diff: unknown files, or start lines
+    outside every hunk.
+    """
+    unanchored = []
+    for comment in review.comments:
+        if comment.file not in index:
+            unanchored.append(comment.file)
+        elif comment.start_line is not None and not index.contains_line(comment.file, comment.start_line):
+            unanchored.append(f"{comment.file}:{comment.start_line}")
+    return unanchored
+
+
+def _with_prompt_usage(metadata: Dict[str, Any], stage: str, usages: List[Dict[str, int]]) -> Dict[str, Any]:
+    """
+    Return a copy of `metadata` with per-section prompt token usage appended for `stage`.
+    """
+    prompt_tokens = dict(metadata.get("prompt_tokens", {}))
+    prompt_tokens[stage] = prompt_tokens.get(stage, []) + usages
+    return {**metadata, "prompt_tokens": prompt_tokens}
+
+
+def _outcome(future: "Future[Any]") -> Any:
+    """
+    Return a future's result, or the exception it raised.
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        return e
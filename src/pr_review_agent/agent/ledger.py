@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..config import default_cache_dir
+from ..diff import DiffIndex, FileDiff, Hunk, parse_diff
+from ..schemas import ReviewComment, ReviewRequest, ReviewResponse
+from ..tracing import span
+from .sharding import merge_reviews
+
+# Ledger key for comments that don't fall inside any hunk of their file
+FILE_LEVEL = "file"
+
+
+class ReviewLedger:
+    """
+    Persisted record of the last review of each (repo, base, branch): the head
+    commit that was reviewed, and for every hunk a content fingerprint with the
+    comments made on it. One JSON file per key under the cache directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(default_cache_dir(), "ledger")
+
+    @staticmethod
+    def key(repo_root: str, base_ref: Optional[str], branch: Optional[str]) -> str:
+        payload = "\0".join([os.path.realpath(repo_root), base_ref or "", branch or ""])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Write-then-rename so a crashed run never leaves a torn entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(key))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+
+def hunk_fingerprints(index: DiffIndex) -> Dict[Tuple[str, int], str]:
+    """
+    Fingerprint every hunk by its file and body, leaving out the `@@` header, so a
+    hunk that only moved (because lines were added above it) keeps its fingerprint.
+    Keyed by (path, hunk position in the file).
+    """
+    fingerprints: Dict[Tuple[str, int], str] = {}
+    seen: Dict[str, int] = {}
+    for file in index:
+        for position, hunk in enumerate(file.hunks):
+            text = index.hunk_text(hunk)
+            body = text[text.find("\n") + 1:]
+            digest = hashlib.sha256(f"{file.path}\0{body}".encode("utf-8")).hexdigest()
+            # Identical hunks in one file are told apart by occurrence
+            seen[digest] = seen.get(digest, 0) + 1
+            fingerprints[(file.path, position)] = digest if seen[digest] == 1 else f"{digest}#{seen[digest]}"
+    return fingerprints
+
+
+class IncrementalReview:
+    """
+    Re-review only what changed since the last review of a branch.
+
+    Hunks whose fingerprint is in the ledger keep their earlier comments, moved to
+    the hunk's current line numbers; only new or edited hunks are sent for review.
+    """
+
+    def __init__(self, ledger: Optional[ReviewLedger] = None):
+        self.ledger = ledger or ReviewLedger()
+
+    def run(self, request: ReviewRequest, review: Callable[[ReviewRequest], ReviewResponse]) -> ReviewResponse:
+        """
+        Review `request` incrementally; `review` runs a (possibly reduced) request.
+        """
+        index = parse_diff(request.diff)
+        fingerprints = hunk_fingerprints(index)
+        branch = request.head_ref or _current_branch(request.repo_root)
+        key = self.ledger.key(request.repo_root, request.base_ref, branch)
+        entry = self.ledger.load(key) or {"hunks": {}}
+        previous: Dict[str, Dict[str, Any]] = entry.get("hunks", {})
+
+        new_hunks = [k for k, fp in fingerprints.items() if fp not in previous]
+        carried, carried_hunks = _carry_forward(index, fingerprints, previous, {path for path, _ in new_hunks})
+
+        if new_hunks:
+            reduced = request.model_copy(update={
+                "diff": _select_hunks(index, set(new_hunks)),
+                "diff_stats": [s for s in request.diff_stats if s.path in {path for path, _ in new_hunks}],
+            })
+            fresh = review(reduced)
+            result = merge_reviews([fresh, ReviewResponse(summary=[], comments=carried)])
+            result.metadata = dict(fresh.metadata)
+        else:
+            result = ReviewResponse(
+                summary=list(entry.get("summary", [])) or ["No new changes since the last review."],
+                comments=carried,
+            )
+
+        result.metadata["incremental"] = {
+            "previous_head": entry.get("head"),
+            "reviewed_hunks": len(new_hunks),
+            "carried_hunks": carried_hunks,
+            "carried_comments": len(carried),
+        }
+        self.ledger.save(key, _ledger_entry(request, index, fingerprints, result))
+        return result
+
+
+def _carry_forward(
+    index: DiffIndex,
+    fingerprints: Dict[Tuple[str, int], str],
+    previous: Dict[str, Dict[str, Any]],
+    files_with_new_hunks: set
+) -> Tuple[List[ReviewComment], int]:
+    comments: List[ReviewComment] = []
+    carried_hunks = 0
+    for file in index:
+        for position, hunk in enumerate(file.hunks):
+            recorded = previous.get(fingerprints[(file.path, position)])
+            if recorded is None:
+                continue
+            carried_hunks += 1
+            # Re-anchor: comments are stored relative to the hunk's first new line
+            for stored in recorded["comments"]:
+                comments.append(_anchor(stored, hunk.new_start))
+        if file.path not in files_with_new_hunks:
+            # File-level comments survive only while none of the file's hunks changed
+            recorded = previous.get(_file_key(file.path))
+            if recorded is not None:
+                comments.extend(ReviewComment(**stored) for stored in recorded["comments"])
+    return comments, carried_hunks
+
+
+def _anchor(stored: Dict[str, Any], new_start: int) -> ReviewComment:
+    data = dict(stored)
+    for field in ("start_line", "end_line"):
+        if data.get(field) is not None:
+            data[field] = new_start + data[field]
+    return ReviewComment(**data)
+
+
+def _select_hunks(index: DiffIndex, selected: set) -> str:
+    """
+    A diff with only the selected hunks, each file keeping its header.
+    """
+    parts: List[str] = []
+    for file in index:
+        hunks = [h for position, h in enumerate(file.hunks) if (file.path, position) in selected]
+        if hunks:
+            parts.append(index.header(file))
+            parts.extend(index.hunk_text(h) for h in hunks)
+    return "".join(parts)
+
+
+def _ledger_entry(
+    request: ReviewRequest,
+    index: DiffIndex,
+    fingerprints: Dict[Tuple[str, int], str],
+    review: ReviewResponse
+) -> Dict[str, Any]:
+    hunks: Dict[str, Dict[str, Any]] = {}
+    for file in index:
+        for position in range(len(file.hunks)):
+            hunks[fingerprints[(file.path, position)]] = {"file": file.path, "comments": []}
+
+    for comment in review.comments:
+        file = index.file(comment.file)
+        located = _locate(file, comment) if file is not None else None
+        if located is None:
+            hunks.setdefault(_file_key(comment.file), {"file": comment.file, "comments": []})["comments"].append(comment.model_dump())
+            continue
+        position, hunk = located
+        stored = comment.model_dump()
+        for field in ("start_line", "end_line"):
+            if stored[field] is not None:
+                stored[field] -= hunk.new_start
+        hunks[fingerprints[(file.path, position)]]["comments"].append(stored)
+
+    return {
+        "repo_root": os.path.realpath(request.repo_root),
+        "base_ref": request.base_ref,
+        "head_ref": request.head_ref,
+        "head": _head_commit(request.repo_root, request.head_ref),
+        "reviewed_at": time.time(),
+        "summary": review.summary,
+        "hunks": hunks,
+    }
+
+
+def _locate(file: FileDiff, comment: ReviewComment) -> Optional[Tuple[int, Hunk]]:
+    if comment.start_line is None:
+        return None
+    hunk = file.hunk_at(comment.start_line)
+    if hunk is None:
+        return None
+    return file.hunks.index(hunk), hunk
+
+
+def _file_key(path: str) -> str:
+    return f"{FILE_LEVEL}:{path}"
+
+
+def _current_branch(repo_root: str) -> Optional[str]:
+    return _git(repo_root, "rev-parse", "--abbrev-ref", "HEAD")
+
+
+def _head_commit(repo_root: str, head_ref: Optional[str]) -> Optional[str]:
+    return _git(repo_root, "rev-parse", head_ref or "HEAD")
+
+
+def _git(repo_root: str, *args: str) -> Optional[str]:
+    try:
+        with span(f"git:{args[0]}"):
+            return subprocess.run(
+                ["git", "-C", repo_root, *args], capture_output=True, text=True, check=True
+            ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
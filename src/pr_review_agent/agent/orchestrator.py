@@ -1,39 +1,220 @@
-from ..schemas import AgentState, ReviewRequest, ReviewResponse
-from .client import GroqClient
-from ..tools import get_changed_files
-from .graph import ReviewGraph
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, cast
+from ..schemas import AgentState, DiffFileStat, ModelSettings, ReviewRequest, ReviewResponse
+from ..diff import parse_diff
+from ..git import MAX_DIFF_FILE_BYTES, MAX_DIFF_TOTAL_BYTES, read_diff
+from ..tracing import Tracer
+
+if TYPE_CHECKING:
+    from ..cache import ToolResultCache
+    from .client import GroqClient
+
+# Narrowed test commands longer than this stay out of the repo facts (they'd be cut
+# by the facts' token budget); the planner fetches them with `find_impacted_tests`
+MAX_FACT_COMMAND_CHARS = 2000
 
 class ReviewOrchestrator:
-    def __init__(self, request: ReviewRequest, client: GroqClient):
+    def __init__(
+        self,
+        request: ReviewRequest,
+        client: "GroqClient",
+        tool_cache: Optional["ToolResultCache"] = None,
+        tracer: Optional[Tracer] = None
+    ):
+        # langgraph is only loaded once there is a diff to review
+        from .graph import ReviewGraph
+
         self.request = request
         self.client = client
+        # Spans of this review, summarised into `metadata["timings"]`; pass one in
+        # to also cover work done before the review (e.g. reading the diff)
+        self.tracer = tracer or Tracer()
+        # Parse the diff once; every node shares the index via the state
+        diff_index = parse_diff(request.diff)
+        # numstat lists every file, even those cut from a size-capped diff
+        changed_files = [s.path for s in request.diff_stats] or diff_index.changed_files
+        repo_facts: Dict[str, Any] = {}
+        truncated = [s.path for s in request.diff_stats if s.truncated]
+        if truncated:
+            repo_facts["truncated_diff_files"] = truncated
+        if request.settings.persistent_shell:
+            # Lets the planner activate an environment once instead of in every command
+            repo_facts["shell"] = "persistent: cd, export and source carry over to later run_command calls"
+        if request.settings.detect_project:
+            with self.tracer.activate():
+                repo_facts.update(self._project_facts(changed_files))
         # Initialize state to pass to graph
         self.initial_state = AgentState(
             diff=request.diff,
-            changed_files=get_changed_files.invoke({
-                "repo_root": request.repo_root, 
-                "mode": request.mode, 
-                "base_ref": request.base_ref, 
-                "head_ref": request.head_ref
-            }),
+            diff_index=diff_index,
+            changed_files=changed_files,
+            repo_facts=repo_facts,
             iteration=0
         )
-        self.graph = ReviewGraph(request, client)
+        self.graph = ReviewGraph(request, client, tool_cache=tool_cache)
+
+    def _project_facts(self, changed_files: List[str]) -> Dict[str, Any]:
+        """
+        Toolchain profile, impacted tests and speculative checks, worked out from
+        the manifests and the repository index so the first plan can run real checks.
+        """
+        # Loaded per review, not at CLI startup
+        from ..project import detect_project, speculative_checks
+
+        settings = self.request.settings
+        profile = detect_project(self.request.repo_root)
+        if not profile:
+            return {}
+        facts: Dict[str, Any] = {"project": profile}
+        narrowed: Optional[List[str]] = None
+        if settings.impacted_tests and changed_files:
+            impact = _impacted_tests(self.request.repo_root, changed_files, profile.get("commands", {}).get("test", []))
+            if impact:
+                # The list is repeated in the commands
+                facts["impacted_tests"] = {k: v for k, v in impact.items() if k != "tests"}
+                if sum(len(c) for c in impact.get("commands", [])) > MAX_FACT_COMMAND_CHARS:
+                    del facts["impacted_tests"]["commands"]
+                    facts["impacted_tests"]["note"] = "Too long to list here; call find_impacted_tests for the narrowed commands"
+                if "full_suite" not in impact and (impact.get("commands") or not impact.get("unmapped")):
+                    narrowed = impact.get("commands", [])
+        if settings.speculative_checks and settings.enable_tools:
+            checks = speculative_checks(profile, changed_files, settings.speculative_max_commands, tests=narrowed)
+            if checks:
+                # Started by the graph alongside the first plan
+                facts["speculative_checks"] = checks
+        return facts
 
     def run(self) -> ReviewResponse:
         """
         Run the full ReAct loop via LangGraph.
         """
         # Execute the graph
-        final_state = self.graph.workflow.invoke(self.initial_state)
-        
+        try:
+            with self.tracer.activate():
+                final_state = self.graph.workflow.invoke(self.initial_state)
+        finally:
+            self.graph.close()
+        return self._extract_review(final_state)
+
+    async def arun(self) -> ReviewResponse:
+        """
+        Run the full ReAct loop via LangGraph, awaiting LLM calls on the running loop.
+        """
+        try:
+            with self.tracer.activate():
+                final_state = await self.graph.workflow.ainvoke(self.initial_state)
+        finally:
+            self.graph.close()
+        return self._extract_review(final_state)
+
+    def stream(self) -> Iterator[Dict[str, Any]]:
+        """
+        Run the review and yield events as they happen:
+
+        - `{"event": "plan", "hypotheses": [...], "tools": [...]}` after each planning step
+        - `{"event": "tools", "iteration": n, "results": [...]}` after each tool round
+        - `{"event": "comment", "comment": {...}}` as soon as a review comment is complete
+        - `{"event": "retract", "comment": {...}}` if a streamed comment was dropped from the review
+        - `{"event": "review", "review": {...}}` last, with the final merged review
+
+        Streamed comments are provisional: the final review may merge duplicates.
+        """
+        self.graph.stream_comments = True
+        review: Optional[ReviewResponse] = None
+        try:
+            with self.tracer.activate():
+                for mode, chunk in self.graph.workflow.stream(self.initial_state, stream_mode=["updates", "custom"]):
+                    if mode == "custom":
+                        yield chunk
+                        continue
+                    for node, update in chunk.items():
+                        if node == "plan":
+                            yield {
+                                "event": "plan",
+                                "hypotheses": update.get("hypotheses", []),
+                                "tools": [c.get("name") for c in update.get("candidates", [])],
+                            }
+                        elif node == "execute_tools":
+                            iteration = update["iteration"] - 1
+                            yield {
+                                "event": "tools",
+                                "iteration": iteration,
+                                "results": [_tool_summary(o) for o in update["tool_observations"] if o.get("iteration") == iteration],
+                            }
+                        elif node == "review":
+                            review = update.get("review_draft")
+        finally:
+            self.graph.close()
+
+        yield {"event": "review", "review": self._extract_review({"review_draft": review}).model_dump()}
+
+    def _extract_review(self, final_state: Dict[str, Any]) -> ReviewResponse:
         # Extract the review from the final state
         if final_state.get("review_draft"):
-            return final_state["review_draft"]
-            
-        # Fallback if something went wrong
-        return ReviewResponse(
-            summary=["Error: No review generated"],
-            comments=[]
-        )
+            review = final_state["review_draft"]
+        else:
+            # Fallback if something went wrong
+            review = ReviewResponse(
+                summary=["Error: No review generated"],
+                comments=[]
+            )
+        review.metadata["timings"] = self.tracer.summary()
+        return review
+
+
+def _impacted_tests(repo_root: str, changed_files: List[str], test_commands: List[str]) -> Dict[str, Any]:
+    from ..index import impacted_tests, index_exists, repo_index
+
+    try:
+        if not index_exists(repo_root):
+            # Building it would hold up the first plan for the whole repository;
+            # the planner builds it on demand with `find_impacted_tests`
+            return {}
+        return impacted_tests(repo_index(repo_root), changed_files, test_commands)
+    except Exception:
+        # Not a git work tree, or the index can't be built: the planner runs the suite it knows
+        return {}
+
+
+def _tool_summary(observation: Dict[str, Any]) -> Dict[str, Any]:
+    result = observation.get("result")
+    summary: Dict[str, Any] = {"tool": observation.get("tool"), "cached": bool(observation.get("cached"))}
+    if "memoized_from" in observation:
+        summary["memoized_from"] = observation["memoized_from"]
+    if isinstance(result, dict):
+        if "exit_code" in result:
+            summary["exit_code"] = result["exit_code"]
+        if "error" in result:
+            summary["error"] = str(result["error"])[:200]
+    return summary
+
+
+def build_review_request(
+    repo_root: str,
+    mode: str,
+    base_ref: Optional[str] = None,
+    head_ref: Optional[str] = None,
+    settings: Optional[ModelSettings] = None,
+    max_file_bytes: int = MAX_DIFF_FILE_BYTES,
+    max_total_bytes: int = MAX_DIFF_TOTAL_BYTES
+) -> Optional[ReviewRequest]:
+    """
+    Read the diff with a single streaming git call and wrap it in a request.
+    Returns None when there are no changes.
+    """
+    output = read_diff(repo_root, mode, base_ref, head_ref, max_file_bytes, max_total_bytes)
+    if not output.text and not output.files:
+        return None
 
+    truncated = set(output.truncated_files)
+    return ReviewRequest(
+        repo_root=repo_root,
+        mode=cast(Any, mode),
+        base_ref=base_ref,
+        head_ref=head_ref,
+        diff=output.text,
+        diff_stats=[
+            DiffFileStat(path=f.path, old_path=f.old_path, added=f.added, removed=f.removed, truncated=f.path in truncated)
+            for f in output.files
+        ],
+        settings=settings or ModelSettings()
+    )
@@ -0,0 +1,236 @@
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional
+
+# Circuit cool-down after a 429 that carries no reset hint; doubles per consecutive 429
+DEFAULT_COOLDOWN = 2.0
+MAX_COOLDOWN = 60.0
+
+# Tokens reserved for the completion when checking a model's token budget
+COMPLETION_RESERVE = 1024
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class TokenBucket:
+    """
+    Local mirror of one provider budget (requests or tokens).
+
+    `sync` resets it from rate-limit headers; between responses it refills
+    linearly so it is full again at the provider's reset time, and `take`
+    reserves capacity for requests in flight.
+    """
+    __slots__ = ("capacity", "tokens", "rate", "updated")
+
+    def __init__(self, capacity: float, tokens: float, rate: float, now: float):
+        self.capacity = capacity
+        self.tokens = tokens
+        self.rate = rate
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def take(self, amount: float, now: float) -> None:
+        self.tokens = self.available(now) - amount
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` is available (0 if it already is).
+        """
+        missing = min(amount, self.capacity) - self.available(now)
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else MAX_COOLDOWN
+
+    def sync(self, limit: float, remaining: float, reset: Optional[float], now: float) -> None:
+        self.capacity = limit
+        self.tokens = remaining
+        # A full bucket refills its whole limit by the reset time, so reservations
+        # for calls that fail without headers are still given back
+        used = limit - remaining if remaining < limit else limit
+        self.rate = used / reset if reset else limit / 60.0
+        self.updated = now
+
+
+class ModelState:
+    __slots__ = ("requests", "tokens", "open_until", "consecutive_429s")
+
+    def __init__(self) -> None:
+        # Unknown until the first response with rate-limit headers
+        self.requests: Optional[TokenBucket] = None
+        self.tokens: Optional[TokenBucket] = None
+        self.open_until = 0.0
+        self.consecutive_429s = 0
+
+
+class ModelRouter:
+    """
+    Pick a model from the fallback chain that has rate-limit capacity left.
+
+    Budgets come from Groq's `x-ratelimit-*` response headers and are tracked in
+    local token buckets. A 429 opens a model's circuit until its reset time, so
+    later calls go straight to a model with capacity instead of paying a failed
+    round trip first. When every model is exhausted, callers wait with jittered
+    backoff until the earliest one frees up.
+
+    Thread-safe; one router is shared by all calls of a `GroqClient`.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0
+    ):
+        self.models = list(models)
+        self.clock = clock
+        self.rng = rng
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats = {"rate_limited": 0, "skipped": 0, "waits": 0}
+        self._states: Dict[str, ModelState] = {m: ModelState() for m in self.models}
+        self._lock = threading.Lock()
+
+    def candidates(self, estimated_tokens: int) -> List[str]:
+        """
+        Models that can take a request of `estimated_tokens` now, in priority
+        order. Capacity is reserved on the first one, which callers try first.
+        """
+        needed = estimated_tokens + COMPLETION_RESERVE
+        now = self.clock()
+        with self._lock:
+            ready = [m for m in self.models if self._has_capacity(self._states[m], needed, now)]
+            self.stats["skipped"] += len(self.models) - len(ready)
+            if ready:
+                state = self._states[ready[0]]
+                if state.requests is not None:
+                    state.requests.take(1, now)
+                if state.tokens is not None:
+                    state.tokens.take(needed, now)
+            return ready
+
+    def backoff(self, estimated_tokens: int, attempt: int) -> float:
+        """
+        Seconds to wait before retrying when no model has capacity: until the
+        earliest model frees up, plus exponential full jitter.
+        """
+        needed = estimated_tokens + COMPLETION_RESERVE
+        now = self.clock()
+        with self._lock:
+            wait = min(self._wait_for(self._states[m], needed, now) for m in self.models)
+            self.stats["waits"] += 1
+        jitter = self.rng() * min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return min(wait, MAX_COOLDOWN) + jitter
+
+    def observe(self, model: str, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """
+        Update a model's budgets from a response's rate-limit headers.
+        """
+        state = self._states.get(model)
+        if state is None:
+            return
+        now = self.clock()
+        if status_code == 429:
+            self.record_rate_limit(model, _retry_after(headers))
+            return
+
+        with self._lock:
+            state.consecutive_429s = 0
+            for kind in ("requests", "tokens"):
+                limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+                if limit is None or remaining is None:
+                    continue
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                bucket = getattr(state, kind)
+                if bucket is None:
+                    bucket = TokenBucket(limit, remaining, 0.0, now)
+                    setattr(state, kind, bucket)
+                bucket.sync(limit, remaining, reset, now)
+
+    def record_rate_limit(self, model: str, retry_after: Optional[float] = None) -> None:
+        """
+        Open a model's circuit after a 429, until `retry_after` seconds from now or,
+        without a hint, for a cool-down that doubles with each consecutive 429.
+        """
+        state = self._states.get(model)
+        if state is None:
+            return
+        now = self.clock()
+        with self._lock:
+            state.consecutive_429s += 1
+            if retry_after is None:
+                retry_after = min(MAX_COOLDOWN, DEFAULT_COOLDOWN * (2 ** (state.consecutive_429s - 1)))
+            state.open_until = max(state.open_until, now + retry_after)
+            self.stats["rate_limited"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        now = self.clock()
+        with self._lock:
+            return {
+                model: {
+                    "open_for_s": round(max(0.0, state.open_until - now), 2),
+                    "requests_left": round(state.requests.available(now), 1) if state.requests else None,
+                    "tokens_left": round(state.tokens.available(now), 1) if state.tokens else None,
+                }
+                for model, state in self._states.items()
+            }
+
+    def _has_capacity(self, state: ModelState, needed: int, now: float) -> bool:
+        return self._wait_for(state, needed, now) == 0.0
+
+    def _wait_for(self, state: ModelState, needed: int, now: float) -> float:
+        wait = max(0.0, state.open_until - now)
+        if state.requests is not None:
+            wait = max(wait, state.requests.wait_for(1, now))
+        if state.tokens is not None:
+            wait = max(wait, state.tokens.wait_for(needed, now))
+        return wait
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse Groq reset durations such as "7.66s", "2m59.56s" or "120ms" into seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    number = _number(value)
+    if number is not None:
+        return number
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    seconds = parse_duration(headers.get("retry-after"))
+    if seconds is not None:
+        return seconds
+    # Otherwise wait for whichever exhausted budget resets last
+    resets = [
+        parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        for kind in ("requests", "tokens")
+        if _number(headers.get(f"x-ratelimit-remaining-{kind}")) == 0
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,92 @@
+from typing import Dict, List, Tuple
+from ..diff import DiffIndex
+from ..schemas import ReviewComment, ReviewResponse
+
+
+def split_diff(index: DiffIndex, max_lines: int) -> List[str]:
+    """
+    Split a parsed diff into shards of at most ~`max_lines` lines.
+
+    Whole files are packed together while they fit. A file larger than a shard is
+    split at hunk boundaries, and every piece keeps the file header so it is a
+    valid diff on its own. A single hunk is never split.
+    """
+    shards: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    def flush() -> None:
+        nonlocal current, current_len
+        if current:
+            shards.append("".join(current))
+        current = []
+        current_len = 0
+
+    for file in index:
+        if file.lines <= max_lines or len(file.hunks) <= 1:
+            if current_len + file.lines > max_lines:
+                flush()
+            current.append(index.section(file))
+            current_len += file.lines
+            continue
+
+        # Oversized file: group its hunks, repeating the header in each group
+        flush()
+        header = index.header(file)
+        header_len = file.lines - sum(h.lines for h in file.hunks)
+        group_start = file.hunks[0].start
+        group_len = header_len
+        for previous, hunk in zip(file.hunks, file.hunks[1:]):
+            group_len += previous.lines
+            if group_len + hunk.lines > max_lines:
+                shards.append(header + index.text[group_start:hunk.start])
+                group_start = hunk.start
+                group_len = header_len
+        shards.append(header + index.text[group_start:file.end])
+
+    flush()
+    return shards
+
+
+def merge_reviews(reviews: List[ReviewResponse]) -> ReviewResponse:
+    """
+    Merge per-shard reviews into one, dropping duplicate summary points and comments.
+    """
+    summary: List[str] = []
+    seen_summary = set()
+    comments: List[ReviewComment] = []
+    seen_comments: Dict[Tuple, int] = {}
+    reflections: List[str] = []
+
+    for review in reviews:
+        for point in review.summary:
+            key = _normalize(point)
+            if key not in seen_summary:
+                seen_summary.add(key)
+                summary.append(point)
+
+        for comment in review.comments:
+            key = (comment.file, comment.start_line, comment.end_line, _normalize(comment.message))
+            if key in seen_comments:
+                # Keep the most severe variant of a duplicated comment
+                index = seen_comments[key]
+                if _SEVERITY_RANK[comment.severity] > _SEVERITY_RANK[comments[index].severity]:
+                    comments[index] = comment
+                continue
+            seen_comments[key] = len(comments)
+            comments.append(comment)
+
+        reflections.extend(review.reflections or [])
+
+    return ReviewResponse(
+        summary=summary,
+        comments=comments,
+        reflections=reflections or None,
+    )
+
+
+_SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
@@ -0,0 +1,120 @@
+import json
+import re
+from typing import List, Optional
+from pydantic import ValidationError
+from ..schemas import ReviewComment
+
+# Reasoning models may think out loud before answering when JSON mode is off
+THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+class CommentStreamParser:
+    """
+    Incrementally pull `ReviewComment`s out of a streamed review JSON object.
+
+    Feed it response chunks as they arrive; every comment object inside the
+    top-level `"comments"` array is returned as soon as its closing brace has
+    been received. The scanner only tracks strings and nesting depth, so each
+    character is looked at once however the response is chunked.
+    """
+
+    def __init__(self) -> None:
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Last complete string at the root object's level, to recognise the "comments" key
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        # Depth of the "comments" array once entered, and start of the comment being read
+        self._comments_depth = -1
+        self._comment_start = -1
+        # Unscanned input plus whatever an open key or comment still needs
+        self._text = ""
+        # Set once the review object's opening brace has been found
+        self._started = False
+
+    def feed(self, chunk: str) -> List[ReviewComment]:
+        comments: List[ReviewComment] = []
+        offset = len(self._text)
+        self._text += chunk
+        if not self._started:
+            # Skip any reasoning block and code fence before the JSON object
+            if "<think>" in self._text and "</think>" not in self._text:
+                return comments
+            end_of_thoughts = self._text.find("</think>")
+            start = self._text.find("{", end_of_thoughts + 1 if end_of_thoughts >= 0 else 0)
+            if start < 0:
+                return comments
+            self._text = self._text[start:]
+            self._started = True
+            offset = 0
+        text = self._text
+
+        for i in range(offset, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._string_start >= 0:
+                        self._last_key = text[self._string_start:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1 if self._depth == 1 else -1
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_key == "comments":
+                    self._comments_depth = 2
+                elif char == "{" and self._comments_depth == 2 and self._depth == 3:
+                    self._comment_start = i
+            elif char in "}]":
+                if char == "}" and self._depth == 3 and self._comment_start >= 0:
+                    comment = _parse_comment(text[self._comment_start:i + 1])
+                    if comment is not None:
+                        comments.append(comment)
+                    self._comment_start = -1
+                elif char == "]" and self._depth == 2 and self._comments_depth == 2:
+                    self._comments_depth = -1
+                self._depth -= 1
+                if self._depth == 1:
+                    self._last_key = None
+
+        self._trim()
+        return comments
+
+    def _trim(self) -> None:
+        keep = len(self._text)
+        if self._comment_start >= 0:
+            keep = self._comment_start
+        elif self._in_string and self._string_start >= 0:
+            keep = self._string_start
+        self._text = self._text[keep:]
+        if self._comment_start >= 0:
+            self._comment_start -= keep
+        if self._string_start >= 0:
+            self._string_start -= keep
+
+
+def _parse_comment(text: str) -> Optional[ReviewComment]:
+    try:
+        return ReviewComment(**json.loads(text))
+    except (ValueError, TypeError, ValidationError):
+        # A malformed comment is dropped here; the final parse of the whole review decides
+        return None
+
+
+def extract_json_object(text: str) -> str:
+    """
+    Return the JSON object in a free-form completion, dropping reasoning blocks,
+    code fences and any other text around it.
+    """
+    text = THINK_BLOCK.sub("", text)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return text
+    return text[start:end + 1]
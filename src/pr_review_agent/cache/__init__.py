@@ -0,0 +1,5 @@
+from .blobs import BlobStore, blob_digest
+from .tools import ToolResultCache
+from .llm import LLMCacheMiss, LLMCacheMode, LLMResponseCache
+
+__all__ = ["BlobStore", "blob_digest", "ToolResultCache", "LLMCacheMiss", "LLMCacheMode", "LLMResponseCache"]
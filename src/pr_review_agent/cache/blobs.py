@@ -0,0 +1,171 @@
+import hashlib
+import mmap
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+
+
+class BlobStore:
+    """
+    Content-addressed store for large tool output, so that review state
+    carries small handles instead of the text itself.
+
+    Blobs are keyed by the SHA-256 of their bytes, so the same output stored
+    twice is kept once. Without `directory` blobs stay in memory; with it they
+    are written to files there and read back through `mmap`, so `get` returns
+    a view of the page cache rather than a copy and the process doesn't hold
+    the output. `close` drops every blob and deletes their files.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        # Set for directories created by `temporary`, which `close` removes
+        self._owns_directory = False
+        self._created = False
+        self._memory: Dict[str, bytes] = {}
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def temporary(cls) -> "BlobStore":
+        """
+        File-backed store in a new temporary directory, created by the first
+        `put` and removed by `close`.
+        """
+        store = cls(os.path.join(tempfile.gettempdir(), f"pr-agent-blobs-{os.getpid()}-{secrets.token_hex(8)}"))
+        store._owns_directory = True
+        return store
+
+    def put(self, data: Union[str, bytes]) -> str:
+        """
+        Store `data` (str is stored as UTF-8) and return its digest.
+        """
+        raw = data.encode("utf-8", errors="surrogateescape") if isinstance(data, str) else data
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            if digest in self._sizes:
+                return digest
+        if self.directory is None:
+            stored = False
+        else:
+            if not self._created:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                self._created = True
+            # Written under a temporary name, so a reader never maps a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, self._path(digest))
+            stored = True
+        with self._lock:
+            if not stored:
+                self._memory[digest] = raw
+            self._sizes[digest] = len(raw)
+        return digest
+
+    def get(self, digest: str) -> memoryview:
+        """
+        Bytes of a blob, without copying them. Raises KeyError for unknown digests.
+        """
+        with self._lock:
+            if digest not in self._sizes:
+                raise KeyError(digest)
+            if self.directory is None:
+                return memoryview(self._memory[digest])
+            if self._sizes[digest] == 0:
+                # mmap can't map empty files
+                return memoryview(b"")
+            mapped = self._maps.get(digest)
+            if mapped is None:
+                with open(self._path(digest), "rb") as f:
+                    mapped = self._maps[digest] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(mapped)
+
+    def text(self, digest: str) -> str:
+        return str(self.get(digest), "utf-8", "replace")
+
+    def offload(self, result: Any, min_bytes: int, fingerprint: Optional[Callable[[str], str]] = None) -> Any:
+        """
+        Copy of a tool result whose string fields of `min_bytes` or more are
+        replaced by handles: `{"blob": digest, "bytes": size}`.
+
+        With `fingerprint`, handles also keep `fingerprint(text)`, so callers
+        can compare outputs by it without reading the blobs back.
+        """
+        if not isinstance(result, dict):
+            return result
+        offloaded = dict(result)
+        for key, value in result.items():
+            if isinstance(value, str) and len(value) >= min_bytes:
+                digest = self.put(value)
+                handle: Dict[str, Any] = {"blob": digest, "bytes": self._sizes[digest]}
+                if fingerprint is not None:
+                    handle["fingerprint"] = fingerprint(value)
+                offloaded[key] = handle
+        return offloaded
+
+    def resolve(self, result: Any) -> Any:
+        """
+        Copy of a tool result with its blob handles replaced by their text.
+        Handles of blobs this store doesn't have are left as they are.
+        """
+        if not isinstance(result, dict):
+            return result
+        resolved = dict(result)
+        for key, value in result.items():
+            digest = blob_digest(value)
+            if digest is not None and digest in self:
+                resolved[key] = self.text(digest)
+        return resolved
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def close(self) -> None:
+        with self._lock:
+            for mapped in self._maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    # A view is still held somewhere; the mapping goes with it
+                    pass
+            self._maps.clear()
+            self._memory.clear()
+            digests = list(self._sizes)
+            self._sizes.clear()
+        if self.directory is None or not self._created:
+            return
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        for digest in digests:
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def __contains__(self, digest: object) -> bool:
+        with self._lock:
+            return digest in self._sizes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sizes)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory or "", digest)
+
+
+def blob_digest(value: Any) -> Optional[str]:
+    """
+    Digest of a blob handle, or None if `value` is not one.
+    """
+    if isinstance(value, dict) and value.keys() in ({"blob", "bytes"}, {"blob", "bytes", "fingerprint"}) and isinstance(value["blob"], str):
+        return value["blob"]
+    return None
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Literal, Optional
+from ..config import default_cache_dir
+
+LLMCacheMode = Literal["off", "on", "record", "replay"]
+
+# Entries older than this are called again in `on` mode (seconds)
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of chat completions in a SQLite file.
+
+    Keys hash the model chain, temperature, json_mode and the exact messages, so
+    only byte-identical requests are answered from the cache.
+
+    Responses are stored only once the caller has parsed them (see
+    `GroqClient.chat_completion`'s `validate`), so a truncated or malformed
+    completion is not replayed.
+
+    Modes:
+    - on: answer from the cache when possible, store new responses. Entries
+      older than `max_age` seconds are called again.
+    - record: always call the API and (re)store every response.
+    - replay: answer only from the cache; a miss raises `LLMCacheMiss`, so a
+      recorded review can be replayed offline and deterministically.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: LLMCacheMode = "on",
+        max_entries: int = 10000,
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+    ):
+        if mode == "off":
+            raise ValueError("Use no cache instead of an LLMResponseCache in 'off' mode")
+        self.path = path or os.path.join(default_cache_dir(), "llm.sqlite3")
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    @staticmethod
+    def key(models: List[str], temperature: float, json_mode: bool, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps(
+            {"models": models, "temperature": temperature, "json_mode": json_mode, "messages": messages},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Return the cached response for `key`, or None if the API should be called.
+        """
+        if self.mode == "record":
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            # Recordings never expire: replay must stay deterministic
+            if row is not None and self.mode == "on" and self.max_age is not None and now - row[1] > self.max_age:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                with self._conn:
+                    self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self.stats["hits"] += 1
+                return row[0]
+            self.stats["misses"] += 1
+
+        if self.mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for request {key[:12]} in {self.path}")
+        return None
+
+    def store(self, key: str, model: str, response: str) -> None:
+        if self.mode == "replay":
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self.stats["stores"] += 1
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.stats["evictions"] += excess
+
+    def discard(self, key: str) -> None:
+        """
+        Drop the response for `key`, e.g. one its caller could not parse.
+        """
+        if self.mode == "replay":
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import default_cache_dir
+
+
+class ToolResultCache:
+    """
+    On-disk cache of tool results, keyed by tool, arguments, cwd and a fingerprint
+    of the working tree.
+
+    Entries are JSON files named by the key hash. A hit refreshes the file's mtime,
+    so evicting the oldest mtimes first gives LRU order once the cache grows past
+    `max_bytes`. Entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+    ):
+        self.directory = directory or os.path.join(default_cache_dir(), "tools")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(tool: str, args: Dict[str, Any], cwd: str, fingerprint: str) -> str:
+        payload = json.dumps(
+            {"tool": tool, "args": args, "cwd": os.path.abspath(cwd), "tree": fingerprint},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            self._count("misses")
+            return None
+
+        try:
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return entry["value"]
+
+    def put(self, key: str, value: Any) -> None:
+        data = json.dumps({"created_at": time.time(), "value": value}, default=str).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            path = self._path(key)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self.stats["stores"] += 1
+            if self._size is not None:
+                self._size += len(data) - previous
+        self._evict()
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.directory, name))
+        with self._lock:
+            self._size = 0
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            if self._size <= self.max_bytes:
+                return
+            for path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+                if self._size <= self.max_bytes:
+                    break
+                self._remove(path)
+                self._size -= size
+                self.stats["evictions"] += 1
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,15 +1,26 @@
+import json
 import typer
 import os
+import sys
 from rich.console import Console
 from rich.panel import Panel
-from typing import Optional, cast, Any
-from .schemas import ReviewRequest, ModelSettings
-from .agent.client import GroqClient
-from .agent.orchestrator import ReviewOrchestrator
-from .tools.git import git_diff
+from typing import TYPE_CHECKING, Optional, Set, Tuple, cast, Any
+from .schemas import ModelSettings
+from .agent.orchestrator import build_review_request
+from .server import ServerUnavailable, default_address, forward_review
+from .git import MAX_DIFF_FILE_BYTES, MAX_DIFF_TOTAL_BYTES
+from .tracing import PROFILE_FORMATS, Tracer
+
+# The LLM client, graph and batch runner are imported inside the commands that
+# need them, so `--help` and runs without changes start fast
+if TYPE_CHECKING:
+    from .cache import LLMResponseCache
+    from .schemas import ReviewRequest, ReviewResponse
 
 app = typer.Typer()
 console = Console()
+# Progress and diagnostics when stdout carries machine-readable output
+err_console = Console(stderr=True)
 
 @app.command()
 def review(
@@ -19,11 +30,30 @@ def review(
     head_ref: Optional[str] = typer.Option(None, help="Head reference for diff"),
     model: str = typer.Option("qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant", help="Comma-separated list of Groq models for fallback priority"),
     max_iters: int = typer.Option(7, help="Maximum number of ReAct iterations"),
-    format: str = typer.Option("markdown", help="Output format: markdown, json"),
+    max_tool_concurrency: int = typer.Option(4, help="Maximum number of tools run in parallel per iteration"),
+    review_mode: str = typer.Option("auto", help="Review mode: auto, single, map_reduce (per-shard review for large diffs)"),
+    review_shard_max_lines: int = typer.Option(400, help="Maximum diff lines per review shard in map-reduce mode"),
+    review_parallelism: int = typer.Option(4, help="Maximum number of diff shards reviewed in parallel"),
+    format: str = typer.Option("markdown", help="Output format: markdown, json, jsonl (streamed events)"),
     trace: bool = typer.Option(False, "--trace", help="Enable LangSmith tracing"),
     project: str = typer.Option("pr-review-agent", "--project", help="LangSmith project name"),
     verbose: bool = typer.Option(False, "--verbose", help="Enable verbose logging"),
     unsafe: bool = typer.Option(False, "--unsafe", help="Disable security checks (DANGEROUS)"),
+    tool_cache: bool = typer.Option(True, "--tool-cache/--no-tool-cache", help="Reuse cached tool results when the working tree is unchanged"),
+    persistent_shell: bool = typer.Option(True, "--persistent-shell/--no-persistent-shell", help="Reuse warm shell sessions across iterations"),
+    detect_project: bool = typer.Option(True, "--detect-project/--no-detect-project", help="Detect test, lint and typecheck commands before planning"),
+    speculative_checks: bool = typer.Option(True, "--speculative-checks/--no-speculative-checks", help="Run detected checks during the first plan"),
+    diff_scoped_lint: bool = typer.Option(True, "--diff-scoped-lint/--no-diff-scoped-lint", help="Lint only changed files and keep findings in changed hunks"),
+    blob_store: str = typer.Option("file", help="Where large tool output is kept: file (mmap) or memory"),
+    llm_cache: str = typer.Option(os.getenv("PR_AGENT_LLM_CACHE", "on"), help="LLM response cache: on, off, record, replay (offline, no API key)"),
+    llm_cache_path: Optional[str] = typer.Option(None, help="SQLite file for the LLM response cache"),
+    max_diff_file_bytes: int = typer.Option(MAX_DIFF_FILE_BYTES, help="Per-file cap on diff bytes; larger patches are truncated"),
+    max_diff_total_bytes: int = typer.Option(MAX_DIFF_TOTAL_BYTES, help="Cap on total diff bytes; git is stopped once reached"),
+    incremental: bool = typer.Option(False, "--incremental", help="Only review hunks added or changed since the last review of this branch"),
+    server: bool = typer.Option(True, "--server/--no-server", help="Forward to a running `pr-agent serve` daemon if there is one"),
+    server_address: Optional[str] = typer.Option(None, help="Server socket path or http://host:port (default: PR_AGENT_SERVER)"),
+    profile_out: Optional[str] = typer.Option(None, "--profile-out", help="Write the review's timing spans to this file (reviews locally)"),
+    profile_format: str = typer.Option("chrome", help="Profile format: chrome (chrome://tracing, Perfetto) or otel (OpenTelemetry OTLP/JSON)"),
 ):
     """
     Run the PR Review Agent on a local diff.
@@ -36,101 +66,323 @@ def review(
         os.environ["LANGCHAIN_PROJECT"] = project
     
     try:
-        # 1. Get the diff
-        diff = git_diff.invoke({
-            "repo_root": repo_root,
-            "mode": mode,
-            "base_ref": base_ref,
-            "head_ref": head_ref
-        })
-        if not diff:
-            console.print("[yellow]No changes detected.[/yellow]")
-            return
+        # stdout only carries the review in json and jsonl formats
+        log = err_console if format in ("json", "jsonl") else console
+        if profile_out and profile_format not in PROFILE_FORMATS:
+            raise ValueError(f"Unknown profile format: {profile_format} (expected one of {', '.join(PROFILE_FORMATS)})")
 
-        # 2. Prepare the request
-        settings = ModelSettings(model=model, max_iters=max_iters, verbose=verbose, unsafe_mode=unsafe)
-        request = ReviewRequest(
-            repo_root=repo_root,
-            mode=cast(Any, mode),
-            base_ref=base_ref,
-            head_ref=head_ref,
-            diff=diff,
-            settings=settings
+        # 1. Prepare the settings
+        settings = ModelSettings(
+            model=model,
+            max_iters=max_iters,
+            max_tool_concurrency=max_tool_concurrency,
+            review_mode=cast(Any, review_mode),
+            review_shard_max_lines=review_shard_max_lines,
+            review_parallelism=review_parallelism,
+            verbose=verbose,
+            unsafe_mode=unsafe,
+            tool_cache=tool_cache,
+            persistent_shell=persistent_shell,
+            detect_project=detect_project,
+            speculative_checks=speculative_checks,
+            diff_scoped_lint=diff_scoped_lint,
+            blob_store=cast(Any, blob_store)
         )
 
-        # 3. Initialize Agent
-        client = GroqClient(model=model)
-        orchestrator = ReviewOrchestrator(request, client)
+        # 2. Get the diff (single streaming git call, size-capped)
+        tracer = Tracer()
+        with tracer.activate():
+            request = build_review_request(
+                repo_root, mode, base_ref, head_ref, settings,
+                max_file_bytes=max_diff_file_bytes,
+                max_total_bytes=max_diff_total_bytes
+            )
+        if request is None:
+            log.print("[yellow]No changes detected.[/yellow]")
+            return
+        truncated = [s.path for s in request.diff_stats if s.truncated]
+        if truncated:
+            log.print(f"[yellow]Diff truncated by size caps for {len(truncated)} file(s).[/yellow]")
+
+        # 3. Run Review, on a warm server if one is running
+        shown: Set[Tuple] = set()
+        streamed = False
+
+        def run_review(review_request: "ReviewRequest") -> "ReviewResponse":
+            nonlocal streamed
+            # Tracing, profiling, verbose logs and non-default LLM cache settings need the review to run in this process
+            client_only = trace or profile_out or verbose or llm_cache != "on" or llm_cache_path
+            if server and not client_only:
+                try:
+                    with log.status("[bold green]Agent is reviewing the PR (server)..."):
+                        return forward_review(review_request, server_address)
+                except ServerUnavailable:
+                    pass
+                except RuntimeError as e:
+                    log.print(f"[yellow]Review server failed ({e}); reviewing locally.[/yellow]")
+
+            from .agent.client import GroqClient
+            from .agent.orchestrator import ReviewOrchestrator
+
+            client = GroqClient(model=model, llm_cache=_make_llm_cache(llm_cache, llm_cache_path))
+            orchestrator = ReviewOrchestrator(review_request, client, tracer=tracer)
+            # Incremental reviews add carried-forward comments afterwards, so they aren't streamed
+            if format == "json" or incremental:
+                with log.status("[bold green]Agent is reviewing the PR..."):
+                    return orchestrator.run()
+            # Comments are shown as soon as they are generated
+            streamed = True
+            return _stream_review(orchestrator, format, shown)
+
+        if incremental:
+            from .agent.ledger import IncrementalReview
 
-        # 4. Run Review
-        with console.status("[bold green]Agent is reviewing the PR..."):
-            response = orchestrator.run()
+            response = IncrementalReview().run(request, run_review)
+            stats = response.metadata["incremental"]
+            if format != "jsonl":
+                log.print(
+                    f"[dim]Incremental: reviewed {stats['reviewed_hunks']} new hunk(s), "
+                    f"carried {stats['carried_comments']} comment(s) from {stats['carried_hunks']} unchanged hunk(s).[/dim]"
+                )
+        else:
+            response = run_review(request)
+        if format == "jsonl" and not streamed:
+            for comment in response.comments:
+                _write_event({"event": "comment", "comment": comment.model_dump()})
+            _write_event({"event": "review", "review": response.model_dump()})
 
-        # 5. Output results
+        # 4. Output results
         if format == "json":
             console.print(response.model_dump_json(indent=2))
-        else:
-            _render_markdown(response)
+        elif format != "jsonl":
+            _render_markdown(response, shown)
             
-        # 6. Show trace info
+        # 5. Show trace info
+        if profile_out:
+            tracer.export(profile_out, profile_format)
+            log.print(f"\n[dim]Profile written to {profile_out}[/dim]")
         if trace:
-            console.print(f"\n[dim]View trace at: https://smith.langchain.com/o/{os.getenv('LANGCHAIN_ORG_ID', 'default')}/projects/p/{project}[/dim]")
+            log.print(f"\n[dim]View trace at: https://smith.langchain.com/o/{os.getenv('LANGCHAIN_ORG_ID', 'default')}/projects/p/{project}[/dim]")
+
+
+    except Exception as e:
+        log.print(f"[red]Error:[/red] {str(e)}")
+        raise typer.Exit(code=1)
+
+@app.command("review-batch")
+def review_batch(
+    manifest: str = typer.Argument(..., help="JSONL manifest: one {repo_root, mode, base_ref, head_ref[, id]} object per line"),
+    output: str = typer.Option("review-results.jsonl", "--output", "-o", help="JSONL file results are streamed to"),
+    concurrency: int = typer.Option(4, help="Maximum number of reviews run at once"),
+    model: str = typer.Option("qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant", help="Comma-separated list of Groq models for fallback priority"),
+    max_iters: int = typer.Option(7, help="Maximum number of ReAct iterations"),
+    max_tool_concurrency: int = typer.Option(4, help="Maximum number of tools run in parallel per iteration"),
+    verbose: bool = typer.Option(False, "--verbose", help="Enable verbose logging"),
+    unsafe: bool = typer.Option(False, "--unsafe", help="Disable security checks (DANGEROUS)"),
+    tool_cache: bool = typer.Option(True, "--tool-cache/--no-tool-cache", help="Reuse cached tool results when the working tree is unchanged"),
+    persistent_shell: bool = typer.Option(True, "--persistent-shell/--no-persistent-shell", help="Reuse warm shell sessions across iterations"),
+    detect_project: bool = typer.Option(True, "--detect-project/--no-detect-project", help="Detect test, lint and typecheck commands before planning"),
+    speculative_checks: bool = typer.Option(True, "--speculative-checks/--no-speculative-checks", help="Run detected checks during the first plan"),
+    diff_scoped_lint: bool = typer.Option(True, "--diff-scoped-lint/--no-diff-scoped-lint", help="Lint only changed files and keep findings in changed hunks"),
+    blob_store: str = typer.Option("file", help="Where large tool output is kept: file (mmap) or memory"),
+    llm_cache: str = typer.Option(os.getenv("PR_AGENT_LLM_CACHE", "on"), help="LLM response cache: on, off, record, replay (offline, no API key)"),
+    llm_cache_path: Optional[str] = typer.Option(None, help="SQLite file for the LLM response cache"),
+    max_diff_file_bytes: int = typer.Option(MAX_DIFF_FILE_BYTES, help="Per-file cap on diff bytes; larger patches are truncated"),
+    max_diff_total_bytes: int = typer.Option(MAX_DIFF_TOTAL_BYTES, help="Cap on total diff bytes; git is stopped once reached"),
+):
+    """
+    Review many branches or commit ranges in one process, sharing one client and caches.
+    """
+    from .agent.batch import BatchRunner, read_manifest
+    from .agent.client import GroqClient
+
+    try:
+        settings = ModelSettings(
+            model=model,
+            max_iters=max_iters,
+            max_tool_concurrency=max_tool_concurrency,
+            verbose=verbose,
+            unsafe_mode=unsafe,
+            tool_cache=tool_cache,
+            persistent_shell=persistent_shell,
+            detect_project=detect_project,
+            speculative_checks=speculative_checks,
+            diff_scoped_lint=diff_scoped_lint,
+            blob_store=cast(Any, blob_store)
+        )
+        with open(manifest, "r", encoding="utf-8") as f:
+            items = read_manifest(f)
+
+        client = GroqClient(model=model, llm_cache=_make_llm_cache(llm_cache, llm_cache_path))
+        runner = BatchRunner(
+            client, settings,
+            concurrency=concurrency,
+            max_file_bytes=max_diff_file_bytes,
+            max_total_bytes=max_diff_total_bytes
+        )
+        with open(output, "w", encoding="utf-8") as out:
+            with console.status(f"[bold green]Reviewing {len(items)} diffs..."):
+                summary = runner.run(items, out)
+    except Exception as e:
+        console.print(f"[red]Error:[/red] {str(e)}")
+        raise typer.Exit(code=1)
+
+    console.print(Panel("[bold]Batch Summary[/bold]", style="cyan"))
+    for key, value in summary.items():
+        console.print(f"• {key}: {value}")
+    console.print(f"\n[dim]Results written to {output}[/dim]")
+    if summary["error"]:
+        raise typer.Exit(code=1)
 
+@app.command()
+def serve(
+    address: Optional[str] = typer.Option(None, help="Unix socket path or http://host:port to listen on (default: PR_AGENT_SERVER)"),
+    workers: int = typer.Option(2, help="Maximum number of reviews run at once"),
+    max_pending: int = typer.Option(16, help="Reviews queued for a worker before new ones are rejected"),
+    model: str = typer.Option("qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant", help="Model chain to warm up at startup"),
+    llm_cache: str = typer.Option(os.getenv("PR_AGENT_LLM_CACHE", "on"), help="LLM response cache: on, off, record, replay (offline, no API key)"),
+    llm_cache_path: Optional[str] = typer.Option(None, help="SQLite file for the LLM response cache"),
+    verbose: bool = typer.Option(False, "--verbose", help="Log every request"),
+    unsafe: bool = typer.Option(False, "--unsafe", help="Disable security checks for every review (DANGEROUS); clients can't enable them"),
+    token: Optional[str] = typer.Option(None, help="Shared secret clients must send (default: PR_AGENT_SERVER_TOKEN)"),
+):
+    """
+    Run a long-lived review server; `pr-agent review` forwards to it while it runs.
+    """
+    from .server import ReviewService, serve as serve_forever
 
+    address = address or default_address()
+    try:
+        service = ReviewService(workers=workers, max_pending=max_pending, llm_cache=_make_llm_cache(llm_cache, llm_cache_path), unsafe_mode=unsafe)
+        service.warm_up(model)
+        console.print(f"[green]Review server listening on {address}[/green] ({workers} workers)")
+        serve_forever(service, address, verbose=verbose, token=token)
+    except KeyboardInterrupt:
+        console.print("[dim]Review server stopped.[/dim]")
     except Exception as e:
         console.print(f"[red]Error:[/red] {str(e)}")
         raise typer.Exit(code=1)
 
-def _render_markdown(response):
+def _make_llm_cache(mode: str, path: Optional[str]) -> Optional["LLMResponseCache"]:
+    from .cache import LLMResponseCache
+
+    if mode not in ("on", "off", "record", "replay"):
+        raise ValueError(f"Invalid --llm-cache mode: {mode}")
+    if mode == "off":
+        return None
+    return LLMResponseCache(path=path, mode=cast(Any, mode))
+
+def _stream_review(orchestrator, format: str, shown: Set[Tuple]):
+    """
+    Run the review as a stream of events. jsonl writes every event as a line;
+    markdown shows progress in the spinner and prints comments as they arrive.
+    """
+    from .schemas import ReviewComment, ReviewResponse
+
+    review = None
+    with (err_console if format == "jsonl" else console).status("[bold green]Planning...") as status:
+        for event in orchestrator.stream():
+            if format == "jsonl":
+                _write_event(event)
+            kind = event["event"]
+            if kind == "plan":
+                tools = event["tools"]
+                if tools:
+                    status.update(f"[bold green]Running {len(tools)} tool(s): {', '.join(map(str, tools))}...")
+                else:
+                    status.update("[bold green]Writing review...")
+            elif kind == "tools":
+                status.update("[bold green]Planning next step...")
+            elif kind == "comment" and format != "jsonl":
+                comment = ReviewComment(**event["comment"])
+                if not shown:
+                    console.print("[bold magenta]Review Comments[/bold magenta]")
+                shown.add(_comment_key(comment))
+                _render_comment(comment)
+            elif kind == "retract" and format != "jsonl":
+                comment = ReviewComment(**event["comment"])
+                shown.discard(_comment_key(comment))
+                console.print(f"[dim]Withdrawn: {comment.file}:{comment.start_line} {comment.message}[/dim]")
+            elif kind == "review":
+                review = ReviewResponse(**event["review"])
+    return review
+
+def _write_event(event):
+    sys.stdout.write(json.dumps(event, default=str) + "\n")
+    sys.stdout.flush()
+
+def _comment_key(comment) -> Tuple:
+    return (comment.file, comment.start_line, comment.end_line, comment.message)
+
+def _render_markdown(response, shown: Optional[Set[Tuple]] = None):
+    """
+    Print the summary and every comment not already printed while streaming.
+    """
+    shown = shown or set()
     console.print(Panel("[bold]PR Review Summary[/bold]", style="cyan"))
     for s in response.summary:
         console.print(f"• {s}")
     console.print()
 
-    if response.comments:
-        console.print("[bold magenta]Review Comments[/bold magenta]")
+    remaining = [c for c in response.comments if _comment_key(c) not in shown]
+    if remaining:
+        console.print("[bold magenta]Review Comments[/bold magenta]" if not shown else "[bold magenta]More Review Comments[/bold magenta]")
         
-        for comment in response.comments:
-            severity_color = {
-                "low": "blue",
-                "medium": "yellow",
-                "high": "red",
-                "critical": "bold red reversed"
-            }.get(comment.severity, "white")
-
-            # Build the content of the panel
-            content_parts = []
-            
-            # Message
-            content_parts.append(f"[bold]{comment.message}[/bold]\n")
-            
-            # Evidence (if any)
-            if comment.evidence:
-                content_parts.append(f"[dim]Evidence:[/dim]\n[italic]{comment.evidence}[/italic]\n")
-            
-            # Suggestion (if any)
-            if comment.suggestion:
-                # Basic heuristic to detect language from suggestion or file extension
-                # Ideally, we'd guess from file path, but keeping it simple for now or defaulting to python/text
-                content_parts.append("[green]Suggestion:[/green]")
-                content_parts.append(f"```\n{comment.suggestion}\n```")
-
-            # Final assembly
-            panel_content = "\n".join(content_parts)
-            
-            title = f"{comment.file}"
-            if comment.start_line:
-                title += f":{comment.start_line}"
-                if comment.end_line and comment.end_line != comment.start_line:
-                    title += f"-{comment.end_line}"
-
-            console.print(Panel(
-                panel_content,
-                title=f"[{severity_color}] {comment.severity.upper()} [/] | {title}",
-                border_style=severity_color.split(" ")[-1] if " " not in severity_color else "white", # simple fallback
-                expand=False
-            ))
-            console.print() # spacer
+        for comment in remaining:
+            _render_comment(comment)
 
-if __name__ == "__main__":
+def _render_comment(comment):
+    severity_color = {
+        "low": "blue",
+        "medium": "yellow",
+        "high": "red",
+        "critical": "bold red reversed"
+    }.get(comment.severity, "white")
+
+    # Build the content of the panel
+    content_parts = []
+
+    # Message
+    content_parts.append(f"[bold]{comment.message}[/bold]\n")
+
+    # Evidence (if any)
+    if comment.evidence:
+        content_parts.append(f"[dim]Evidence:[/dim]\n[italic]{comment.evidence}[/italic]\n")
+
+    # Suggestion (if any)
+    if comment.suggestion:
+        # Basic heuristic to detect language from suggestion or file extension
+        # Ideally, we'd guess from file path, but keeping it simple for now or defaulting to python/text
+        content_parts.append("[green]Suggestion:[/green]")
+        content_parts.append(f"```\n{comment.suggestion}\n```")
+
+    # Final assembly
+    panel_content = "\n".join(content_parts)
+
+    title = f"{comment.file}"
+    if comment.start_line:
+        title += f":{comment.start_line}"
+        if comment.end_line and comment.end_line != comment.start_line:
+            title += f"-{comment.end_line}"
+
+    console.print(Panel(
+        panel_content,
+        title=f"[{severity_color}] {comment.severity.upper()} [/] | {title}",
+        border_style=severity_color.split(" ")[-1] if " " not in severity_color else "white", # simple fallback
+        expand=False
+    ))
+    console.print() # spacer
+
+def main():
+    """
+    Console entry point. A bare option list (as used by `pr-review.sh`) still
+    runs the `review` command.
+    """
+    commands = {command.name or command.callback.__name__ for command in app.registered_commands if command.callback}
+    args = sys.argv[1:]
+    if not args or (args[0] not in commands and args[0] not in ("--help", "--install-completion", "--show-completion")):
+        sys.argv.insert(1, "review")
     app()
+
+if __name__ == "__main__":
+    main()
@@ -46,11 +46,21 @@ class AgentConfig:
     def __init__(
         self,
         groq_api_key: Optional[str] = None,
-        langsmith: Optional[LangSmithConfig] = None
+        langsmith: Optional[LangSmithConfig] = None,
+        require_api_key: bool = True
     ):
         self.groq_api_key = groq_api_key or os.getenv("GROQ_API_KEY")
-        if not self.groq_api_key:
+        if require_api_key and not self.groq_api_key:
             raise ValueError("GROQ_API_KEY environment variable not set")
         
         self.langsmith = langsmith or LangSmithConfig()
         self.langsmith.configure()
+
+
+def default_cache_dir() -> str:
+    """Root directory for on-disk caches (`PR_AGENT_CACHE_DIR`, else the XDG cache dir)."""
+    configured = os.getenv("PR_AGENT_CACHE_DIR")
+    if configured:
+        return configured
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pr-review-agent")
@@ -0,0 +1,327 @@
+"""Unified diff parsing into a compact, shareable index."""
+import codecs
+import re
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Inclusive (start, end) line range
+LineRange = Tuple[int, int]
+
+
+class Hunk:
+    """
+    One `@@` hunk. `start`/`end` are character offsets into the diff text, so the
+    hunk's text is a slice of the original string rather than a copy.
+    """
+    __slots__ = ("old_start", "old_len", "new_start", "new_len", "start", "end", "lines", "added", "removed")
+
+    def __init__(self, old_start: int, old_len: int, new_start: int, new_len: int, start: int):
+        self.old_start = old_start
+        self.old_len = old_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.start = start
+        self.end = start
+        # Header plus body lines
+        self.lines = 1
+        # Added lines in the new file / removed lines in the old file, as ranges
+        self.added: List[LineRange] = []
+        self.removed: List[LineRange] = []
+
+    @property
+    def new_end(self) -> int:
+        return self.new_start + max(self.new_len, 1) - 1
+
+    def __repr__(self) -> str:
+        return f"Hunk(-{self.old_start},{self.old_len} +{self.new_start},{self.new_len})"
+
+
+class FileDiff:
+    """
+    All hunks for one file. `start`/`end` delimit the file's section (header and
+    hunks) in the diff text; `header_end` is where its first hunk begins.
+    """
+    __slots__ = ("path", "old_path", "status", "binary", "start", "header_end", "end", "hunks", "lines", "_hunk_starts")
+
+    def __init__(self, path: str, start: int):
+        self.path = path
+        self.old_path = path
+        self.status = "modified"
+        self.binary = False
+        self.start = start
+        self.header_end = start
+        self.end = start
+        self.hunks: List[Hunk] = []
+        # Lines in the file's section, including the "diff --git" line
+        self.lines = 1
+        self._hunk_starts: List[int] = []
+
+    @property
+    def added_lines(self) -> int:
+        return sum(_range_len(h.added) for h in self.hunks)
+
+    @property
+    def removed_lines(self) -> int:
+        return sum(_range_len(h.removed) for h in self.hunks)
+
+    def hunk_at(self, new_line: int) -> Optional[Hunk]:
+        """
+        Return the hunk whose new-file range contains `new_line`.
+        """
+        i = bisect_right(self._hunk_starts, new_line) - 1
+        if i >= 0 and new_line <= self.hunks[i].new_end:
+            return self.hunks[i]
+        return None
+
+    def is_added(self, new_line: int) -> bool:
+        hunk = self.hunk_at(new_line)
+        return hunk is not None and _in_ranges(hunk.added, new_line)
+
+    def old_to_new(self, old_line: int) -> Optional[int]:
+        """
+        Map a line number in the old file to the new file. Returns None for
+        removed lines.
+        """
+        delta = 0
+        for hunk in self.hunks:
+            if old_line < hunk.old_start:
+                break
+            if old_line < hunk.old_start + hunk.old_len:
+                if _in_ranges(hunk.removed, old_line):
+                    return None
+                # Context line: count the removed lines before it, and the added ones
+                # before its position in the new file
+                offset = old_line - hunk.old_start - _count_before(hunk.removed, old_line)
+                new_line = hunk.new_start
+                remaining = offset
+                for start, end in hunk.added:
+                    gap = start - new_line
+                    if remaining < gap:
+                        break
+                    remaining -= gap
+                    new_line = end + 1
+                return new_line + remaining
+            delta += hunk.new_len - hunk.old_len
+        return old_line + delta
+
+    def __repr__(self) -> str:
+        return f"FileDiff({self.path!r}, {self.status}, hunks={len(self.hunks)})"
+
+
+class DiffIndex:
+    """
+    Parsed view of a unified diff, built once per review and shared by prompt
+    building, sharding and comment validation. File lookups are O(1); line
+    lookups bisect a file's hunks.
+    """
+    __slots__ = ("text", "files", "_by_path")
+
+    def __init__(self, text: str, files: List[FileDiff]):
+        self.text = text
+        self.files = files
+        self._by_path: Dict[str, FileDiff] = {}
+        for f in files:
+            self._by_path[f.path] = f
+            self._by_path.setdefault(f.old_path, f)
+
+    @property
+    def changed_files(self) -> List[str]:
+        return [f.path for f in self.files]
+
+    def file(self, path: str) -> Optional[FileDiff]:
+        return self._by_path.get(path)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._by_path
+
+    def __iter__(self) -> Iterator[FileDiff]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def section(self, file: FileDiff) -> str:
+        return self.text[file.start:file.end]
+
+    def header(self, file: FileDiff) -> str:
+        return self.text[file.start:file.header_end]
+
+    def hunk_text(self, hunk: Hunk) -> str:
+        return self.text[hunk.start:hunk.end]
+
+    def hunk_at(self, path: str, new_line: int) -> Optional[Hunk]:
+        f = self._by_path.get(path)
+        return f.hunk_at(new_line) if f else None
+
+    def contains_line(self, path: str, new_line: int) -> bool:
+        """
+        True if `new_line` of `path` is inside one of the diff's hunks.
+        """
+        return self.hunk_at(path, new_line) is not None
+
+
+def parse_diff(text: str) -> DiffIndex:
+    """
+    Parse `git diff` output into a `DiffIndex` in a single pass.
+    """
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    hunk: Optional[Hunk] = None
+    old_line = new_line = 0
+    old_left = new_left = 0
+    offset = 0
+
+    def close_hunk(at: int) -> None:
+        nonlocal hunk
+        if hunk is not None and current is not None:
+            hunk.end = at
+            current.hunks.append(hunk)
+            current._hunk_starts.append(hunk.new_start)
+        hunk = None
+
+    def close_file(at: int) -> None:
+        close_hunk(at)
+        if current is not None:
+            current.end = at
+            if not current.hunks:
+                current.header_end = at
+
+    for line in text.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+
+        if line.startswith("diff --git "):
+            close_file(line_start)
+            current = FileDiff(_git_header_path(line), line_start)
+            files.append(current)
+            continue
+        if current is None:
+            continue
+        current.lines += 1
+
+        if hunk is not None:
+            tag = line[:1]
+            if tag == "\\":
+                # "\ No newline at end of file"
+                hunk.lines += 1
+                continue
+            if (old_left > 0 or new_left > 0) and tag != "@":
+                # Hunk lengths decide where the body ends, so removed lines that look
+                # like headers ("--- x") are still body lines
+                hunk.lines += 1
+                if tag == "+":
+                    _add_to_ranges(hunk.added, new_line)
+                    new_line += 1
+                    new_left -= 1
+                elif tag == "-":
+                    _add_to_ranges(hunk.removed, old_line)
+                    old_line += 1
+                    old_left -= 1
+                else:
+                    # Context, including blank lines whose leading space was stripped
+                    old_line += 1
+                    new_line += 1
+                    old_left -= 1
+                    new_left -= 1
+                continue
+            close_hunk(line_start)
+
+        match = HUNK_HEADER.match(line)
+        if match:
+            if not current.hunks:
+                current.header_end = line_start
+            old_start, old_len, new_start, new_len = match.groups()
+            hunk = Hunk(
+                int(old_start), int(old_len) if old_len is not None else 1,
+                int(new_start), int(new_len) if new_len is not None else 1,
+                line_start,
+            )
+            old_line, new_line = hunk.old_start, hunk.new_start
+            old_left, new_left = hunk.old_len, hunk.new_len
+        elif line.startswith("--- "):
+            path = _strip_prefix(line[4:])
+            if path is not None:
+                current.old_path = path
+            else:
+                current.status = "added"
+        elif line.startswith("+++ "):
+            path = _strip_prefix(line[4:])
+            if path is not None:
+                current.path = path
+            else:
+                current.status = "deleted"
+        elif line.startswith("rename from "):
+            current.old_path = _unquote(line[len("rename from "):].rstrip("\n"))
+            current.status = "renamed"
+        elif line.startswith("rename to "):
+            current.path = _unquote(line[len("rename to "):].rstrip("\n"))
+            current.status = "renamed"
+        elif line.startswith("new file mode"):
+            current.status = "added"
+        elif line.startswith("deleted file mode"):
+            current.status = "deleted"
+        elif line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+            current.binary = True
+
+    close_file(len(text))
+    return DiffIndex(text, files)
+
+
+def _git_header_path(line: str) -> str:
+    rest = line[len("diff --git "):].rstrip("\n")
+    if '"' in rest:
+        # Quoted paths are resolved from the ---/+++ or rename lines
+        return _unquote(rest.rsplit(" ", 1)[-1]).removeprefix("b/")
+    # Unambiguous when both sides are equal: "a/<p> b/<p>", even if <p> has spaces
+    if len(rest) % 2 == 1:
+        half = len(rest) // 2
+        a, b = rest[:half], rest[half + 1:]
+        if a.startswith("a/") and b.startswith("b/") and a[2:] == b[2:]:
+            return b[2:]
+    if " b/" in rest:
+        return rest.rsplit(" b/", 1)[1]
+    return rest
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    path = path.rstrip("\n").split("\t", 1)[0]
+    if path == "/dev/null":
+        return None
+    path = _unquote(path)
+    if path[:2] in ("a/", "b/"):
+        return path[2:]
+    return path
+
+
+def _unquote(path: str) -> str:
+    if path.startswith('"') and path.endswith('"'):
+        # C-style quoting, with non-ASCII bytes as octal escapes
+        return codecs.escape_decode(path[1:-1].encode("utf-8"))[0].decode("utf-8", "replace")
+    return path
+
+
+def _add_to_ranges(ranges: List[LineRange], line: int) -> None:
+    if ranges and ranges[-1][1] == line - 1:
+        ranges[-1] = (ranges[-1][0], line)
+    else:
+        ranges.append((line, line))
+
+
+def _in_ranges(ranges: List[LineRange], line: int) -> bool:
+    i = bisect_right(ranges, line, key=lambda r: r[0]) - 1
+    return i >= 0 and ranges[i][0] <= line <= ranges[i][1]
+
+
+def _count_before(ranges: List[LineRange], line: int) -> int:
+    count = 0
+    for start, end in ranges:
+        if start >= line:
+            break
+        count += min(end, line - 1) - start + 1
+    return count
+
+
+def _range_len(ranges: List[LineRange]) -> int:
+    return sum(end - start + 1 for start, end in ranges)
@@ -0,0 +1,257 @@
+"""Reading diffs and working-tree state from git, without the LangChain tool layer."""
+import codecs
+import hashlib
+import os
+import subprocess
+import tempfile
+from typing import List, NamedTuple, Optional
+from .tracing import span
+
+# Default size caps for diff acquisition
+MAX_DIFF_FILE_BYTES = 256 * 1024
+MAX_DIFF_TOTAL_BYTES = 16 * 1024 * 1024
+
+READ_CHUNK = 64 * 1024
+TRUNCATION_MARKER = "\\ [pr-review-agent] "
+
+
+class FileStat(NamedTuple):
+    path: str
+    old_path: str
+    # None for binary files
+    added: Optional[int]
+    removed: Optional[int]
+
+
+class DiffOutput(NamedTuple):
+    text: str
+    files: List[FileStat]
+    # Paths whose patch was cut by the per-file or total byte cap
+    truncated_files: List[str]
+    total_bytes: int
+
+
+def diff_args(mode: str, base_ref: Optional[str] = None, head_ref: Optional[str] = None) -> List[str]:
+    """
+    Revision arguments for `git diff` in the given mode.
+    """
+    if mode == "staged":
+        return ["--cached"]
+    elif mode == "unstaged":
+        # Default git diff shows unstaged changes
+        return []
+    elif mode == "working-tree":
+        # Compare working tree to HEAD (all uncommitted changes)
+        return ["HEAD"]
+    elif mode == "branch":
+        return [base_ref or "main"]
+    elif mode == "commit-range":
+        if not base_ref or not head_ref:
+            raise ValueError("base_ref and head_ref are required for commit-range mode")
+        return [f"{base_ref}..{head_ref}"]
+    raise ValueError(f"Unknown diff mode: {mode}")
+
+
+def read_diff(
+    repo_root: str,
+    mode: str = "staged",
+    base_ref: Optional[str] = None,
+    head_ref: Optional[str] = None,
+    max_file_bytes: int = MAX_DIFF_FILE_BYTES,
+    max_total_bytes: int = MAX_DIFF_TOTAL_BYTES,
+    patch: bool = True
+) -> DiffOutput:
+    """
+    Read the diff and its per-file stats with a single streaming `git diff` call.
+
+    `--numstat -z` records come first, then the patch. The patch is read in chunks
+    and decoded incrementally, so memory stays bounded by the caps: a file's patch
+    stops at `max_file_bytes` and the whole diff at `max_total_bytes` (git is
+    stopped early), each leaving a `\\ [pr-review-agent] ...` marker line.
+    """
+    cmd = ["git", "-C", repo_root, "diff", "--numstat", "-z"]
+    if patch:
+        cmd.append("--patch")
+    cmd += diff_args(mode, base_ref, head_ref)
+
+    with tempfile.TemporaryFile() as stderr, span("git:diff", mode=mode) as diff_span:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        assert proc.stdout is not None
+        reader = _DiffStreamReader(max_file_bytes, max_total_bytes)
+        try:
+            for chunk in iter(lambda: proc.stdout.read(READ_CHUNK), b""):  # type: ignore[union-attr]
+                if not reader.feed(chunk):
+                    # Total cap reached: numstat is complete, the rest isn't needed
+                    proc.kill()
+                    break
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+
+        if returncode != 0 and not reader.stopped:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr.read().decode("utf-8", "replace"))
+
+        output = reader.finish()
+        diff_span.set(files=len(output.files), bytes=output.total_bytes)
+    return output
+
+
+class _DiffStreamReader:
+    """
+    Incremental parser for `git diff --numstat -z --patch` output.
+    """
+
+    def __init__(self, max_file_bytes: int, max_total_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.files: List[FileStat] = []
+        self.truncated: List[str] = []
+        self.stopped = False
+        self._in_patch = False
+        self._pending = b""
+        self._rename: Optional[List[str]] = None
+        self._counts: List[Optional[int]] = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._parts: List[str] = []
+        self._total = 0
+        # Patch sections come in numstat order
+        self._file_index = -1
+        self._in_header = False
+        self._file_bytes = 0
+        self._file_dropped = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Consume a chunk; returns False once the total cap has been reached.
+        """
+        data = self._pending + chunk
+        if not self._in_patch:
+            data = self._feed_numstat(data)
+            if not self._in_patch:
+                self._pending = data
+                return True
+
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            if not self._feed_line(line + b"\n"):
+                return False
+        return True
+
+    def finish(self) -> DiffOutput:
+        if self._pending and self._in_patch and not self.stopped:
+            self._feed_line(self._pending)
+        self._close_file()
+        self._parts.append(self._decoder.decode(b"", final=True))
+        return DiffOutput("".join(self._parts), self.files, self.truncated, self._total)
+
+    def _feed_numstat(self, data: bytes) -> bytes:
+        pos = 0
+        while True:
+            end = data.find(b"\0", pos)
+            if end < 0:
+                return data[pos:]
+            value = os.fsdecode(data[pos:end])
+            pos = end + 1
+
+            if self._rename is not None:
+                self._rename.append(value)
+                if len(self._rename) == 2:
+                    old, new = self._rename
+                    self.files.append(FileStat(new, old, self._counts[0], self._counts[1]))
+                    self._rename = None
+                continue
+            if not value:
+                # Empty record: end of numstat, the patch follows
+                self._in_patch = True
+                return data[pos:]
+
+            added, removed, path = value.split("\t", 2)
+            self._counts = [None if added == "-" else int(added), None if removed == "-" else int(removed)]
+            if path:
+                self.files.append(FileStat(path, path, self._counts[0], self._counts[1]))
+            else:
+                # Renames and copies: "added\tremoved\t\0old\0new\0"
+                self._rename = []
+
+    def _feed_line(self, line: bytes) -> bool:
+        if line.startswith(b"diff --git "):
+            self._close_file()
+            self._file_index += 1
+            self._in_header = True
+        elif self._in_header and line.startswith(b"@@"):
+            self._in_header = False
+
+        if self._total + len(line) > self.max_total_bytes:
+            self._close_file()
+            self._emit(f"{TRUNCATION_MARKER}diff truncated: total size cap of {self.max_total_bytes} bytes reached\n")
+            self.truncated.extend(f.path for f in self.files[max(self._file_index, 0):])
+            self.stopped = True
+            return False
+
+        # File headers are always kept so a truncated file is still identifiable
+        if not self._in_header and self._file_bytes + len(line) > self.max_file_bytes:
+            self._file_dropped += len(line)
+            return True
+
+        self._file_bytes += len(line)
+        self._total += len(line)
+        self._parts.append(self._decoder.decode(line))
+        return True
+
+    def _close_file(self) -> None:
+        if self._file_dropped:
+            path = self._current_path()
+            self._emit(f"{TRUNCATION_MARKER}truncated {self._file_dropped} bytes of {path} (per-file cap of {self.max_file_bytes} bytes)\n")
+            self.truncated.append(path)
+        self._file_bytes = 0
+        self._file_dropped = 0
+
+    def _current_path(self) -> str:
+        if 0 <= self._file_index < len(self.files):
+            return self.files[self._file_index].path
+        return "<unknown>"
+
+    def _emit(self, text: str) -> None:
+        self._parts.append(self._decoder.decode(b"", final=True))
+        self._parts.append(text)
+
+
+def tree_fingerprint(repo_root: str) -> Optional[str]:
+    """
+    Fingerprint the working tree: HEAD plus the content of every dirty or untracked
+    (non-ignored) file. Returns None when `repo_root` is not a git repository.
+    """
+    try:
+        with span("git:fingerprint"):
+            head = subprocess.run(
+                ["git", "-C", repo_root, "rev-parse", "HEAD"],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+            status = subprocess.run(
+                ["git", "-C", repo_root, "status", "--porcelain=v1", "-z", "--untracked-files=all"],
+                capture_output=True, check=True
+            ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    digest = hashlib.sha256(head.encode())
+    entries = status.split(b"\0")
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if not entry:
+            continue
+        code, path = entry[:2], entry[3:]
+        if code[:1] in (b"R", b"C"):
+            # Renames and copies are followed by their source path
+            i += 1
+        digest.update(entry + b"\0")
+        full_path = os.path.join(repo_root, os.fsdecode(path))
+        if os.path.isfile(full_path):
+            with open(full_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,4 @@
+from .impact import impacted_tests
+from .store import RepoIndex, index_exists, repo_index
+
+__all__ = ["RepoIndex", "impacted_tests", "index_exists", "repo_index"]
@@ -0,0 +1,212 @@
+"""Symbol definitions and identifier references of a single source file."""
+import ast
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+# Files larger than this are listed in the index but not parsed (generated code, bundles)
+MAX_PARSE_BYTES = 1024 * 1024
+
+LANGUAGES = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "typescript", ".tsx": "typescript", ".mts": "typescript", ".cts": "typescript",
+    ".go": "go",
+    ".rs": "rust",
+    ".java": "java", ".kt": "kotlin", ".kts": "kotlin", ".scala": "scala", ".cs": "csharp",
+    ".rb": "ruby",
+    ".php": "php",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".cxx": "cpp", ".hpp": "cpp", ".hh": "cpp",
+    ".swift": "swift",
+}
+
+_IDENT = r"[A-Za-z_$][\w$]*"
+
+# (kind, pattern) per language; group 1 is the defined name. Matched per line,
+# so this is a tokenizer-level approximation, not a parser
+_DEFINITIONS: Dict[str, List[Tuple[str, Pattern[str]]]] = {
+    "javascript": [
+        ("function", re.compile(rf"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*({_IDENT})")),
+        ("class", re.compile(rf"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+({_IDENT})")),
+        ("variable", re.compile(rf"^\s*(?:export\s+)?(?:const|let|var)\s+({_IDENT})\s*=")),
+        ("method", re.compile(rf"^\s+(?:static\s+)?(?:async\s+)?(?!if\b|for\b|while\b|switch\b|catch\b|return\b)({_IDENT})\s*\([^)]*\)\s*\{{")),
+    ],
+    "go": [
+        ("function", re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)")),
+        ("type", re.compile(r"^type\s+([A-Za-z_]\w*)")),
+    ],
+    "rust": [
+        ("function", re.compile(
+            r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?(?:extern\s+\"[^\"]*\"\s+)?"
+            r"fn\s+([A-Za-z_]\w*)"
+        )),
+        ("type", re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|type|union|mod)\s+([A-Za-z_]\w*)")),
+    ],
+    "java": [
+        ("class", re.compile(r"\b(?:class|interface|enum|record)\s+([A-Za-z_]\w*)")),
+        ("method", re.compile(
+            r"^\s+(?:(?:public|protected|private|static|final|abstract|synchronized|native|default)\s+)*"
+            r"[\w<>\[\],.?\s]+?\s+([A-Za-z_]\w*)\s*\([^;]*$"
+        )),
+    ],
+    "kotlin": [
+        ("class", re.compile(r"\b(?:class|interface|object)\s+([A-Za-z_]\w*)")),
+        ("function", re.compile(r"\bfun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?([A-Za-z_]\w*)")),
+    ],
+    "scala": [
+        ("class", re.compile(r"\b(?:class|trait|object)\s+([A-Za-z_]\w*)")),
+        ("function", re.compile(r"\bdef\s+([A-Za-z_]\w*)")),
+    ],
+    "ruby": [
+        ("class", re.compile(r"^\s*(?:class|module)\s+((?:[A-Z]\w*::)*[A-Z]\w*)")),
+        ("function", re.compile(r"^\s*def\s+(?:self\.)?([A-Za-z_]\w*[?!=]?)")),
+    ],
+    "php": [
+        ("class", re.compile(r"\b(?:class|interface|trait|enum)\s+([A-Za-z_]\w*)")),
+        ("function", re.compile(r"\bfunction\s+&?\s*([A-Za-z_]\w*)")),
+    ],
+    "c": [
+        ("type", re.compile(r"^\s*(?:typedef\s+)?(?:struct|enum|union)\s+([A-Za-z_]\w*)\s*\{")),
+        ("function", re.compile(r"^[A-Za-z_][\w\s\*&:<>,]*?\b([A-Za-z_]\w*)\s*\([^;]*$")),
+        ("macro", re.compile(r"^\s*#\s*define\s+([A-Za-z_]\w*)")),
+    ],
+    "swift": [
+        ("class", re.compile(r"\b(?:class|struct|enum|protocol|extension|actor)\s+([A-Za-z_]\w*)")),
+        ("function", re.compile(r"\bfunc\s+([A-Za-z_]\w*)")),
+    ],
+}
+_DEFINITIONS["typescript"] = _DEFINITIONS["javascript"] + [
+    ("type", re.compile(rf"^\s*(?:export\s+)?(?:declare\s+)?(?:interface|type|enum)\s+({_IDENT})")),
+]
+_DEFINITIONS["csharp"] = _DEFINITIONS["java"]
+_DEFINITIONS["cpp"] = _DEFINITIONS["c"] + [
+    ("class", re.compile(r"^\s*(?:template\s*<[^>]*>\s*)?class\s+([A-Za-z_]\w*)")),
+    ("namespace", re.compile(r"^\s*namespace\s+([A-Za-z_]\w*)")),
+]
+
+_TOKEN = re.compile(r"[A-Za-z_$][\w$]*")
+
+# Relative module specifiers of ES imports, re-exports, require() and import()
+_JS_IMPORT = re.compile(r"""(?:\bfrom\s*|\brequire\s*\(\s*|\bimport\s*\(\s*|^\s*import\s+)['"](\.{1,2}/[^'"]*)['"]""", re.MULTILINE)
+
+# Words that are never worth a reference lookup
+_KEYWORDS = frozenset("""
+and as assert async await break case catch class const continue def default del do elif else enum
+except export extends false final finally fn for from func function go if impl import in instanceof
+interface is let match mod module new nil none not null or package pass private protected pub public
+raise return self static struct super switch this throw throws true try type typeof use var void
+while with yield True False None
+""".split())
+
+
+class Symbol(NamedTuple):
+    name: str
+    kind: str
+    line: int
+    end_line: int
+    # Enclosing class or function, if any
+    parent: Optional[str]
+    signature: str
+
+
+def language_of(path: str) -> Optional[str]:
+    dot = path.rfind(".")
+    return LANGUAGES.get(path[dot:].lower()) if dot >= 0 else None
+
+
+def extract(text: str, language: str) -> Tuple[List[Symbol], Dict[str, List[int]], List[str]]:
+    """
+    Return the symbols defined in `text`, for every identifier used the lines
+    it appears on, and the modules it imports.
+
+    Python imports are dotted names as written, with leading dots for relative
+    imports; `from a import b` yields both `a` and `a.b`, since `b` may be a
+    module or a name in `a`. JavaScript and TypeScript imports are the relative
+    specifiers (`./util`); packages are not tracked.
+    """
+    if language == "python":
+        try:
+            return _extract_python(text)
+        except (SyntaxError, ValueError, RecursionError):
+            # Not valid Python (templates, Python 2): fall back to tokens only
+            return [], _token_references(text), []
+    return _extract_tokens(text, language)
+
+
+def _extract_python(text: str) -> Tuple[List[Symbol], Dict[str, List[int]], List[str]]:
+    tree = ast.parse(text)
+    lines = text.splitlines()
+    symbols: List[Symbol] = []
+    references: Dict[str, List[int]] = {}
+    imports: Dict[str, None] = {}
+
+    def add_reference(name: str, line: int) -> None:
+        found = references.setdefault(name, [])
+        if not found or found[-1] != line:
+            found.append(line)
+
+    # parent: (kind, name) of the enclosing class or function
+    def visit(node: ast.AST, parent: Optional[Tuple[str, str]]) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                kind = "class" if isinstance(child, ast.ClassDef) else ("method" if parent and parent[0] == "class" else "function")
+                symbols.append(Symbol(
+                    child.name, kind, child.lineno, child.end_lineno or child.lineno,
+                    parent[1] if parent else None, _signature(lines, child.lineno),
+                ))
+                visit(child, ("class" if kind == "class" else "function", child.name))
+                continue
+            if parent is None and isinstance(child, (ast.Assign, ast.AnnAssign)):
+                targets = child.targets if isinstance(child, ast.Assign) else [child.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        symbols.append(Symbol(
+                            target.id, "variable", child.lineno, child.end_lineno or child.lineno,
+                            None, _signature(lines, child.lineno),
+                        ))
+            if isinstance(child, ast.Import):
+                imports.update((alias.name, None) for alias in child.names)
+            elif isinstance(child, ast.ImportFrom):
+                base = "." * child.level + (child.module or "")
+                imports[base] = None
+                separator = "." if child.module else ""
+                imports.update((base + separator + alias.name, None) for alias in child.names if alias.name != "*")
+            if isinstance(child, ast.Name):
+                add_reference(child.id, child.lineno)
+            elif isinstance(child, ast.Attribute):
+                add_reference(child.attr, child.end_lineno or child.lineno)
+            elif isinstance(child, ast.alias):
+                add_reference(child.name.rsplit(".", 1)[-1], getattr(child, "lineno", None) or getattr(node, "lineno", 0))
+            visit(child, parent)
+
+    visit(tree, None)
+    # The tree is walked depth first, so lines can arrive out of order
+    return symbols, {name: sorted(set(found)) for name, found in references.items()}, list(imports)
+
+
+def _extract_tokens(text: str, language: str) -> Tuple[List[Symbol], Dict[str, List[int]], List[str]]:
+    patterns = _DEFINITIONS.get(language, [])
+    symbols: List[Symbol] = []
+    for number, line in enumerate(text.splitlines(), 1):
+        for kind, pattern in patterns:
+            match = pattern.search(line)
+            if match and match.group(1) not in _KEYWORDS:
+                symbols.append(Symbol(match.group(1), kind, number, number, None, line.strip()[:200]))
+                break
+    imports = list(dict.fromkeys(_JS_IMPORT.findall(text))) if language in ("javascript", "typescript") else []
+    return symbols, _token_references(text), imports
+
+
+def _token_references(text: str) -> Dict[str, List[int]]:
+    references: Dict[str, List[int]] = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        for token in _TOKEN.findall(line):
+            if len(token) < 2 or token in _KEYWORDS:
+                continue
+            found = references.setdefault(token, [])
+            if not found or found[-1] != number:
+                found.append(number)
+    return references
+
+
+def _signature(lines: List[str], line: int) -> str:
+    return lines[line - 1].strip()[:200] if 0 < line <= len(lines) else ""
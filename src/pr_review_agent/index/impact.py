@@ -0,0 +1,251 @@
+"""Tests affected by a change: the reverse import graph for Python and JS/TS, naming conventions elsewhere."""
+import posixpath
+import re
+import shlex
+from typing import Any, Dict, Iterable, List, Optional, Set
+from ..tracing import span
+from .extract import language_of
+from .store import RepoIndex
+
+# Narrowing stops paying off past this many tests; the whole suite is suggested instead
+MAX_SELECTED_TESTS = 200
+
+# Most test paths listed in the result
+MAX_LISTED_TESTS = 50
+
+# Changing one of these can affect any test
+SUITE_CONFIGS = {
+    "pyproject.toml", "setup.py", "setup.cfg", "tox.ini", "pytest.ini", "noxfile.py", "requirements.txt",
+    "package.json", "tsconfig.json", "babel.config.js", "jest.config.js", "jest.config.ts", "vitest.config.ts", "vite.config.ts",
+    "Cargo.toml", "go.mod", "pom.xml", "build.gradle", "build.gradle.kts", "Gemfile",
+}
+
+_JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts")
+
+# Test files per language, by file name or directory
+_TEST_NAMES = {
+    "python": re.compile(r"(?:^|/)(?:test_[^/]*|[^/]*_test)\.pyi?$"),
+    "javascript": re.compile(r"(?:\.(?:test|spec)\.[^/.]+$|(?:^|/)__tests__/)"),
+    "go": re.compile(r"_test\.go$"),
+    "rust": re.compile(r"(?:^|/)tests/[^/]*\.rs$"),
+    "java": re.compile(r"(?:(?:Test|Tests|IT)\.[^/.]+$|(?:^|/)src/test/)"),
+    "ruby": re.compile(r"(?:_spec|_test)\.rb$|(?:^|/)test_[^/]*\.rb$"),
+    "php": re.compile(r"Test\.php$"),
+}
+_TEST_NAMES["typescript"] = _TEST_NAMES["javascript"]
+_TEST_NAMES["kotlin"] = _TEST_NAMES["scala"] = _TEST_NAMES["csharp"] = _TEST_NAMES["java"]
+_TEST_DIR = re.compile(r"(?:^|/)(?:tests?|spec)/")
+
+# Affixes stripped from a test file's name to get the name of the file it tests
+_TEST_AFFIXES = re.compile(r"^test_|(?:_test|_spec|\.test|\.spec|Tests?|IT|Spec)$")
+
+# Recognizes a test command's ecosystem, to append test paths to it
+_PYTHON_RUNNER = re.compile(r"\b(?:pytest|py\.test|unittest)\b")
+_JS_RUNNER = re.compile(r"\b(?:npm|pnpm|yarn|bun|npx|bunx|jest|vitest|mocha)\b")
+
+
+def is_test_file(path: str) -> bool:
+    language = language_of(path)
+    if language is None:
+        return False
+    pattern = _TEST_NAMES.get(language)
+    if pattern is not None:
+        return bool(pattern.search(path))
+    return bool(_TEST_DIR.search(path))
+
+
+def impacted_tests(index: RepoIndex, changed_files: List[str], test_commands: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Map changed files to the tests that import them, directly or transitively
+    (Python, JavaScript, TypeScript), or that follow the naming conventions
+    of their ecosystem (`foo.go` -> `foo_test.go`, `Foo.java` -> `FooTest.java`).
+
+    `test_commands` are the project's full-suite commands (e.g. from the
+    project profile); the selected tests are appended to them to build the
+    narrowed commands.
+    """
+    with span("index:impact", changed=len(changed_files)) as impact_span:
+        paths, imports = index.import_graph()
+        known = set(paths)
+        tests = [p for p in paths if is_test_file(p)]
+        reverse = _reverse_imports(known, imports)
+
+        selected: Dict[str, str] = {}
+        unmapped: List[str] = []
+        suite_configs: List[str] = []
+        for changed in changed_files:
+            if posixpath.basename(changed) in SUITE_CONFIGS:
+                suite_configs.append(changed)
+                continue
+            language = language_of(changed)
+            if language is None:
+                # Docs, data and assets don't map to tests
+                continue
+            found = [changed] if changed in known and is_test_file(changed) else []
+            if posixpath.basename(changed) == "conftest.py":
+                scope = posixpath.dirname(changed)
+                found += [t for t in tests if t.endswith(".py") and (not scope or t.startswith(scope + "/"))]
+            if language in ("python", "javascript", "typescript"):
+                found += [p for p in _dependents(changed, reverse) if is_test_file(p)]
+            if not found:
+                found = _tests_by_name(changed, language, tests)
+            for test in found:
+                selected.setdefault(test, changed)
+            if not found:
+                unmapped.append(changed)
+
+        result: Dict[str, Any] = {
+            "tests": sorted(selected)[:MAX_LISTED_TESTS],
+            "selected": len(selected),
+            "total_tests": len(tests),
+        }
+        if suite_configs:
+            result["full_suite"] = f"test configuration changed: {', '.join(suite_configs)}"
+        elif len(selected) > MAX_SELECTED_TESTS:
+            result["full_suite"] = f"{len(selected)} tests affected"
+        else:
+            commands = _narrowed_commands(sorted(selected), test_commands or [])
+            if commands:
+                result["commands"] = commands
+        if unmapped:
+            result["unmapped"] = unmapped
+        impact_span.set(selected=len(selected), total_tests=len(tests))
+        return result
+
+
+def _reverse_imports(known: Set[str], imports: Dict[str, List[str]]) -> Dict[str, Set[str]]:
+    """
+    Importing files of every indexed file.
+    """
+    modules = _python_modules(known)
+    reverse: Dict[str, Set[str]] = {}
+    for path, names in imports.items():
+        if path.endswith((".py", ".pyi")):
+            targets = _resolve_python(path, names, modules, known)
+        else:
+            targets = _resolve_js(path, names, known)
+        for target in targets:
+            if target != path:
+                reverse.setdefault(target, set()).add(path)
+    return reverse
+
+
+def _python_modules(known: Set[str]) -> Dict[str, List[str]]:
+    """
+    Importable dotted names of every Python file.
+
+    Files are registered under every dotted suffix of their path, so
+    `src/pkg/mod.py` answers to `pkg.mod` and `src.pkg.mod` whatever the
+    source root is. Single names (`mod`) only count outside packages, where
+    they are run as scripts or imported from `sys.path`, so that `json.py`
+    in a package doesn't claim every `import json`.
+    """
+    packages = {posixpath.dirname(p) for p in known if posixpath.basename(p) == "__init__.py"}
+    modules: Dict[str, List[str]] = {}
+    for path in known:
+        if not path.endswith(".py"):
+            continue
+        parts = path[:-3].split("/")
+        if parts[-1] == "__init__":
+            parts = parts[:-1]
+            if not parts:
+                continue
+        for start in range(len(parts)):
+            suffix = parts[start:]
+            if len(suffix) == 1 and "/".join(parts[:-1]) in packages:
+                continue
+            modules.setdefault(".".join(suffix), []).append(path)
+    return modules
+
+
+def _resolve_python(path: str, names: Iterable[str], modules: Dict[str, List[str]], known: Set[str]) -> Set[str]:
+    targets: Set[str] = set()
+    directory = posixpath.dirname(path).split("/") if posixpath.dirname(path) else []
+    for name in names:
+        if not name.startswith("."):
+            targets.update(modules.get(name, ()))
+            # Importing `a.b.c` also runs `a/__init__.py` and `a/b/__init__.py`
+            parts = name.split(".")
+            for end in range(1, len(parts)):
+                targets.update(p for p in modules.get(".".join(parts[:end]), ()) if p.endswith("__init__.py"))
+            continue
+        level = len(name) - len(name.lstrip("."))
+        if level - 1 > len(directory):
+            continue
+        parts = directory[:len(directory) - (level - 1)] + [p for p in name[level:].split(".") if p]
+        base = "/".join(parts)
+        for candidate in (f"{base}.py", f"{base}/__init__.py" if base else "__init__.py"):
+            if candidate in known:
+                targets.add(candidate)
+    return targets
+
+
+def _resolve_js(path: str, specifiers: Iterable[str], known: Set[str]) -> Set[str]:
+    targets: Set[str] = set()
+    directory = posixpath.dirname(path)
+    for specifier in specifiers:
+        base = posixpath.normpath(posixpath.join(directory, specifier))
+        candidates = [base] + [base + ext for ext in _JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in _JS_EXTENSIONS]
+        # ESM TypeScript imports name the compiled file: `./util.js` for `util.ts`
+        stem, ext = posixpath.splitext(base)
+        if ext in (".js", ".mjs", ".cjs", ".jsx"):
+            candidates += [stem + ts for ts in (".ts", ".tsx", ".mts", ".cts")]
+        found = next((c for c in candidates if c in known), None)
+        if found is not None:
+            targets.add(found)
+    return targets
+
+
+def _dependents(path: str, reverse: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Files importing `path`, directly or through other files.
+    """
+    seen: Set[str] = set()
+    stack = [path]
+    while stack:
+        for dependent in reverse.get(stack.pop(), ()):
+            if dependent not in seen:
+                seen.add(dependent)
+                stack.append(dependent)
+    return seen
+
+
+def _tests_by_name(path: str, language: str, tests: List[str]) -> List[str]:
+    if language == "go":
+        # Go tests live next to the code and run per package
+        directory = posixpath.dirname(path)
+        return [t for t in tests if t.endswith("_test.go") and posixpath.dirname(t) == directory]
+    stem = _stem(path).lower()
+    return [t for t in tests if _TEST_AFFIXES.sub("", _stem(t)).lower() == stem]
+
+
+def _stem(path: str) -> str:
+    name = posixpath.basename(path)
+    return name.split(".", 1)[0] if not name.startswith(".") else name
+
+
+def _narrowed_commands(tests: List[str], test_commands: List[str]) -> List[str]:
+    python = [t for t in tests if t.endswith((".py", ".pyi"))]
+    javascript = [t for t in tests if language_of(t) in ("javascript", "typescript")]
+    go = sorted({posixpath.dirname(t) for t in tests if t.endswith(".go")})
+    rust = [t for t in tests if t.endswith(".rs")]
+
+    commands: List[str] = []
+    if python:
+        base = next((c for c in test_commands if _PYTHON_RUNNER.search(c)), "python -m pytest -q")
+        if "unittest" in base:
+            runner = base[:base.index("unittest") + len("unittest")]
+            commands.append(f"{runner} {' '.join(t[:-3].replace('/', '.') for t in python)}")
+        else:
+            commands.append(f"{base} {shlex.join(python)}")
+    if javascript:
+        base = next((c for c in test_commands if _JS_RUNNER.search(c)), None)
+        if base is not None:
+            # npm only forwards arguments to the script after `--`
+            separator = " -- " if base.startswith("npm ") else " "
+            commands.append(f"{base}{separator}{shlex.join(javascript)}")
+    if go:
+        commands.append("go test " + " ".join(f"./{d}" if d else "." for d in go))
+    if rust:
+        commands.append("cargo test " + " ".join(f"--test {_stem(t)}" for t in rust))
+    return commands
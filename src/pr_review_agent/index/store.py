@@ -0,0 +1,393 @@
+import hashlib
+import os
+import sqlite3
+import subprocess
+import threading
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ..config import default_cache_dir
+from ..tracing import span
+from .extract import MAX_PARSE_BYTES, Symbol, extract, language_of
+
+# Bump when the extractor's output changes, to rebuild existing indexes
+SCHEMA_VERSION = "2"
+
+# Changed files parsed in worker processes once there are this many
+PARALLEL_THRESHOLD = 256
+
+# Lookups re-check the working tree at most this often (seconds)
+REFRESH_INTERVAL = 5.0
+
+# Default cap on rows returned by a lookup
+MAX_RESULTS = 50
+
+# Parsed result of one file: (path, content key, language, symbols, references, imports)
+Extracted = Tuple[str, str, Optional[str], List[Symbol], Dict[str, List[int]], List[str]]
+
+
+class RepoIndex:
+    """
+    On-disk file, symbol and reference index of a git repository, in SQLite.
+
+    The file list comes from `git ls-files`. Each file is keyed by its blob hash
+    when clean, or by size and mtime when modified or untracked, and only files
+    whose key changed are parsed again on `refresh`. The `ls-files -s` listing
+    itself is only re-read when the git index file's mtime changes; until then
+    a refresh only looks at the files that are dirty now or were last time.
+    """
+
+    def __init__(self, repo_root: str, path: Optional[str] = None):
+        self.root = _toplevel(repo_root)
+        self.path = path or _default_path(self.root)
+        self._lock = threading.RLock()
+        self._refreshed_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(
+                "PRAGMA journal_mode=WAL;"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS tracked (path TEXT PRIMARY KEY, blob TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY, key TEXT NOT NULL, language TEXT, size INTEGER NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS symbols ("
+                " name TEXT NOT NULL, kind TEXT NOT NULL, path TEXT NOT NULL, line INTEGER NOT NULL,"
+                " end_line INTEGER NOT NULL, parent TEXT, signature TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);"
+                "CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);"
+                # One row per identifier and file, with its lines as a comma-separated list
+                "CREATE TABLE IF NOT EXISTS refs (name TEXT NOT NULL, path TEXT NOT NULL, lines TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS refs_name ON refs (name);"
+                "CREATE INDEX IF NOT EXISTS refs_path ON refs (path);"
+                # Modules each file imports, as written (see `extract`)
+                "CREATE TABLE IF NOT EXISTS imports (path TEXT NOT NULL, module TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS imports_path ON imports (path);"
+            )
+            if self._meta("schema") != SCHEMA_VERSION:
+                self._conn.executescript(
+                    "DELETE FROM tracked; DELETE FROM files; DELETE FROM symbols;"
+                    "DELETE FROM refs; DELETE FROM imports; DELETE FROM meta;"
+                )
+                self._set_meta("schema", SCHEMA_VERSION)
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date with the working tree. Returns counts of the
+        files parsed, removed and indexed in total.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < REFRESH_INTERVAL:
+                return {"parsed": 0, "removed": 0, "files": self._count_files()}
+            with span("index:refresh") as refresh_span:
+                stats = self._refresh()
+                refresh_span.set(**stats)
+            self._refreshed_at = time.monotonic()
+            return stats
+
+    def find_symbol(self, name: str, kind: Optional[str] = None, limit: int = MAX_RESULTS) -> List[Dict[str, Any]]:
+        """
+        Definitions of `name`; a trailing `*` matches by prefix.
+        """
+        self.refresh()
+        where, params = _name_clause(name)
+        if kind:
+            where += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT name, kind, path, line, end_line, parent, signature FROM symbols WHERE {where}"
+                " ORDER BY path, line LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [
+            {"name": n, "kind": k, "path": p, "line": line, "end_line": end, "parent": parent, "signature": sig}
+            for n, k, p, line, end, parent, sig in rows
+        ]
+
+    def find_references(self, name: str, path_prefix: Optional[str] = None, limit: int = MAX_RESULTS) -> Dict[str, Any]:
+        """
+        Files and lines where the identifier `name` appears, with the line text.
+        """
+        self.refresh()
+        sql = "SELECT path, lines FROM refs WHERE name = ?"
+        params: List[Any] = [name]
+        if path_prefix:
+            sql += " AND path >= ? AND path < ?"
+            params += [path_prefix, path_prefix + "\uffff"]
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY path", params).fetchall()
+
+        references: List[Dict[str, Any]] = []
+        total = 0
+        for path, lines in rows:
+            numbers = [int(n) for n in lines.split(",")]
+            total += len(numbers)
+            if len(references) >= limit:
+                continue
+            text = _read_lines(os.path.join(self.root, path), numbers[:limit - len(references)])
+            references.extend({"path": path, "line": n, "text": text.get(n, "")} for n in numbers[:limit - len(references)])
+        return {"references": references, "total": total, "files": len(rows), "truncated": total > len(references)}
+
+    def find_files(self, pattern: str, limit: int = MAX_RESULTS) -> Dict[str, Any]:
+        """
+        Indexed paths matching a glob (`*` crosses directories), or containing
+        `pattern` when it has no wildcard.
+        """
+        self.refresh()
+        if any(c in pattern for c in "*?["):
+            sql, params = "SELECT path FROM files WHERE path GLOB ?", [pattern]
+        else:
+            sql, params = "SELECT path FROM files WHERE instr(path, ?) > 0", [pattern]
+        with self._lock:
+            rows = self._conn.execute(f"{sql} ORDER BY path LIMIT ?", (*params, limit + 1)).fetchall()
+        paths = [r[0] for r in rows]
+        return {"files": paths[:limit], "truncated": len(paths) > limit}
+
+    def import_graph(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Every indexed path, and the modules imported by each file that imports any.
+        """
+        self.refresh()
+        with self._lock:
+            paths = [r[0] for r in self._conn.execute("SELECT path FROM files ORDER BY path")]
+            imports: Dict[str, List[str]] = {}
+            for path, module in self._conn.execute("SELECT path, module FROM imports"):
+                imports.setdefault(path, []).append(module)
+        return paths, imports
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _refresh(self) -> Dict[str, int]:
+        mtime = self._git_index_mtime()
+        dirty = _git_paths(self.root, "ls-files", "-z", "--modified", "--others", "--exclude-standard")
+        with self._lock:
+            full = not mtime or self._meta("refreshed_index_mtime") != mtime
+        changed, removed = self._full_delta(mtime, dirty) if full else self._dirty_delta(dirty)
+
+        results = self._extract_all(changed)
+        with self._lock, self._conn:
+            stale = [(p,) for p in removed + [path for path, _ in changed]]
+            self._conn.executemany("DELETE FROM files WHERE path = ?", stale)
+            self._conn.executemany("DELETE FROM symbols WHERE path = ?", stale)
+            self._conn.executemany("DELETE FROM refs WHERE path = ?", stale)
+            self._conn.executemany("DELETE FROM imports WHERE path = ?", stale)
+            for path, key, language, symbols, references, imports in results:
+                size = _size(os.path.join(self.root, path))
+                self._conn.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (path, key, language, size))
+                self._conn.executemany(
+                    "INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(s.name, s.kind, path, s.line, s.end_line, s.parent, s.signature) for s in symbols]
+                )
+                self._conn.executemany(
+                    "INSERT INTO refs VALUES (?, ?, ?)",
+                    [(name, path, ",".join(map(str, lines))) for name, lines in references.items()]
+                )
+                self._conn.executemany("INSERT INTO imports VALUES (?, ?)", [(path, module) for module in imports])
+            self._set_meta("refreshed_index_mtime", mtime)
+        return {"parsed": len(changed), "removed": len(removed), "files": self._count_files()}
+
+    def _full_delta(self, mtime: str, dirty: List[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """
+        Files to parse (path, key) and to drop, comparing every file's key.
+        """
+        wanted: Dict[str, str] = {}
+        for path, blob in self._tracked(mtime).items():
+            wanted[path] = f"blob:{blob}"
+        for path in dirty:
+            key = _stat_key(os.path.join(self.root, path))
+            if key is None:
+                # Deleted in the working tree
+                wanted.pop(path, None)
+            else:
+                wanted[path] = key
+
+        with self._lock:
+            indexed = dict(self._conn.execute("SELECT path, key FROM files").fetchall())
+        changed = [(path, key) for path, key in wanted.items() if indexed.get(path) != key]
+        removed = [path for path in indexed if path not in wanted]
+        return changed, removed
+
+    def _dirty_delta(self, dirty: List[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """
+        `_full_delta` when the git index is unchanged since the last refresh:
+        clean files still have the blob key they were indexed with, so only
+        the files dirty now, or dirty at the last refresh, are looked at.
+        """
+        with self._lock:
+            previously = [r[0] for r in self._conn.execute("SELECT path FROM files WHERE key LIKE 'stat:%'")]
+        now = set(dirty)
+        changed: List[Tuple[str, str]] = []
+        removed: List[str] = []
+        for path in now.union(previously):
+            if path in now:
+                key = _stat_key(os.path.join(self.root, path))
+            else:
+                # Clean again (reverted, or deleted if untracked)
+                with self._lock:
+                    row = self._conn.execute("SELECT blob FROM tracked WHERE path = ?", (path,)).fetchone()
+                key = f"blob:{row[0]}" if row else None
+            with self._lock:
+                row = self._conn.execute("SELECT key FROM files WHERE path = ?", (path,)).fetchone()
+            indexed = row[0] if row else None
+            if key is None:
+                if indexed is not None:
+                    removed.append(path)
+            elif key != indexed:
+                changed.append((path, key))
+        return changed, removed
+
+    def _git_index_mtime(self) -> str:
+        git_index = _git(self.root, "rev-parse", "--git-path", "index").decode().strip()
+        try:
+            return str(os.stat(os.path.join(self.root, git_index)).st_mtime_ns)
+        except OSError:
+            return ""
+
+    def _tracked(self, mtime: str) -> Dict[str, str]:
+        """
+        Blob hash of every file in the git index, re-read only when the index
+        changed (`mtime` is the git index file's).
+        """
+        with self._lock:
+            if mtime and self._meta("index_mtime") == mtime:
+                return dict(self._conn.execute("SELECT path, blob FROM tracked").fetchall())
+
+        tracked: Dict[str, str] = {}
+        for entry in _git(self.root, "ls-files", "-s", "-z").split(b"\0"):
+            if not entry:
+                continue
+            info, _, path = entry.partition(b"\t")
+            mode, blob, _stage = info.split(b" ")
+            # Submodules (gitlinks) have no content to index
+            if mode != b"160000":
+                tracked[path.decode("utf-8", "replace")] = blob.decode()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tracked")
+            self._conn.executemany("INSERT OR REPLACE INTO tracked VALUES (?, ?)", tracked.items())
+            self._set_meta("index_mtime", mtime)
+        return tracked
+
+    def _extract_all(self, files: List[Tuple[str, str]]) -> Iterable[Extracted]:
+        jobs = [(self.root, path, key) for path, key in files]
+        if len(jobs) < PARALLEL_THRESHOLD:
+            return [_extract_file(*job) for job in jobs]
+        # Forking a threaded process (the review server, parallel tools) can copy
+        # a lock another thread holds into the child; spawned workers start clean
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+            return list(executor.map(_extract_file, *zip(*jobs), chunksize=64))
+
+    def _count_files(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+
+_indexes: Dict[str, RepoIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def repo_index(repo_root: str) -> RepoIndex:
+    """
+    The process-wide index of the repository containing `repo_root`.
+    """
+    root = _toplevel(repo_root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = RepoIndex(root)
+        return index
+
+
+def index_exists(repo_root: str) -> bool:
+    """
+    True if the repository containing `repo_root` was indexed before, by this
+    process or an earlier one, so that using its index only costs a refresh.
+    """
+    root = _toplevel(repo_root)
+    with _indexes_lock:
+        if root in _indexes:
+            return True
+    return os.path.exists(_default_path(root))
+
+
+def _default_path(root: str) -> str:
+    digest = hashlib.sha256(root.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(default_cache_dir(), "index", f"{digest}.sqlite3")
+
+
+def _extract_file(root: str, path: str, key: str) -> Extracted:
+    language = language_of(path)
+    if language is None:
+        return path, key, None, [], {}, []
+    try:
+        with open(os.path.join(root, path), "rb") as f:
+            data = f.read(MAX_PARSE_BYTES + 1)
+    except OSError:
+        return path, key, language, [], {}, []
+    if len(data) > MAX_PARSE_BYTES or b"\0" in data[:8192]:
+        return path, key, language, [], {}, []
+    symbols, references, imports = extract(data.decode("utf-8", "replace"), language)
+    return path, key, language, symbols, references, imports
+
+
+def _stat_key(path: str) -> Optional[str]:
+    """
+    Key of a modified or untracked file, or None if it no longer exists.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"stat:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _name_clause(name: str) -> Tuple[str, List[Any]]:
+    if name.endswith("*"):
+        prefix = name[:-1]
+        return "name >= ? AND name < ?", [prefix, prefix + "\uffff"]
+    return "name = ?", [name]
+
+
+def _read_lines(path: str, numbers: List[int]) -> Dict[int, str]:
+    wanted = set(numbers)
+    last = max(numbers, default=0)
+    found: Dict[int, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, 1):
+                if number in wanted:
+                    found[number] = line.rstrip("\n")[:200]
+                if number >= last:
+                    break
+    except OSError:
+        pass
+    return found
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _toplevel(repo_root: str) -> str:
+    return os.path.realpath(_git(repo_root, "rev-parse", "--show-toplevel").decode().strip())
+
+
+def _git(repo_root: str, *args: str) -> bytes:
+    with span(f"git:{args[0]}"):
+        return subprocess.run(["git", "-C", repo_root, *args], capture_output=True, check=True).stdout
+
+
+def _git_paths(repo_root: str, *args: str) -> List[str]:
+    return [p.decode("utf-8", "replace") for p in _git(repo_root, *args).split(b"\0") if p]
@@ -0,0 +1,358 @@
+"""Diff-scoped linting: linter commands narrowed to the changed files, and their output narrowed to the changed hunks."""
+import os
+import posixpath
+import re
+import shlex
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from .diff import DiffIndex
+
+# Most in-diff findings kept per result; the rest are only counted
+MAX_FINDINGS = 50
+
+# Most findings outside the diff listed for type checkers, whose errors there
+# can be caused by the change (a caller of a changed signature)
+MAX_ELSEWHERE = 20
+
+# Past this many changed files, narrowing a command to them no longer pays off
+MAX_SCOPED_FILES = 200
+
+# Linters that check files independently, so running them on the changed files
+# alone finds the same problems in those files. Type checkers (mypy, pyright,
+# tsc) and crate-level tools (clippy) need the whole program: their output is
+# narrowed, not their inputs
+FILE_LINTERS = {
+    "ruff": (".py", ".pyi"),
+    "flake8": (".py",),
+    "pylint": (".py",),
+    "eslint": (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts", ".vue"),
+}
+
+# Linters that check the current directory when given no paths
+_IMPLICIT_ROOT = {"ruff", "flake8", "eslint"}
+
+# Whole-program checkers, and the scripts that usually wrap them
+TYPE_CHECKERS = {"mypy", "dmypy", "pyright", "tsc", "vue-tsc", "clippy", "cargo", "go vet", "typecheck", "type-check", "check-types"}
+
+# Programs whose output is parsed into findings
+_PROGRAMS = {"ruff", "flake8", "pylint", "mypy", "dmypy", "pyright", "eslint", "tsc", "vue-tsc", "golangci-lint"}
+
+# Prefixes that run a tool inside the project's environment: (words, number of words)
+_RUNNERS = (
+    ("uv", "run"), ("poetry", "run"), ("pdm", "run"), ("pipenv", "run"), ("hatch", "run"), ("rye", "run"),
+    ("pnpm", "exec"), ("pnpm", "dlx"), ("pnpm", "run"), ("yarn", "dlx"), ("yarn", "exec"), ("yarn", "run"),
+    ("bun", "x"), ("npm", "exec"),
+    ("npx",), ("bunx",), ("yarn",), ("pnpm",),
+)
+
+# Package scripts and make targets that usually wrap a linter or type checker
+_CHECK_SCRIPTS = {"lint", "typecheck", "type-check", "tsc", "check-types", "mypy"}
+
+# Options whose value is never a lint target, even when it names an existing path
+_VALUE_OPTIONS = {
+    "--config", "-c", "--config-file", "--cache-dir", "--rcfile", "--rulesdir", "--resolve-plugins-relative-to",
+    "--ignore-path", "--output-file", "-o", "--format", "-f", "--output-format", "--extend-exclude", "--exclude",
+}
+
+# `path:line[:column]: rest` (ruff, flake8, pylint, mypy, go vet, eslint -f unix),
+# `path:line:column - rest` (tsc --pretty, pyright)
+_LOCATED = re.compile(r"^\s*(?P<path>[^\s:(-][^:(]*?):(?P<line>\d+)(?::(?P<column>\d+))?(?::|\s+-)\s*(?P<rest>.*)$")
+# `path(line,column): rest` (tsc)
+_TSC = re.compile(r"^(?P<path>[^\s(][^(]*)\((?P<line>\d+),(?P<column>\d+)\):\s*(?P<rest>.*)$")
+# Location line under a header (rustc, clippy, ruff's full format)
+_ARROW = re.compile(r"^\s*-->\s*(?P<path>[^:]+):(?P<line>\d+)(?::(?P<column>\d+))?\s*$")
+_RUST_HEADER = re.compile(r"^(?P<severity>error|warning)(?:\[(?P<code>[^\]]+)\])?:\s*(?P<message>.+)$")
+_RUFF_HEADER = re.compile(r"^(?P<code>[A-Z]+\d+)\s+(?:\[\*\]\s+)?(?P<message>.+)$")
+# eslint's default format: a file name line, then `  line:column  severity  message  rule`
+_STYLISH_FILE = re.compile(r"^[^\s:][^:]*\.[A-Za-z]\w*$")
+_STYLISH = re.compile(r"^\s+(?P<line>\d+):(?P<column>\d+)\s+(?P<severity>error|warning)\s+(?P<message>.+?)(?:\s{2,}(?P<code>[\w@/.-]+))?\s*$")
+# Severity and code around a located message
+_SEVERITY = re.compile(r"^(?P<severity>error|warning|note|info|information)(?:\s+(?P<code>TS\d+))?\s*:\s*(?P<message>.*)$", re.IGNORECASE)
+_LEADING_CODE = re.compile(r"^(?P<code>[A-Z]+\d+):?\s+(?:\[\*\]\s+)?(?P<message>.*)$")
+# Names defined on a changed line, or in the definition a hunk header names
+_DEFINITION = re.compile(r"\b(?:def|class|function|fn|func|struct|enum|interface|type|trait|impl)\s+(?:\([^)]*\)\s*)?(?P<name>[A-Za-z_]\w*)")
+_TRAILING_CODE = re.compile(
+    r"^(?P<message>.*?)\s+"
+    r"(?:\[(?:(?P<severity>Error|Warning)/)?(?P<bracket>[\w@/.:-]+)\]|\((?P<paren>report\w+|[a-z]+(?:-[a-z]+)+)\))$"
+)
+
+
+class Finding(NamedTuple):
+    tool: str
+    path: str
+    line: Optional[int]
+    column: Optional[int]
+    code: Optional[str]
+    severity: str
+    message: str
+
+
+def lint_tool(command: str) -> Optional[str]:
+    """
+    Name of the linter or type checker `command` runs, or None for other commands.
+
+    Package scripts and make targets named after a check (`npm run lint`,
+    `make typecheck`) are reported under the script name.
+    """
+    found = _program(command)
+    return found[0] if found else None
+
+
+def parse_findings(tool: str, output: str, repo_root: str = ".") -> List[Finding]:
+    """
+    Parse a linter's or type checker's text output into findings.
+
+    Understands the default formats of ruff (concise and full), flake8,
+    pylint, mypy, pyright, eslint (stylish and unix), tsc (plain and
+    pretty), go vet and rustc/clippy. Paths are made relative to `repo_root`.
+    """
+    root = os.path.abspath(repo_root)
+    findings: List[Finding] = []
+    # Header of a rustc-style diagnostic, waiting for its `-->` location line
+    header: Optional[Tuple[str, Optional[str], str]] = None
+    stylish_file: Optional[str] = None
+    for text in output.splitlines():
+        text = text.rstrip()
+        match = _ARROW.match(text)
+        if match:
+            if header is not None:
+                findings.append(_finding(tool, root, match, *header))
+                header = None
+            continue
+        match = _RUST_HEADER.match(text)
+        if match:
+            header = (match["severity"], match["code"], match["message"])
+            continue
+        match = _RUFF_HEADER.match(text)
+        if match:
+            header = ("warning", match["code"], match["message"])
+            continue
+        match = _TSC.match(text) or _LOCATED.match(text)
+        if match:
+            findings.append(_finding(tool, root, match, *_split_message(match["rest"])))
+            continue
+        match = _STYLISH.match(text)
+        if match and stylish_file is not None:
+            findings.append(Finding(
+                tool, _relative(stylish_file, root), int(match["line"]), int(match["column"]),
+                match["code"], match["severity"], match["message"],
+            ))
+            continue
+        if _STYLISH_FILE.match(text):
+            stylish_file = text
+    # Tools that check several targets can report a problem more than once
+    return list(dict.fromkeys(findings))
+
+
+def in_diff(finding: Finding, index: DiffIndex) -> bool:
+    """
+    True if `finding` points into one of the diff's hunks; findings without a
+    line count for the whole file.
+    """
+    if finding.path not in index:
+        return False
+    return finding.line is None or index.contains_line(finding.path, finding.line)
+
+
+def scope_result(command: str, result: Any, index: DiffIndex, repo_root: str = ".") -> Any:
+    """
+    Replace a linter's output with the findings inside the diff's hunks,
+    grouped by file, and the number of findings elsewhere.
+
+    Type checkers also keep up to MAX_ELSEWHERE of the findings elsewhere as
+    `path:line: message` under `findings_elsewhere`, those that mention a
+    changed file or a symbol defined in the diff first: a changed signature
+    breaks its callers, which are usually outside the diff.
+
+    Results of other commands, failed runs, and output with no recognizable
+    finding (clean runs, configuration errors, crashes) are returned unchanged.
+    """
+    tool = lint_tool(command)
+    if tool is None or not isinstance(result, dict) or "error" in result:
+        return result
+    output = "\n".join(str(result.get(stream) or "") for stream in ("stdout", "stderr"))
+    findings = parse_findings(tool, output, repo_root)
+    if not findings:
+        return result
+
+    kept = [f for f in findings if in_diff(f, index)]
+    by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for finding in kept[:MAX_FINDINGS]:
+        entry = {"line": finding.line, "column": finding.column, "code": finding.code, "severity": finding.severity, "message": finding.message}
+        by_file.setdefault(finding.path, []).append({k: v for k, v in entry.items() if v is not None})
+    scoped: Dict[str, Any] = {
+        "exit_code": result.get("exit_code"),
+        "tool": tool,
+        "findings": by_file,
+        "findings_total": len(findings),
+        "findings_outside_diff": len(findings) - len(kept),
+    }
+    if len(kept) > MAX_FINDINGS:
+        scoped["findings_omitted"] = len(kept) - MAX_FINDINGS
+    if tool in TYPE_CHECKERS and len(kept) < len(findings):
+        scoped["findings_elsewhere"] = _elsewhere([f for f in findings if not in_diff(f, index)], index)
+    if result.get("truncated"):
+        # Output was cut: the counts are lower bounds
+        scoped["truncated"] = result["truncated"]
+    return scoped
+
+
+def changed_symbols(index: DiffIndex) -> Set[str]:
+    """
+    Names of the functions, classes and types defined on the diff's changed
+    lines or enclosing its hunks.
+    """
+    names: Set[str] = set()
+    for file in index:
+        for hunk in file.hunks:
+            for text in index.hunk_text(hunk).splitlines():
+                if text.startswith("@@"):
+                    # The enclosing definition after the second `@@`
+                    text = text.split("@@", 2)[-1]
+                elif not text.startswith(("+", "-")) or text.startswith(("+++", "---")):
+                    continue
+                names.update(m["name"] for m in _DEFINITION.finditer(text))
+    return names
+
+
+def _elsewhere(findings: List[Finding], index: DiffIndex) -> List[str]:
+    """
+    Findings outside the diff as `path:line: message`, those that mention a
+    changed file or symbol first, capped at MAX_ELSEWHERE.
+    """
+    files = set()
+    for path in index.changed_files:
+        files.update((path, posixpath.basename(path)))
+    symbols = changed_symbols(index)
+    pattern = re.compile(r"\b(?:%s)\b" % "|".join(re.escape(s) for s in sorted(symbols))) if symbols else None
+
+    def related(finding: Finding) -> bool:
+        if any(name in finding.message for name in files):
+            return True
+        return pattern is not None and pattern.search(finding.message) is not None
+
+    ordered = sorted(findings, key=lambda f: not related(f))
+    return [f"{f.path}:{f.line}: {f.message}" if f.line is not None else f"{f.path}: {f.message}" for f in ordered[:MAX_ELSEWHERE]]
+
+
+def scope_command(command: str, changed_files: Iterable[str], repo_root: str = ".") -> Optional[str]:
+    """
+    Rewrite a file-level linter command (ruff, flake8, pylint, eslint) whose
+    targets are directories so that it checks only the changed files in them.
+
+    Returns None when the command is not such a linter, already names files,
+    or no changed file of the linter's language is under its targets.
+    """
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return None
+    found = _program(command, words)
+    if found is None or found[0] not in FILE_LINTERS:
+        return None
+    tool, start = found
+    if tool == "ruff" and start < len(words) and not words[start].startswith("-"):
+        if words[start] != "check":
+            # `ruff format`, `ruff rule ...`
+            return None
+        start += 1
+
+    root = os.path.abspath(repo_root)
+    targets = [
+        i for i in range(start, len(words))
+        if not words[i].startswith("-") and words[i - 1] not in _VALUE_OPTIONS
+        and (os.path.isdir(os.path.join(root, words[i])) or words[i].endswith(FILE_LINTERS[tool]))
+    ]
+    if not targets and tool not in _IMPLICIT_ROOT:
+        return None
+    directories = [posixpath.normpath(words[i]) for i in targets]
+    if not directories:
+        directories = ["."]
+    elif not all(os.path.isdir(os.path.join(root, d)) for d in directories):
+        # Already names files
+        return None
+
+    files = [
+        path for path in changed_files
+        if path.endswith(FILE_LINTERS[tool]) and os.path.isfile(os.path.join(root, path))
+        and any(d == "." or path.startswith(d.rstrip("/") + "/") for d in directories)
+    ]
+    if not files or len(files) > MAX_SCOPED_FILES:
+        return None
+    scoped = [w for i, w in enumerate(words) if i not in targets]
+    if tool == "ruff" and "--force-exclude" not in scoped:
+        # Files named on the command line skip ruff's `exclude` otherwise
+        scoped.append("--force-exclude")
+    return shlex.join(scoped + sorted(files))
+
+
+def _program(command: str, words: Optional[List[str]] = None) -> Optional[Tuple[str, int]]:
+    """
+    The checker `command` runs and the index of its first argument.
+    """
+    if words is None:
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            return None
+    i = 0
+    while i < len(words) and "=" in words[i] and not words[i].startswith("-"):
+        # Leading `VAR=value` assignments
+        i += 1
+    if i + 2 < len(words) and re.fullmatch(r"python[\d.]*", words[i]) and words[i + 1] == "-m":
+        i += 2
+    for runner in _RUNNERS:
+        if tuple(words[i:i + len(runner)]) == runner:
+            i += len(runner)
+            while i < len(words) and words[i].startswith("-"):
+                i += 1
+            break
+    if i >= len(words):
+        return None
+    program = posixpath.basename(words[i])
+    rest = words[i + 1:]
+    if program in _PROGRAMS:
+        return program, i + 1
+    if program == "cargo" and rest[:1] in (["clippy"], ["check"], ["build"]):
+        return ("clippy" if rest[0] == "clippy" else "cargo"), i + 2
+    if program == "go" and rest[:1] == ["vet"]:
+        return "go vet", i + 2
+    if program in ("npm", "pnpm", "yarn", "bun", "make"):
+        script = rest[1:2] if rest[:1] == ["run"] else rest[:1]
+        if script and script[0] in _CHECK_SCRIPTS:
+            return script[0], len(words)
+    if program in _CHECK_SCRIPTS and words[i] == program and i > 0:
+        # `yarn lint`, `pnpm typecheck`: the runner prefix was consumed above
+        return program, len(words)
+    return None
+
+
+def _finding(tool: str, root: str, match: "re.Match[str]", severity: str, code: Optional[str], message: str) -> Finding:
+    column = match["column"]
+    return Finding(tool, _relative(match["path"], root), int(match["line"]), int(column) if column else None, code, severity, message)
+
+
+def _split_message(rest: str) -> Tuple[str, Optional[str], str]:
+    """
+    Severity, code and message of a located diagnostic.
+    """
+    severity, code, message = "warning", None, rest.strip()
+    match = _SEVERITY.match(message)
+    if match:
+        severity, code, message = match["severity"].lower(), match["code"], match["message"]
+    else:
+        match = _LEADING_CODE.match(message)
+        if match:
+            code, message = match["code"], match["message"]
+    match = _TRAILING_CODE.match(message)
+    if match and code is None:
+        message, code = match["message"], match["bracket"] or match["paren"]
+        if match["severity"]:
+            severity = match["severity"].lower()
+    return severity, code, message
+
+
+def _relative(path: str, root: str) -> str:
+    path = path.strip()
+    if os.path.isabs(path):
+        path = os.path.relpath(path, root)
+    return posixpath.normpath(path.replace(os.sep, "/"))
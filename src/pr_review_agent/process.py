@@ -0,0 +1,217 @@
+"""Running shell commands with bounded, streaming output capture."""
+import codecs
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+# Default per-stream byte budget, split evenly between the head and the tail
+MAX_OUTPUT_BYTES = 64 * 1024
+
+READ_CHUNK = 64 * 1024
+TRUNCATION_MARKER = "[pr-review-agent] "
+
+# Seconds to wait for the output pipes to close after the shell exits; background
+# processes it left behind that still hold them open are then killed
+DRAIN_TIMEOUT = 5.0
+
+# How often a cancellable command checks its cancel event, in seconds
+CANCEL_POLL_INTERVAL = 0.1
+
+# Called with ("stdout" | "stderr", decoded chunk) as output arrives
+OutputCallback = Callable[[str, str], None]
+
+
+class OutputCapture:
+    """
+    Keep the first and last `max_bytes // 2` bytes of a stream, counting the
+    bytes and lines in between, so memory stays bounded however much is written.
+    """
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        # Ring buffer of the latest bytes, trimmed once it reaches twice its limit
+        self._tail = bytearray()
+        self.total_bytes = 0
+        self.lines = 0
+        self._last_byte = b""
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total_bytes += len(data)
+        self.lines += data.count(b"\n")
+        self._last_byte = data[-1:]
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            if len(self._tail) > 2 * self.tail_limit:
+                del self._tail[:-self.tail_limit]
+
+    @property
+    def tail(self) -> bytes:
+        return bytes(self._tail[-self.tail_limit:]) if self.tail_limit else b""
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.head) + len(self.tail)
+
+    def text(self) -> str:
+        """
+        The captured output, with a marker line where the middle was dropped.
+        """
+        head = self.head.decode("utf-8", "replace")
+        if not self.truncated:
+            return head + self.tail.decode("utf-8", "replace")
+        tail = self.tail
+        # Start the tail on a line boundary when one is close
+        newline = tail.find(b"\n", 0, 256)
+        if newline >= 0:
+            tail = tail[newline + 1:]
+        omitted = self.total_bytes - len(self.head) - len(tail)
+        if head and not head.endswith("\n"):
+            head += "\n"
+        return f"{head}... {TRUNCATION_MARKER}{omitted} bytes omitted ...\n{tail.decode('utf-8', 'replace')}"
+
+    def line_count(self) -> int:
+        # A final line without a newline still counts
+        return self.lines + (1 if self.total_bytes and self._last_byte != b"\n" else 0)
+
+
+class CommandResult(NamedTuple):
+    exit_code: Optional[int]
+    stdout: OutputCapture
+    stderr: OutputCapture
+    timed_out: bool
+    cancelled: bool = False
+
+
+def run_bounded(
+    command: str,
+    cwd: str = ".",
+    timeout: float = 120,
+    max_output_bytes: int = MAX_OUTPUT_BYTES,
+    on_output: Optional[OutputCallback] = None,
+    niceness: int = 0,
+    cancel: Optional[threading.Event] = None
+) -> CommandResult:
+    """
+    Run a shell command, streaming stdout and stderr into bounded captures.
+
+    The command runs in its own process group, so a timeout kills everything it
+    started (test runners, their workers, watchers), not just the shell.
+    `on_output` receives each chunk as it is read, for live progress.
+    A positive `niceness` lowers the command's CPU priority; setting `cancel`
+    kills it like a timeout does.
+    """
+    nice = shutil.which("nice") if niceness and os.name == "posix" else None
+    if nice is not None:
+        # The shell starts at the lower priority, so everything it runs inherits
+        # it; `preexec_fn` would do the same but isn't safe in a threaded process
+        command = f"exec {shlex.quote(nice)} -n {int(niceness)} /bin/sh -c {shlex.quote(command)}"
+    proc = subprocess.Popen(
+        command,
+        cwd=cwd,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=os.name == "posix",
+    )
+    captures = {"stdout": OutputCapture(max_output_bytes), "stderr": OutputCapture(max_output_bytes)}
+    readers: List[threading.Thread] = [
+        threading.Thread(target=_pump, args=(pipe, name, captures[name], on_output), daemon=True)
+        for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = False
+    cancelled = False
+    try:
+        if cancel is None:
+            proc.wait(timeout=timeout)
+        else:
+            cancelled = _wait_cancellable(proc, timeout, cancel)
+            if cancelled:
+                kill_process_group(proc)
+                proc.wait()
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        kill_process_group(proc)
+        proc.wait()
+    except BaseException:
+        # Interrupted: don't leave the command running behind us
+        kill_process_group(proc)
+        raise
+    finally:
+        for reader in readers:
+            reader.join(DRAIN_TIMEOUT)
+        if any(reader.is_alive() for reader in readers):
+            kill_process_group(proc)
+            for reader in readers:
+                reader.join(DRAIN_TIMEOUT)
+        # A process that left the group (setsid) may still hold a pipe; its
+        # daemon reader is abandoned rather than closed under its feet
+        for reader, pipe in zip(readers, (proc.stdout, proc.stderr)):
+            if pipe is not None and not reader.is_alive():
+                pipe.close()
+
+    return CommandResult(None if timed_out or cancelled else proc.returncode, captures["stdout"], captures["stderr"], timed_out, cancelled)
+
+
+def _wait_cancellable(proc: "subprocess.Popen[bytes]", timeout: float, cancel: threading.Event) -> bool:
+    """
+    Wait for `proc` like `Popen.wait`, returning True early if `cancel` is set.
+    """
+    deadline = time.monotonic() + timeout
+    while not cancel.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        try:
+            proc.wait(timeout=min(CANCEL_POLL_INTERVAL, remaining))
+            return False
+        except subprocess.TimeoutExpired:
+            continue
+    return True
+
+
+def kill_process_group(proc: "subprocess.Popen[bytes]") -> None:
+    """
+    Kill a process started with `start_new_session=True` and all its descendants.
+    """
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+            return
+        except (ProcessLookupError, PermissionError):
+            pass
+    proc.kill()
+
+
+def _pump(pipe, name: str, capture: OutputCapture, on_output: Optional[OutputCallback]) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    try:
+        for chunk in iter(lambda: pipe.read1(READ_CHUNK), b""):
+            capture.feed(chunk)
+            if on_output is None:
+                continue
+            text = decoder.decode(chunk)
+            try:
+                if text:
+                    on_output(name, text)
+            except Exception:
+                # A broken progress callback must not stop the pipe from draining
+                on_output = None
+    except (OSError, ValueError):
+        pass
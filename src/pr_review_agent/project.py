@@ -0,0 +1,327 @@
+"""Deterministic project profile: languages, package manager and check commands read from the manifests."""
+import glob
+import json
+import os
+import re
+import tomllib
+from typing import Any, Dict, List, Optional, Set
+from .index.extract import language_of
+from .tracing import span
+
+# Manifests and configs that identify a toolchain, in reporting order
+MANIFESTS = (
+    "pyproject.toml", "setup.py", "setup.cfg", "requirements.txt", "Pipfile", "tox.ini", "noxfile.py",
+    "uv.lock", "poetry.lock", "pdm.lock", "Pipfile.lock",
+    "package.json", "tsconfig.json", "package-lock.json", "pnpm-lock.yaml", "yarn.lock", "bun.lockb", "bun.lock",
+    "Cargo.toml", "Cargo.lock",
+    "go.mod", "go.sum",
+    "Makefile",
+)
+
+CI_CONFIGS = (
+    ".github/workflows/*.yml", ".github/workflows/*.yaml", ".gitlab-ci.yml", ".circleci/config.yml",
+    "azure-pipelines.yml", ".travis.yml", "Jenkinsfile",
+)
+
+# Manifests larger than this are not read (vendored or generated files)
+MAX_MANIFEST_BYTES = 512 * 1024
+
+# Most CI commands reported; enough to show how CI runs the checks
+MAX_CI_COMMANDS = 10
+
+# CI lines worth reporting: those that run a test, lint or type check
+_CI_CHECK = re.compile(
+    r"\b(pytest|ruff|mypy|pyright|flake8|pylint|tox|nox|unittest|eslint|tsc|jest|vitest|mocha|"
+    r"npm (?:test|run)|pnpm|yarn|bun|cargo (?:test|clippy|check|fmt)|go (?:test|vet|build)|golangci-lint|make)\b"
+)
+_CI_RUN = re.compile(r"^(\s*)(?:-\s*)?(?:run|script):\s*(.*)$")
+_MAKE_TARGET = re.compile(r"^(test|tests|check|lint|typecheck|type-check|mypy)\s*:(?!=)", re.MULTILINE)
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+# Prefix that runs a tool inside the project's environment
+_PYTHON_RUNNERS = {"uv": "uv run ", "poetry": "poetry run ", "pdm": "pdm run ", "pipenv": "pipenv run ", "pip": ""}
+_NODE_EXEC = {"npm": "npx --yes ", "pnpm": "pnpm exec ", "yarn": "yarn ", "bun": "bunx "}
+_NODE_LOCKFILES = (("pnpm-lock.yaml", "pnpm"), ("yarn.lock", "yarn"), ("bun.lockb", "bun"), ("bun.lock", "bun"), ("package-lock.json", "npm"))
+
+# Languages checked by the same toolchain
+_FAMILIES = {"typescript": "javascript", "kotlin": "java", "cpp": "c"}
+
+# Order in which checks are picked for speculative runs
+SPECULATIVE_KINDS = ("test", "lint", "typecheck")
+
+
+def detect_project(repo_root: str) -> Dict[str, Any]:
+    """
+    Profile the project at `repo_root` from its manifests, lockfiles and CI
+    configs, without running anything.
+
+    Only the repository root is inspected. Returns an empty dict when no
+    known toolchain is found.
+    """
+    with span("project:detect"):
+        try:
+            entries = set(os.listdir(repo_root))
+        except OSError:
+            return {}
+
+        profile = _Profile()
+        pyproject = _read_toml(repo_root, "pyproject.toml") if "pyproject.toml" in entries else None
+        if pyproject is not None or entries & {"setup.py", "setup.cfg", "requirements.txt", "Pipfile"}:
+            _detect_python(repo_root, entries, pyproject or {}, profile)
+        if "package.json" in entries:
+            _detect_node(repo_root, entries, profile)
+        if "Cargo.toml" in entries:
+            _detect_rust(profile)
+        if "go.mod" in entries:
+            _detect_go(entries, profile)
+        if "Makefile" in entries:
+            _detect_make(repo_root, profile)
+        if not profile.languages:
+            return {}
+
+        result: Dict[str, Any] = {
+            "languages": profile.languages,
+            "package_managers": profile.package_managers,
+            "manifests": [m for m in MANIFESTS if m in entries],
+            "commands": {kind: commands for kind, commands in profile.commands.items() if commands},
+        }
+        ci_files = _ci_files(repo_root)
+        if ci_files:
+            result["ci"] = ci_files
+            ci_commands = _ci_commands(repo_root, ci_files)
+            if ci_commands:
+                result["ci_commands"] = ci_commands
+        return result
+
+
+def speculative_checks(profile: Dict[str, Any], changed_files: List[str], limit: int = 3, tests: Optional[List[str]] = None) -> List[str]:
+    """
+    The profile's first test, lint and typecheck commands, worth starting before
+    the planner asks for them when the change touches one of its languages.
+
+    `tests` replaces the profile's test commands, e.g. with ones narrowed to
+    the impacted tests; an empty list leaves tests out.
+    """
+    languages = {_FAMILIES.get(language, language) for language in profile.get("languages", [])}
+    touched = {_FAMILIES.get(language, language) for language in map(language_of, changed_files) if language}
+    if not languages & touched:
+        return []
+    commands = dict(profile.get("commands", {}))
+    if tests is not None:
+        commands["test"] = tests
+    return [commands[kind][0] for kind in SPECULATIVE_KINDS if commands.get(kind)][:max(0, limit)]
+
+
+class _Profile:
+    def __init__(self) -> None:
+        self.languages: List[str] = []
+        self.package_managers: List[str] = []
+        self.commands: Dict[str, List[str]] = {"test": [], "lint": [], "typecheck": []}
+
+    def add(self, kind: str, command: str) -> None:
+        if command not in self.commands[kind]:
+            self.commands[kind].append(command)
+
+    def language(self, language: str, package_manager: Optional[str] = None) -> None:
+        if language not in self.languages:
+            self.languages.append(language)
+        if package_manager and package_manager not in self.package_managers:
+            self.package_managers.append(package_manager)
+
+
+def _detect_python(root: str, entries: Set[str], pyproject: Dict[str, Any], profile: _Profile) -> None:
+    tool = pyproject.get("tool", {})
+    if "uv.lock" in entries or "uv" in tool:
+        manager = "uv"
+    elif "poetry.lock" in entries or "poetry" in tool:
+        manager = "poetry"
+    elif "pdm.lock" in entries or "pdm" in tool:
+        manager = "pdm"
+    elif "Pipfile" in entries:
+        manager = "pipenv"
+    else:
+        manager = "pip"
+    profile.language("python", manager)
+    run = _PYTHON_RUNNERS[manager]
+
+    requirements = _python_requirements(root, entries, pyproject)
+    setup_cfg = _read_text(root, "setup.cfg") if "setup.cfg" in entries else ""
+    tox_ini = _read_text(root, "tox.ini") if "tox.ini" in entries else ""
+
+    if ("pytest" in tool or "pytest" in requirements or entries & {"pytest.ini", "conftest.py"}
+            or "[tool:pytest]" in setup_cfg or "[pytest]" in tox_ini):
+        profile.add("test", f"{run}pytest -q")
+    elif entries & {"tests", "test"}:
+        profile.add("test", f"{run}python -m unittest discover")
+
+    if "ruff" in tool or "ruff" in requirements or entries & {"ruff.toml", ".ruff.toml"}:
+        profile.add("lint", f"{run}ruff check .")
+    if "flake8" in requirements or ".flake8" in entries or "[flake8]" in setup_cfg or "[flake8]" in tox_ini:
+        profile.add("lint", f"{run}flake8")
+    if "pylint" in tool or ".pylintrc" in entries or "pylintrc" in entries:
+        profile.add("lint", f"{run}pylint {_python_package(root, entries, pyproject)}")
+
+    if "mypy" in tool or "mypy" in requirements or entries & {"mypy.ini", ".mypy.ini"} or "[mypy]" in setup_cfg:
+        profile.add("typecheck", f"{run}mypy {_python_package(root, entries, pyproject)}")
+    if "pyright" in tool or "pyright" in requirements or "pyrightconfig.json" in entries:
+        profile.add("typecheck", f"{run}pyright")
+
+
+def _python_requirements(root: str, entries: Set[str], pyproject: Dict[str, Any]) -> Set[str]:
+    project = pyproject.get("project", {})
+    specs: List[str] = list(project.get("dependencies", []))
+    for group in list(project.get("optional-dependencies", {}).values()) + list(pyproject.get("dependency-groups", {}).values()):
+        specs.extend(s for s in group if isinstance(s, str))
+    names = set()
+    poetry = pyproject.get("tool", {}).get("poetry", {})
+    for section in [poetry.get("dependencies", {}), poetry.get("dev-dependencies", {})] + [
+        g.get("dependencies", {}) for g in poetry.get("group", {}).values()
+    ]:
+        names.update(name.lower() for name in section)
+    for name in sorted(e for e in entries if e.startswith("requirements") and e.endswith(".txt")):
+        specs.extend(_read_text(root, name).splitlines())
+    for spec in specs:
+        match = _REQUIREMENT_NAME.match(spec)
+        if match:
+            names.add(match.group(1).lower().replace("_", "-"))
+    return names
+
+
+def _python_package(root: str, entries: Set[str], pyproject: Dict[str, Any]) -> str:
+    # mypy and pylint need a target; `src/` layouts are the common case
+    if "src" in entries:
+        return "src"
+    name = str(pyproject.get("project", {}).get("name", "")).replace("-", "_")
+    if name and os.path.isdir(os.path.join(root, name)):
+        return name
+    return "."
+
+
+def _detect_node(root: str, entries: Set[str], profile: _Profile) -> None:
+    try:
+        package = json.loads(_read_text(root, "package.json") or "{}")
+    except ValueError:
+        package = {}
+    if not isinstance(package, dict):
+        package = {}
+    manager = next((m for lockfile, m in _NODE_LOCKFILES if lockfile in entries), None)
+    if manager is None:
+        # Corepack's "packageManager": "pnpm@9.1.0"
+        manager = str(package.get("packageManager", "npm")).split("@", 1)[0]
+        if manager not in _NODE_EXEC:
+            manager = "npm"
+    dependencies = {**package.get("dependencies", {}), **package.get("devDependencies", {})}
+    typescript = "typescript" in dependencies or "tsconfig.json" in entries
+    profile.language("typescript" if typescript else "javascript", manager)
+
+    run = "npm run" if manager == "npm" else f"{manager} run"
+    execute = _NODE_EXEC[manager]
+    scripts = package.get("scripts", {}) if isinstance(package.get("scripts"), dict) else {}
+    test_script = scripts.get("test", "")
+    # npm's placeholder: "echo \"Error: no test specified\" && exit 1"
+    if test_script and "no test specified" not in test_script:
+        profile.add("test", f"{run} test")
+    elif "vitest" in dependencies:
+        profile.add("test", f"{execute}vitest run")
+    elif "jest" in dependencies:
+        profile.add("test", f"{execute}jest")
+
+    if "lint" in scripts:
+        profile.add("lint", f"{run} lint")
+    elif "eslint" in dependencies or any(e.startswith((".eslintrc", "eslint.config.")) for e in entries):
+        profile.add("lint", f"{execute}eslint .")
+    elif "@biomejs/biome" in dependencies or "biome.json" in entries:
+        profile.add("lint", f"{execute}biome lint .")
+
+    script = next((s for s in ("typecheck", "type-check", "tsc", "check-types") if s in scripts), None)
+    if script:
+        profile.add("typecheck", f"{run} {script}")
+    elif typescript:
+        profile.add("typecheck", f"{execute}tsc --noEmit")
+
+
+def _detect_rust(profile: _Profile) -> None:
+    profile.language("rust", "cargo")
+    profile.add("test", "cargo test")
+    profile.add("lint", "cargo clippy --all-targets")
+    profile.add("typecheck", "cargo check --all-targets")
+
+
+def _detect_go(entries: Set[str], profile: _Profile) -> None:
+    profile.language("go", "go")
+    profile.add("test", "go test ./...")
+    if entries & {".golangci.yml", ".golangci.yaml", ".golangci.toml", ".golangci.json"}:
+        profile.add("lint", "golangci-lint run")
+    profile.add("lint", "go vet ./...")
+    profile.add("typecheck", "go build ./...")
+
+
+def _detect_make(root: str, profile: _Profile) -> None:
+    kinds = {
+        "test": "test", "tests": "test", "check": "test", "lint": "lint",
+        "typecheck": "typecheck", "type-check": "typecheck", "mypy": "typecheck",
+    }
+    for target in _MAKE_TARGET.findall(_read_text(root, "Makefile")):
+        profile.add(kinds[target], f"make {target}")
+
+
+def _ci_files(root: str) -> List[str]:
+    found: List[str] = []
+    for pattern in CI_CONFIGS:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            found.append(os.path.relpath(path, root))
+    return found
+
+
+def _ci_commands(root: str, ci_files: List[str]) -> List[str]:
+    commands: List[str] = []
+    for path in ci_files:
+        for command in _run_lines(_read_text(root, path)):
+            if _CI_CHECK.search(command) and command not in commands:
+                commands.append(command)
+                if len(commands) >= MAX_CI_COMMANDS:
+                    return commands
+    return commands
+
+
+def _run_lines(text: str) -> List[str]:
+    """
+    Commands of `run:` / `script:` steps, including `|` and `>` blocks.
+    """
+    lines = text.splitlines()
+    found: List[str] = []
+    i = 0
+    while i < len(lines):
+        match = _CI_RUN.match(lines[i])
+        i += 1
+        if not match:
+            continue
+        value = match.group(2).strip()
+        if value and value[0] not in "|>":
+            found.append(value.strip("'\""))
+            continue
+        indent = len(match.group(1))
+        while i < len(lines) and (not lines[i].strip() or len(lines[i]) - len(lines[i].lstrip()) > indent):
+            line = lines[i].strip()
+            if line and not line.startswith("#"):
+                found.append(line.lstrip("- ").strip("'\""))
+            i += 1
+    return found
+
+
+def _read_text(root: str, name: str) -> str:
+    path = os.path.join(root, name)
+    try:
+        if os.path.getsize(path) > MAX_MANIFEST_BYTES:
+            return ""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _read_toml(root: str, name: str) -> Optional[Dict[str, Any]]:
+    try:
+        return tomllib.loads(_read_text(root, name))
+    except tomllib.TOMLDecodeError:
+        return {}
@@ -6,14 +6,26 @@ Your workflow should be:
 2. Deduce the language and tools. If unsure, read config files using `run_command` (e.g., `cat package.json`) or search the web (`search_web`).
    - If config files are missing or empty (e.g. empty 'package-lock.json'), look at file extensions in `root_contents` (e.g., `.html`, `.js`, `.py`) and try standard tools (e.g., `npm test`, `eslint .`, `pytest`) or search for "standard linter for <language>".
 3. Execute commands to run tests, linters, or static analysis (`run_command`).
+   - Run only the tests affected by the change: use the commands in Repo Facts `impacted_tests` (or call `find_impacted_tests`) instead of the whole suite, unless it reports `full_suite`.
    - Use non-interactive flags (e.g., `npx --yes <tool>`, `npm install -y`) to prevent timeouts from prompts.
+   - If Repo Facts contain a `project` profile, its languages, package manager and test/lint/typecheck commands were already detected from the manifests and CI configs: skip steps 1 and 2 and run the commands relevant to the changed files on the first turn.
+   - Commands listed in Repo Facts `speculative_checks` were started in the background when the review began. Request them with exactly that command string to get their results without waiting for a new run.
+   - Linter and type checker results (ruff, flake8, pylint, mypy, pyright, eslint, tsc, clippy) list only the `findings` inside the changed hunks; `findings_outside_diff` counts the findings elsewhere.
+   - Type checkers also list some of those in `findings_elsewhere`, the ones mentioning changed files or symbols first: a change can break unchanged callers, so check whether the diff caused them.
+   - File-level linters are run on the changed files only (`scoped_command`), so running `ruff check .` or `eslint .` is cheap.
    - For long-running commands (installing packages), you can increase the `timeout` argument in `run_command`.
+4. To find where changed code is defined or used, prefer `find_symbol`, `find_references`, `find_files` and `read_file_range` over `ls -R`, `cat` or grep commands: they answer from an index in milliseconds.
 
 Available tools:
 - explore_workspace: Lists files in the repository root.
 - search_web: Search the internet for command usage or documentation.
 - run_command: Run any shell command (e.g., 'npm test', 'cargo check', 'pytest', 'ls -R').
 - git_diff: Get the diff again if needed.
+- find_symbol: Where a function, class, method or type is defined (args: name, optional kind; `name*` matches a prefix).
+- find_references: Files and lines where an identifier is used (args: name, optional path_prefix).
+- find_files: Repository files matching a glob or path substring (args: pattern).
+- find_impacted_tests: Tests that import or exercise the given files, with the test command narrowed to them (args: changed_files, optional test_command).
+- read_file_range: Numbered lines of a file (args: path, start_line, end_line; at most 400 lines).
 
 Input:
 Diff: {diff}
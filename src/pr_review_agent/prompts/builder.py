@@ -0,0 +1,247 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, cast
+from ..cache import BlobStore, blob_digest
+from ..diff import DiffIndex
+from ..schemas import AgentState, ModelSettings
+from . import PLANNING_PROMPT, REVIEW_PROMPT
+
+# Rough chars-per-token ratio for code and logs with current BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+# Observations from earlier iterations are squeezed down to this many tokens each
+OLD_OBSERVATION_TOKENS = 150
+
+ERROR_LINE = re.compile(r"error|fail|exception|traceback|fatal|panic|assert", re.IGNORECASE)
+# A whole line containing an ERROR_LINE word, searched in undecoded bytes
+ERROR_LINE_BYTES = re.compile(rb"^[^\n]*(?:" + ERROR_LINE.pattern.encode() + rb")[^\n]*", re.IGNORECASE | re.MULTILINE)
+DIFF_FILE = re.compile(r"^diff --git a/(\S+)", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate, good enough for budgeting without loading a tokenizer.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_text(text: str, max_tokens: int) -> str:
+    """
+    Shrink a log to roughly `max_tokens`, keeping its head, tail and any error lines.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+
+    lines = text.splitlines()
+    head_chars, error_chars, tail_chars = max_chars * 3 // 10, max_chars * 3 // 10, max_chars * 4 // 10
+
+    head: List[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 > head_chars:
+            break
+        head.append(line)
+        used += len(line) + 1
+
+    tail: List[str] = []
+    used = 0
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > tail_chars:
+            break
+        tail.append(line)
+        used += len(line) + 1
+    tail.reverse()
+
+    errors: List[str] = []
+    used = 0
+    for line in lines[len(head):len(lines) - len(tail)]:
+        if not ERROR_LINE.search(line):
+            continue
+        line = line[:200]
+        if used + len(line) + 1 > error_chars:
+            break
+        errors.append(line)
+        used += len(line) + 1
+
+    if not head and not tail:
+        # A single huge line (minified output, progress bars): cut by characters
+        return f"{text[:head_chars]}\n... [{len(text) - head_chars - tail_chars} chars omitted] ...\n{text[-tail_chars:]}"
+
+    omitted = len(lines) - len(head) - len(tail)
+    parts = head + [f"... [{omitted} lines omitted] ..."]
+    if errors:
+        parts += ["[error lines]"] + errors + ["[/error lines]"]
+    return "\n".join(parts + tail)
+
+
+def compact_view(view: memoryview, max_tokens: int) -> str:
+    """
+    `compact_text` for UTF-8 bytes, such as a blob: only the head, the tail
+    and the error lines in between are copied out of `view` and decoded.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    size = view.nbytes
+    if size <= max_chars:
+        return str(view, "utf-8", "replace")
+    head_chars, error_chars, tail_chars = max_chars * 3 // 10, max_chars * 3 // 10, max_chars * 4 // 10
+
+    # Whole lines only, which also keeps multi-byte characters in one piece
+    head = bytes(view[:head_chars])
+    head = head[:head.rfind(b"\n") + 1]
+    tail = bytes(view[size - tail_chars:])
+    tail = tail[tail.find(b"\n") + 1:] if b"\n" in tail else b""
+    if not head and not tail:
+        # A single huge line: cut by bytes
+        head, tail = bytes(view[:head_chars]), bytes(view[size - tail_chars:])
+        return f"{str(head, 'utf-8', 'replace')}\n... [{size - head_chars - tail_chars} bytes omitted] ...\n{str(tail, 'utf-8', 'replace')}"
+
+    errors: List[str] = []
+    used = 0
+    for match in ERROR_LINE_BYTES.finditer(view, len(head), size - len(tail)):
+        line = str(match.group()[:200], "utf-8", "replace")
+        if used + len(line) + 1 > error_chars:
+            break
+        errors.append(line)
+        used += len(line) + 1
+
+    parts = [str(head, "utf-8", "replace").rstrip("\n"), f"... [{size - len(head) - len(tail)} bytes omitted] ..."]
+    if errors:
+        parts += ["[error lines]"] + errors + ["[/error lines]"]
+    return "\n".join(parts + [str(tail, "utf-8", "replace")])
+
+
+def compact_observation(observation: Dict[str, Any], max_tokens: int, blobs: Optional[BlobStore] = None) -> Dict[str, Any]:
+    """
+    Return a copy of a tool observation whose long text fields fit roughly in `max_tokens`.
+
+    Scalar fields such as `exit_code` are always kept. Text moved to `blobs`
+    is compacted straight from the store, reading only the parts kept.
+    """
+    result = observation.get("result")
+    if isinstance(result, str):
+        return {**observation, "result": compact_text(result, max_tokens)}
+    if not isinstance(result, dict):
+        return observation
+
+    # Field -> size, for text and for blobs this store has
+    sizes: Dict[str, int] = {}
+    for key, value in result.items():
+        if isinstance(value, str):
+            sizes[key] = len(value)
+        elif blobs is not None and blob_digest(value) in blobs:
+            sizes[key] = value["bytes"]
+    if not sizes:
+        return observation
+    # Split the budget across text fields in proportion to their size
+    total = sum(sizes.values()) or 1
+    compacted = dict(result)
+    for key, size in sizes.items():
+        share = max(1, max_tokens * size // total)
+        value = result[key]
+        if isinstance(value, str):
+            compacted[key] = compact_text(value, share)
+        else:
+            compacted[key] = compact_view(cast(BlobStore, blobs).get(value["blob"]), share)
+    return {**observation, "result": compacted}
+
+
+class PromptBuilder:
+    """
+    Assemble planning and review prompts within per-section token budgets.
+
+    Every build returns the prompt together with the tokens used per section,
+    so prompt size stays flat across iterations instead of growing with every
+    tool run.
+    """
+
+    def __init__(self, settings: ModelSettings, blobs: Optional[BlobStore] = None):
+        self.settings = settings
+        self.blobs = blobs
+
+    def planning(self, state: AgentState) -> Tuple[str, Dict[str, int]]:
+        diff = self.fit_diff(state.diff, self.settings.prompt_diff_tokens, state.diff_index)
+        observations = self.fit_observations(state.tool_observations, self.settings.prompt_observation_tokens)
+        facts = self.fit_facts(state.repo_facts, self.settings.prompt_facts_tokens)
+        changed_files = json.dumps(state.changed_files)
+        prompt = PLANNING_PROMPT.format(
+            diff=diff,
+            changed_files=changed_files,
+            repo_facts=facts,
+            observations=observations
+        )
+        return prompt, self._usage(prompt, diff=diff, observations=observations, facts=facts, changed_files=changed_files)
+
+    def review(self, state: AgentState, diff: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+        if diff is None:
+            diff = self.fit_diff(state.diff, self.settings.prompt_diff_tokens, state.diff_index)
+        else:
+            diff = self.fit_diff(diff, self.settings.prompt_diff_tokens)
+        observations = self.fit_observations(state.tool_observations, self.settings.prompt_observation_tokens)
+        reflections = json.dumps(state.reflections)
+        prompt = REVIEW_PROMPT.format(
+            diff=diff,
+            observations=observations,
+            reflections=reflections
+        )
+        return prompt, self._usage(prompt, diff=diff, observations=observations, reflections=reflections)
+
+    def fit_diff(self, diff: str, max_tokens: int, index: Optional[DiffIndex] = None) -> str:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        if len(diff) <= max_chars:
+            return diff
+
+        cut = diff.rfind("\n", 0, max_chars) + 1 or max_chars
+        kept, dropped = diff[:cut], diff[cut:]
+        if index is not None and index.text is diff:
+            omitted_files = [f.path for f in index if f.end > cut]
+        else:
+            omitted_files = DIFF_FILE.findall(dropped)
+        note = f"... [diff truncated: {dropped.count(chr(10))} more lines"
+        if omitted_files:
+            note += f"; files cut or not shown: {', '.join(omitted_files[:50])}"
+            if len(omitted_files) > 50:
+                note += f" (+{len(omitted_files) - 50} more)"
+        return kept + note + "]\n"
+
+    def fit_observations(self, observations: List[Dict[str, Any]], max_tokens: int) -> str:
+        """
+        Render observations as JSON lines. The latest iteration shares most of the
+        budget; older ones are compacted hard, and the oldest are dropped if needed.
+        """
+        if not observations:
+            return "[]"
+
+        latest = max(o.get("iteration", 0) for o in observations)
+        recent = [o for o in observations if o.get("iteration", 0) == latest]
+        per_recent = max(OLD_OBSERVATION_TOKENS, max_tokens // max(1, len(recent)) - OLD_OBSERVATION_TOKENS)
+
+        rendered: List[str] = []
+        for observation in observations:
+            limit = per_recent if observation.get("iteration", 0) == latest else OLD_OBSERVATION_TOKENS
+            rendered.append(json.dumps(compact_observation(observation, limit, self.blobs), default=str))
+
+        dropped = 0
+        while len(rendered) > 1 and estimate_tokens("\n".join(rendered)) > max_tokens:
+            rendered.pop(0)
+            dropped += 1
+        if dropped:
+            rendered.insert(0, f"[{dropped} earlier observations omitted]")
+        return "\n".join(rendered)
+
+    def fit_facts(self, facts: Dict[str, Any], max_tokens: int) -> str:
+        rendered = json.dumps(facts, default=str)
+        if estimate_tokens(rendered) <= max_tokens:
+            return rendered
+
+        per_fact = max(1, max_tokens // max(1, len(facts)))
+        compacted = {
+            key: compact_text(value if isinstance(value, str) else json.dumps(value, default=str), per_fact)
+            for key, value in facts.items()
+        }
+        return json.dumps(compacted)
+
+    def _usage(self, prompt: str, **sections: str) -> Dict[str, int]:
+        usage = {name: estimate_tokens(text) for name, text in sections.items()}
+        usage["total"] = estimate_tokens(prompt)
+        return usage
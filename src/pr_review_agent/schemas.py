@@ -1,25 +1,74 @@
-from typing import List, Optional, Dict, Any, Literal
-from pydantic import BaseModel, Field
+import operator
+from typing import Annotated, List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, ConfigDict, Field
+from .diff import DiffIndex
 
 # --- Input Schemas ---
 
 class ModelSettings(BaseModel):
     model: str = "qwen/qwen3-32b,llama-3.3-70b-versatile,llama-3.1-8b-instant"
     max_iters: int = 7
+    max_tool_concurrency: int = 4
+    review_mode: Literal["auto", "single", "map_reduce"] = "auto"
+    review_shard_max_lines: int = 400
+    review_parallelism: int = 4
+    prompt_diff_tokens: int = 16000
+    prompt_observation_tokens: int = 6000
+    prompt_facts_tokens: int = 1000
+    tool_cache: bool = True
+    tool_cache_ttl: int = 24 * 3600
+    tool_cache_max_mb: int = 256
+    # Run commands in persistent per-review shells that keep cwd and environment
+    persistent_shell: bool = True
+    # Profile languages and check commands from the manifests before the first plan
+    detect_project: bool = True
+    # Narrow the profile's test command to the tests impacted by the change
+    impacted_tests: bool = True
+    # Start the profile's checks in the background while the first plan is generated;
+    # at most this many commands, this many at a time, at lowered CPU priority
+    speculative_checks: bool = True
+    speculative_max_commands: int = 3
+    speculative_parallelism: int = 2
+    # Run file-level linters on the changed files only, and keep only the linter
+    # and type checker findings inside the changed hunks
+    diff_scoped_lint: bool = True
+    # Tool output fields this large move out of the state into a blob store:
+    # files read back through mmap, or in memory
+    blob_store: Literal["file", "memory"] = "file"
+    blob_min_bytes: int = 4096
     enable_tools: bool = True
     enable_tot: bool = False
     strictness: Literal["low", "med", "high"] = "med"
     verbose: bool = False
     unsafe_mode: bool = False
 
+class DiffFileStat(BaseModel):
+    path: str
+    old_path: Optional[str] = None
+    # None for binary files
+    added: Optional[int] = None
+    removed: Optional[int] = None
+    # Patch was cut by the diff size caps
+    truncated: bool = False
+
 class ReviewRequest(BaseModel):
     repo_root: str
     mode: Literal["staged", "unstaged", "working-tree", "branch", "commit-range"]
     base_ref: Optional[str] = None
     head_ref: Optional[str] = None
     diff: str
+    # Per-file stats gathered with the diff; complete even when the diff is truncated
+    diff_stats: List[DiffFileStat] = Field(default_factory=list)
     settings: ModelSettings = Field(default_factory=ModelSettings)
 
+# One line of a `review-batch` manifest
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    repo_root: str
+    mode: Literal["staged", "unstaged", "working-tree", "branch", "commit-range"] = "branch"
+    base_ref: Optional[str] = None
+    head_ref: Optional[str] = None
+
 # --- Output Schemas ---
 
 class CommentSeverity(str):
@@ -51,16 +100,24 @@ class ReviewResponse(BaseModel):
 
 # --- Agent State ---
 
+# Append-only lists have an `operator.add` reducer: a node returns only its new
+# items and LangGraph extends the list, instead of every node copying it. Large
+# tool output lives in the graph's blob store; observations carry handles
 class AgentState(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     diff: str
+    # Parsed once per review; excluded from serialization
+    diff_index: Optional[DiffIndex] = Field(default=None, exclude=True)
     changed_files: List[str] = Field(default_factory=list)
     repo_facts: Dict[str, Any] = Field(default_factory=dict)
-    tool_observations: List[Dict[str, Any]] = Field(default_factory=list)
+    tool_observations: Annotated[List[Dict[str, Any]], operator.add] = Field(default_factory=list)
     hypotheses: List[str] = Field(default_factory=list)
     candidates: List[Dict[str, Any]] = Field(default_factory=list)
     review_draft: Optional[ReviewResponse] = None
     verification_report: Optional[str] = None
-    reflections: List[str] = Field(default_factory=list)
-    memory_read: List[str] = Field(default_factory=list)
-    memory_write: List[str] = Field(default_factory=list)
+    reflections: Annotated[List[str], operator.add] = Field(default_factory=list)
+    memory_read: Annotated[List[str], operator.add] = Field(default_factory=list)
+    memory_write: Annotated[List[str], operator.add] = Field(default_factory=list)
     iteration: int = 0
+    metadata: Dict[str, Any] = Field(default_factory=dict)
@@ -0,0 +1,376 @@
+"""Long-lived local review server that keeps the graph, clients and caches warm."""
+import hmac
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from pydantic import ValidationError
+from .config import default_cache_dir
+from .schemas import ReviewRequest, ReviewResponse
+
+if TYPE_CHECKING:
+    from .agent.client import GroqClient
+    from .cache import LLMResponseCache, ToolResultCache
+
+# Largest request body accepted; diffs are already size-capped by the client
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# Shared secret for TCP servers, sent by clients as `Authorization: Bearer <token>`
+TOKEN_ENV = "PR_AGENT_SERVER_TOKEN"
+
+
+class ServerBusy(RuntimeError):
+    """Raised when every worker is busy and the pending queue is full."""
+
+
+class ServerUnavailable(ConnectionError):
+    """Raised by the client when no server is listening at the address, or it is too busy to take the review."""
+
+
+def default_address() -> str:
+    """
+    Address from `PR_AGENT_SERVER`, else a Unix socket in the cache directory.
+
+    Addresses are either a socket path or `http://host:port`.
+    """
+    return os.getenv("PR_AGENT_SERVER") or os.path.join(default_cache_dir(), "server.sock")
+
+
+class ReviewService:
+    """
+    Warm review state shared by all requests: one `GroqClient` per model chain,
+    the LLM and tool caches, and the compiled graph. At most `workers` reviews run
+    at once; up to `max_pending` more wait for a slot, beyond that requests are
+    rejected with `ServerBusy`.
+
+    Reviews run commands, so `unsafe_mode` is the server's, whatever the
+    request's settings say.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pending: int = 16,
+        llm_cache: Optional["LLMResponseCache"] = None,
+        tool_cache: Optional["ToolResultCache"] = None,
+        unsafe_mode: bool = False
+    ):
+        self.workers = max(1, workers)
+        self.unsafe_mode = unsafe_mode
+        self.max_pending = max(0, max_pending)
+        self.llm_cache = llm_cache
+        self.tool_cache = tool_cache
+        self.started_at = time.time()
+        self.stats = {"active": 0, "queued": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._clients: Dict[str, "GroqClient"] = {}
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+
+    def warm_up(self, model: str) -> None:
+        from .agent.graph import compiled_workflow
+
+        compiled_workflow()
+        self.client_for(model)
+
+    def client_for(self, model: str) -> "GroqClient":
+        from .agent.client import GroqClient
+
+        with self._lock:
+            client = self._clients.get(model)
+            if client is None:
+                client = self._clients[model] = GroqClient(model=model, llm_cache=self.llm_cache)
+            return client
+
+    def review(self, request: ReviewRequest) -> ReviewResponse:
+        from .agent.orchestrator import ReviewOrchestrator
+        from .cache import ToolResultCache
+
+        if request.settings.unsafe_mode != self.unsafe_mode:
+            request = request.model_copy(update={"settings": request.settings.model_copy(update={"unsafe_mode": self.unsafe_mode})})
+        with self._lock:
+            if self.stats["active"] + self.stats["queued"] >= self.workers + self.max_pending:
+                self.stats["rejected"] += 1
+                raise ServerBusy(f"{self.workers} reviews running and {self.stats['queued']} queued")
+            self.stats["queued"] += 1
+
+        with self._slots:
+            with self._lock:
+                self.stats["queued"] -= 1
+                self.stats["active"] += 1
+            try:
+                settings = request.settings
+                if self.tool_cache is None and settings.tool_cache:
+                    with self._lock:
+                        if self.tool_cache is None:
+                            self.tool_cache = ToolResultCache(
+                                max_bytes=settings.tool_cache_max_mb * 1024 * 1024, ttl=settings.tool_cache_ttl
+                            )
+                orchestrator = ReviewOrchestrator(
+                    request,
+                    self.client_for(settings.model),
+                    tool_cache=self.tool_cache if settings.tool_cache else None
+                )
+                response = orchestrator.run()
+            except Exception:
+                self._finish("failed")
+                raise
+            self._finish("completed")
+            return response
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "status": "ok",
+                "pid": os.getpid(),
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "workers": self.workers,
+                **self.stats,
+            }
+
+    def close(self) -> None:
+        for client in self._clients.values():
+            client.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+
+    def _finish(self, outcome: str) -> None:
+        with self._lock:
+            self.stats["active"] -= 1
+            self.stats[outcome] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "pr-review-agent"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path == "/health":
+            self._reply(200, self.server.service.health())  # type: ignore[attr-defined]
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/review":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._reply(413, {"error": f"Request larger than {MAX_REQUEST_BYTES} bytes"})
+            return
+        try:
+            request = ReviewRequest.model_validate_json(self.rfile.read(length))
+        except ValidationError as e:
+            self._reply(400, {"error": str(e)})
+            return
+
+        try:
+            response = self.server.service.review(request)  # type: ignore[attr-defined]
+        except ServerBusy as e:
+            self._reply(503, {"error": f"Server busy: {e}"})
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+        else:
+            self._send(200, response.model_dump_json().encode("utf-8"))
+
+    def address_string(self) -> str:
+        # Unix socket peers have no host
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _authorized(self) -> bool:
+        token = getattr(self.server, "token", None)
+        if not token:
+            return True
+        sent = self.headers.get("Authorization", "")
+        if hmac.compare_digest(sent.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+            return True
+        # The body is left unread; don't reuse the connection
+        self.close_connection = True
+        self._reply(401, {"error": "Missing or wrong server token"})
+        return False
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: ReviewService, address: Optional[str] = None, verbose: bool = False, token: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    Bind a threaded HTTP server for `service` on a Unix socket path or `http://host:port`.
+
+    Anyone who can submit a review can run commands in the server's name. The
+    Unix socket is created readable only by its owner. TCP servers without a
+    `token` (default: `PR_AGENT_SERVER_TOKEN`) may only bind to a loopback address.
+    """
+    address = address or default_address()
+    token = token if token is not None else os.getenv(TOKEN_ENV)
+    server: socketserver.BaseServer
+    tcp = _parse_tcp(address)
+    if tcp is not None:
+        if not token and not _is_loopback(tcp[0]):
+            raise ValueError(f"Refusing to listen on {tcp[0]} without a token; set {TOKEN_ENV} or bind to 127.0.0.1")
+        server = ThreadingHTTPServer(tcp, _Handler)
+        server.daemon_threads = True
+    else:
+        if os.path.exists(address):
+            if _ping(address):
+                raise OSError(f"A review server is already listening on {address}")
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(address)
+        os.makedirs(os.path.dirname(os.path.abspath(address)), exist_ok=True)
+        # Only the owner may submit reviews (they can run commands). The socket
+        # is created with these permissions, so there is no window in which
+        # others can connect
+        umask = os.umask(0o177)
+        try:
+            server = _UnixHTTPServer(address, _Handler)
+        finally:
+            os.umask(umask)
+    server.service = service  # type: ignore[attr-defined]
+    server.token = token  # type: ignore[attr-defined]
+    server.verbose = verbose  # type: ignore[attr-defined]
+    return server
+
+
+def serve(service: ReviewService, address: Optional[str] = None, verbose: bool = False, token: Optional[str] = None) -> None:
+    """
+    Serve until interrupted, then release the socket and clients.
+    """
+    address = address or default_address()
+    server = make_server(service, address, verbose, token)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if _parse_tcp(address) is None and os.path.exists(address):
+            os.unlink(address)
+        service.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def server_health(address: Optional[str] = None, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+    """
+    Return the server's health report, or None if no server is running.
+    """
+    try:
+        return _call(address or default_address(), "GET", "/health", None, timeout)
+    except (ServerUnavailable, RuntimeError):
+        return None
+
+
+def forward_review(request: ReviewRequest, address: Optional[str] = None, timeout: float = 900.0) -> ReviewResponse:
+    """
+    Run `request` on a running server.
+
+    Raises `ServerUnavailable` if nothing is listening or the server is too
+    busy (callers fall back to a local review), and `RuntimeError` if the
+    server failed the review.
+    """
+    payload = request.model_copy(update={"repo_root": os.path.abspath(request.repo_root)})
+    body = payload.model_dump_json().encode("utf-8")
+    return ReviewResponse.model_validate(_call(address or default_address(), "POST", "/review", body, timeout))
+
+
+def _call(address: str, method: str, path: str, body: Optional[bytes], timeout: float) -> Dict[str, Any]:
+    tcp = _parse_tcp(address)
+    if tcp is not None:
+        connection: http.client.HTTPConnection = http.client.HTTPConnection(*tcp, timeout=timeout)
+    elif os.path.exists(address):
+        connection = _UnixHTTPConnection(address, timeout)
+    else:
+        raise ServerUnavailable(f"No review server socket at {address}")
+
+    try:
+        try:
+            connection.connect()
+        except OSError as e:
+            raise ServerUnavailable(f"No review server at {address}: {e}") from e
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        token = os.getenv(TOKEN_ENV)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            raw = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            raise ServerUnavailable(f"Review server at {address} dropped the connection: {e}") from e
+    finally:
+        connection.close()
+
+    try:
+        payload = json.loads(raw or b"{}")
+    except ValueError as e:
+        raise RuntimeError(f"Review server returned an invalid body (HTTP {response.status})") from e
+    if not isinstance(payload, dict):
+        raise RuntimeError(f"Review server returned an invalid body (HTTP {response.status})")
+
+    if response.status == 503:
+        raise ServerUnavailable(payload.get("error") or f"Review server at {address} is busy")
+    if response.status != 200:
+        raise RuntimeError(payload.get("error") or f"Server returned HTTP {response.status}")
+    return payload
+
+
+def _ping(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.5)
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _parse_tcp(address: str) -> Optional[Tuple[str, int]]:
+    if not address.startswith("http://"):
+        return None
+    host, _, port = address[len("http://"):].rstrip("/").rpartition(":")
+    return host or "127.0.0.1", int(port)
@@ -0,0 +1,303 @@
+"""Persistent shell sessions that keep cwd and environment between commands."""
+import codecs
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from .process import MAX_OUTPUT_BYTES, READ_CHUNK, CommandResult, OutputCallback, OutputCapture, kill_process_group
+
+# Recycle policy: a session is replaced after this many commands or seconds
+MAX_SESSION_COMMANDS = 100
+MAX_SESSION_AGE = 30 * 60
+
+# Seconds to wait for a session's shell to exit when it is closed
+CLOSE_TIMEOUT = 2.0
+
+
+class ShellSession:
+    """
+    A long-lived shell running one command at a time.
+
+    Commands are `eval`ed by the same shell, so `cd`, `export`, `source .env` or
+    venv activation carry over to the next command. Each command is framed by a
+    per-session sentinel line on stdout and stderr carrying its exit status; its
+    output goes to bounded captures like `run_bounded`. A command that times out
+    takes the whole session down with it (process group kill), since there is
+    no other safe way to stop it.
+    """
+
+    def __init__(self, cwd: str = ".", env: Optional[Dict[str, str]] = None):
+        self.cwd = cwd
+        self.started_at = time.monotonic()
+        self.commands = 0
+        self._nonce = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        shell = shutil.which("bash") or "/bin/sh"
+        args = [shell, "--noprofile", "--norc"] if os.path.basename(shell) == "bash" else [shell]
+        self._proc = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=os.name == "posix",
+        )
+        sentinel = f"\n__pr_agent_{self._nonce}_".encode()
+        self._streams = {
+            "stdout": _FramedStream("stdout", self._proc.stdout, sentinel),
+            "stderr": _FramedStream("stderr", self._proc.stderr, sentinel),
+        }
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def run(
+        self,
+        command: str,
+        timeout: float = 120,
+        max_output_bytes: int = MAX_OUTPUT_BYTES,
+        on_output: Optional[OutputCallback] = None,
+        cwd: Optional[str] = None
+    ) -> CommandResult:
+        """
+        Run `command` in the session and wait for it, up to `timeout` seconds.
+        With `cwd`, the session changes to it first; otherwise the command runs
+        wherever an earlier one left the session.
+        """
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError("Shell session has exited")
+            self.commands += 1
+            captures = {name: OutputCapture(max_output_bytes) for name in self._streams}
+            for name, stream in self._streams.items():
+                stream.begin(captures[name], on_output)
+
+            marker = f"__pr_agent_{self._nonce}_"
+            # stdin is detached so a command can't swallow the next frame; the
+            # leading newline keeps the sentinel on a line of its own
+            cd = f"cd -- {shlex.quote(cwd)} && " if cwd is not None else ""
+            script = (
+                f"{cd}eval {shlex.quote(command)} </dev/null\n"
+                f"__pr_agent_status=$?\n"
+                f"printf '\\n{marker}%d__\\n' \"$__pr_agent_status\"\n"
+                f"printf '\\n{marker}%d__\\n' \"$__pr_agent_status\" >&2\n"
+            )
+            try:
+                assert self._proc.stdin is not None
+                self._proc.stdin.write(script.encode())
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError):
+                pass
+
+            deadline = time.monotonic() + timeout
+            timed_out = not all(
+                stream.done.wait(max(0.0, deadline - time.monotonic())) for stream in self._streams.values()
+            )
+            if timed_out:
+                self._kill()
+                # Let the readers drain the pipes to EOF so held-back output isn't lost
+                for stream in self._streams.values():
+                    stream.done.wait(CLOSE_TIMEOUT)
+            for stream in self._streams.values():
+                stream.end()
+
+            status = self._streams["stdout"].status
+            if timed_out:
+                exit_code = None
+            elif status is not None:
+                exit_code = status
+            else:
+                # The command ended the shell itself (e.g. `exit 3`)
+                exit_code = self._proc.wait()
+            return CommandResult(exit_code, captures["stdout"], captures["stderr"], timed_out)
+
+    def close(self) -> None:
+        """
+        Stop the shell and everything it started.
+        """
+        if self._proc.stdin is not None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+        try:
+            self._proc.wait(timeout=CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            pass
+        self._kill()
+
+    def _kill(self) -> None:
+        kill_process_group(self._proc)
+        self._proc.wait()
+
+
+class ShellPool:
+    """
+    Per-review pool of `ShellSession`s, keyed by working directory.
+
+    Idle sessions are reused most recently used first, so consecutive commands
+    (across ReAct iterations) land in the same shell and see its environment;
+    commands run concurrently get a session each. Sessions that died, timed
+    out or reached the recycle limits are replaced.
+    """
+
+    def __init__(self, max_commands: int = MAX_SESSION_COMMANDS, max_age: float = MAX_SESSION_AGE):
+        self.max_commands = max_commands
+        self.max_age = max_age
+        self._idle: Dict[str, List[ShellSession]] = {}
+        self._busy: List[ShellSession] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"started": 0, "reused": 0, "recycled": 0}
+
+    @contextmanager
+    def session(self, cwd: str = ".") -> Iterator[ShellSession]:
+        key = os.path.realpath(cwd)
+        shell = self._acquire(key)
+        try:
+            yield shell
+        finally:
+            self._release(key, shell)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            sessions = [s for idle in self._idle.values() for s in idle] + self._busy
+            self._idle.clear()
+        for shell in sessions:
+            shell.close()
+
+    def _acquire(self, key: str) -> ShellSession:
+        stale: List[ShellSession] = []
+        shell: Optional[ShellSession] = None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Shell pool is closed")
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if self._usable(candidate):
+                    shell = candidate
+                    self.stats["reused"] += 1
+                    break
+                stale.append(candidate)
+        for old in stale:
+            self._recycle(old)
+        if shell is None:
+            shell = ShellSession(key)
+            with self._lock:
+                self.stats["started"] += 1
+        with self._lock:
+            self._busy.append(shell)
+        return shell
+
+    def _release(self, key: str, shell: ShellSession) -> None:
+        with self._lock:
+            self._busy.remove(shell)
+            keep = not self._closed and self._usable(shell)
+            if keep:
+                self._idle.setdefault(key, []).append(shell)
+        if not keep:
+            self._recycle(shell)
+
+    def _usable(self, shell: ShellSession) -> bool:
+        return (
+            shell.alive
+            and shell.commands < self.max_commands
+            and time.monotonic() - shell.started_at < self.max_age
+        )
+
+    def _recycle(self, shell: ShellSession) -> None:
+        with self._lock:
+            self.stats["recycled"] += 1
+        shell.close()
+
+
+class _FramedStream:
+    """
+    Reads one of a session's output pipes for its whole life, routing output to
+    the current command's capture until that command's sentinel line arrives.
+    """
+
+    def __init__(self, name: str, pipe, sentinel: bytes):
+        self.name = name
+        self.sentinel = sentinel
+        self.done = threading.Event()
+        self.status: Optional[int] = None
+        self._capture: Optional[OutputCapture] = None
+        self._on_output: Optional[OutputCallback] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._pump, args=(pipe,), daemon=True)
+        self._thread.start()
+
+    def begin(self, capture: OutputCapture, on_output: Optional[OutputCallback]) -> None:
+        with self._lock:
+            self._capture = capture
+            self._on_output = on_output
+            self.status = None
+            self.done.clear()
+
+    def end(self) -> None:
+        with self._lock:
+            self._capture = None
+            self._on_output = None
+
+    def _pump(self, pipe) -> None:
+        pending = b""
+        try:
+            for chunk in iter(lambda: pipe.read1(READ_CHUNK), b""):
+                pending += chunk
+                while True:
+                    start = pending.find(self.sentinel)
+                    if start < 0:
+                        break
+                    end = pending.find(b"__\n", start + len(self.sentinel))
+                    if end < 0:
+                        break
+                    self._emit(pending[:start])
+                    status = pending[start + len(self.sentinel):end]
+                    pending = pending[end + 3:]
+                    self._finish(int(status) if status.isdigit() else None)
+                # Hold back anything that could be the start of a sentinel
+                start = pending.find(self.sentinel[:1], max(0, len(pending) - len(self.sentinel) - 8))
+                cut = pending.find(self.sentinel)
+                if cut < 0:
+                    cut = start if start >= 0 else len(pending)
+                self._emit(pending[:cut])
+                pending = pending[cut:]
+        except (OSError, ValueError):
+            pass
+        self._emit(pending)
+        # EOF: the shell is gone, so no sentinel will come
+        self._finish(None)
+
+    def _emit(self, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            capture, on_output = self._capture, self._on_output
+        if capture is None:
+            # Output between commands (e.g. from a background job) belongs to no one
+            return
+        capture.feed(data)
+        if on_output is not None:
+            text = self._decoder.decode(data)
+            try:
+                if text:
+                    on_output(self.name, text)
+            except Exception:
+                with self._lock:
+                    self._on_output = None
+
+    def _finish(self, status: Optional[int]) -> None:
+        with self._lock:
+            self.status = status
+        self.done.set()
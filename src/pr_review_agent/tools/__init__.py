@@ -1,5 +1,6 @@
 from .git import git_diff, get_changed_files
 from .analysis import run_pytest, run_ruff, run_mypy, ripgrep
+from .index import find_symbol, find_references, find_files, find_impacted_tests, read_file_range
 
 __all__ = [
     "git_diff",
@@ -8,4 +9,9 @@ __all__ = [
     "run_ruff",
     "run_mypy",
     "ripgrep",
+    "find_symbol",
+    "find_references",
+    "find_files",
+    "find_impacted_tests",
+    "read_file_range",
 ]
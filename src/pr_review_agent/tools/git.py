@@ -1,6 +1,17 @@
-import subprocess
 from typing import Optional, Annotated
 from langchain_core.tools import tool
+# Re-exported: the diff reader lives outside the tools package so the CLI can
+# use it without importing LangChain
+from ..git import (
+    MAX_DIFF_FILE_BYTES, MAX_DIFF_TOTAL_BYTES, TRUNCATION_MARKER,
+    DiffOutput, FileStat, diff_args, read_diff, tree_fingerprint,
+)
+
+__all__ = [
+    "MAX_DIFF_FILE_BYTES", "MAX_DIFF_TOTAL_BYTES", "TRUNCATION_MARKER",
+    "DiffOutput", "FileStat", "diff_args", "read_diff", "tree_fingerprint",
+    "git_diff", "get_changed_files",
+]
 
 @tool
 def git_diff(
@@ -19,27 +30,7 @@ def git_diff(
     - branch: Changes compared to a branch
     - commit-range: Changes between two commits
     """
-    cmd = ["git", "-C", repo_root, "diff"]
-    
-    if mode == "staged":
-        cmd.append("--cached")
-    elif mode == "unstaged":
-        # Default git diff shows unstaged changes
-        pass
-    elif mode == "working-tree":
-        # Compare working tree to HEAD (all uncommitted changes)
-        cmd.append("HEAD")
-    elif mode == "branch":
-        if not base_ref:
-            base_ref = "main" # default
-        cmd.append(base_ref)
-    elif mode == "commit-range":
-        if not base_ref or not head_ref:
-            raise ValueError("base_ref and head_ref are required for commit-range mode")
-        cmd.append(f"{base_ref}..{head_ref}")
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    return result.stdout
+    return read_diff(repo_root, mode, base_ref, head_ref).text
 
 @tool
 def get_changed_files(
@@ -51,22 +42,4 @@ def get_changed_files(
     """
     Get a list of changed files.
     """
-    cmd = ["git", "-C", repo_root, "diff", "--name-only"]
-    
-    if mode == "staged":
-        cmd.append("--cached")
-    elif mode == "unstaged":
-        # Default git diff shows unstaged changes
-        pass
-    elif mode == "working-tree":
-        # Compare working tree to HEAD (all uncommitted changes)
-        cmd.append("HEAD")
-    elif mode == "branch":
-        if not base_ref:
-            base_ref = "main"
-        cmd.append(base_ref)
-    elif mode == "commit-range":
-        cmd.append(f"{base_ref}..{head_ref}")
-        
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    return [f for f in result.stdout.split("\n") if f.strip()]
+    return [f.path for f in read_diff(repo_root, mode, base_ref, head_ref, patch=False).files]
@@ -0,0 +1,114 @@
+import os
+from typing import Any, Annotated, Dict, List, Optional
+from langchain_core.tools import tool
+from ..index import impacted_tests, repo_index
+from ..project import detect_project
+
+# Most lines `read_file_range` returns in one call
+MAX_RANGE_LINES = 400
+
+
+@tool
+def find_symbol(
+    name: Annotated[str, "Symbol name (function, class, method, type, variable); end with * to match a prefix"],
+    repo_root: Annotated[str, "Root directory of the repository"] = ".",
+    kind: Annotated[Optional[str], "Only this kind: function, method, class, type, variable"] = None
+) -> Dict[str, Any]:
+    """
+    Find where a symbol is defined, from the repository index.
+
+    Returns:
+        Dictionary with the matching definitions (path, line, end_line, kind, enclosing parent, signature).
+    """
+    try:
+        return {"definitions": repo_index(repo_root).find_symbol(name, kind=kind)}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def find_references(
+    name: Annotated[str, "Identifier to look up"],
+    repo_root: Annotated[str, "Root directory of the repository"] = ".",
+    path_prefix: Annotated[Optional[str], "Only files under this path, e.g. 'src/api/'"] = None
+) -> Dict[str, Any]:
+    """
+    Find the files and lines where an identifier is used, from the repository index.
+
+    Returns:
+        Dictionary with up to 50 references (path, line, text), the total count and the number of files.
+    """
+    try:
+        return repo_index(repo_root).find_references(name, path_prefix=path_prefix)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def find_files(
+    pattern: Annotated[str, "Glob such as 'src/*_test.go' or '*.toml', or a substring of the path"],
+    repo_root: Annotated[str, "Root directory of the repository"] = "."
+) -> Dict[str, Any]:
+    """
+    List repository files by glob or path substring, from the repository index.
+
+    Returns:
+        Dictionary with up to 50 matching paths.
+    """
+    try:
+        return repo_index(repo_root).find_files(pattern)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def find_impacted_tests(
+    changed_files: Annotated[List[str], "Changed file paths relative to the repository root"],
+    repo_root: Annotated[str, "Root directory of the repository"] = ".",
+    test_command: Annotated[Optional[str], "Full-suite test command to narrow, e.g. 'uv run pytest -q'; detected if omitted"] = None
+) -> Dict[str, Any]:
+    """
+    Find the tests that import or exercise the changed files, and the test
+    commands narrowed to them.
+
+    Returns:
+        Dictionary with the selected test files, narrowed commands, the total number of
+        tests, changed files no test maps to, and `full_suite` when only a full run is safe.
+    """
+    try:
+        commands = [test_command] if test_command else detect_project(repo_root).get("commands", {}).get("test", [])
+        return impacted_tests(repo_index(repo_root), changed_files, commands)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def read_file_range(
+    path: Annotated[str, "File path relative to the repository root"],
+    start_line: Annotated[int, "First line to read (1-based)"] = 1,
+    end_line: Annotated[Optional[int], "Last line to read (inclusive); at most 400 lines per call"] = None,
+    repo_root: Annotated[str, "Root directory of the repository"] = "."
+) -> Dict[str, Any]:
+    """
+    Read a range of lines from a file in the repository, prefixed with line numbers.
+
+    Returns:
+        Dictionary with the numbered lines and the file's total line count.
+    """
+    try:
+        root = os.path.realpath(repo_root)
+        full_path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full_path]) != root:
+            return {"error": f"Path is outside the repository: {path}"}
+
+        start = max(1, start_line)
+        end = min(end_line if end_line is not None else start + MAX_RANGE_LINES - 1, start + MAX_RANGE_LINES - 1)
+        lines = []
+        total = 0
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            for total, line in enumerate(f, 1):
+                if start <= total <= end:
+                    lines.append(f"{total}: {line.rstrip()}")
+        return {"path": path, "start_line": start, "end_line": min(end, total), "total_lines": total, "content": "\n".join(lines)}
+    except Exception as e:
+        return {"error": str(e)}
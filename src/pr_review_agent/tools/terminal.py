@@ -1,13 +1,20 @@
-import subprocess
-from typing import Dict, Any, Annotated
-from langchain_core.tools import tool
+import os
+import threading
+from typing import Dict, Any, Annotated, Optional
+from langchain_core.tools import InjectedToolArg, tool
+from ..process import MAX_OUTPUT_BYTES, OutputCallback, run_bounded
+from ..shell import ShellSession
 
 @tool
 def run_command(
     command: Annotated[str, "The shell command to execute"], 
     repo_root: Annotated[str, "Root directory of the repository"] = ".",
     timeout: int = 120,
-    unsafe_mode: bool = False
+    unsafe_mode: bool = False,
+    on_output: Annotated[Optional[OutputCallback], InjectedToolArg] = None,
+    shell: Annotated[Optional[ShellSession], InjectedToolArg] = None,
+    niceness: Annotated[int, InjectedToolArg] = 0,
+    cancel: Annotated[Optional[threading.Event], InjectedToolArg] = None
 ) -> Dict[str, Any]:
     """
     Execute a shell command in the repository.
@@ -17,9 +24,15 @@ def run_command(
         repo_root: Path to the repository root directory (default: ".")
         timeout: Maximum execution time in seconds
         unsafe_mode: If True, bypass security checks (default: False)
+        on_output: Called with (stream, text) as output arrives (not set by the model)
+        shell: Persistent session to run in, keeping its environment; the
+            command still runs in `repo_root` (not set by the model)
+        niceness: CPU priority decrease for a command run outside a shell session (not set by the model)
+        cancel: Kills a command run outside a shell session once set (not set by the model)
         
     Returns:
-        Dictionary with exit_code, stdout, and stderr
+        Dictionary with exit_code, stdout, stderr and their line counts. Output
+        beyond the per-stream budget keeps its head and tail around a marker line.
     """
     try:
         # Security Check
@@ -28,21 +41,29 @@ def run_command(
             if not is_valid:
                 return {"error": f"Security Error: {reason}. Use --unsafe to override if you are sure."}
 
-        result = subprocess.run(
-            command, 
-            cwd=repo_root, 
-            shell=True,
-            capture_output=True, 
-            text=True, 
-            timeout=timeout
-        )
-        return {
-            "exit_code": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr
+        if shell is not None:
+            result = shell.run(command, timeout=timeout, max_output_bytes=MAX_OUTPUT_BYTES, on_output=on_output, cwd=os.path.abspath(repo_root))
+        else:
+            result = run_bounded(
+                command, cwd=repo_root, timeout=timeout, max_output_bytes=MAX_OUTPUT_BYTES,
+                on_output=on_output, niceness=niceness, cancel=cancel
+            )
+        output: Dict[str, Any] = {
+            "exit_code": result.exit_code,
+            "stdout": result.stdout.text(),
+            "stderr": result.stderr.text(),
+            "stdout_lines": result.stdout.line_count(),
+            "stderr_lines": result.stderr.line_count(),
         }
-    except subprocess.TimeoutExpired:
-        return {"error": "Command timed out. Hint: Interactive prompt detected? Try adding '--yes' or '-y' to automatically confirm prompts."}
+        truncated = [name for name, capture in (("stdout", result.stdout), ("stderr", result.stderr)) if capture.truncated]
+        if truncated:
+            output["truncated"] = truncated
+        if result.timed_out:
+            # Partial output is kept: it usually shows where the command got stuck
+            output["error"] = "Command timed out. Hint: Interactive prompt detected? Try adding '--yes' or '-y' to automatically confirm prompts."
+        elif result.cancelled:
+            output["error"] = "Command cancelled"
+        return output
     except Exception as e:
         return {"error": str(e)}
 
@@ -1,6 +1,5 @@
 from typing import Annotated
 from langchain_core.tools import tool
-from langchain_community.tools import DuckDuckGoSearchRun
 
 @tool
 def search_web(query: Annotated[str, "The search query to find command usage or error solutions"]) -> str:
@@ -14,6 +13,9 @@ def search_web(query: Annotated[str, "The search query to find command usage or
         Search results summary
     """
     try:
+        # Imported on first search: langchain_community is slow to import
+        from langchain_community.tools import DuckDuckGoSearchRun
+
         search = DuckDuckGoSearchRun()
         return search.invoke(query)
     except Exception as e:
@@ -0,0 +1,225 @@
+"""Lightweight in-process spans for finding latency hotspots without LangSmith."""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Formats `Tracer.export` can write
+PROFILE_FORMATS = ("chrome", "otel")
+
+_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar("pr_agent_tracer", default=None)
+_parent: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("pr_agent_span", default=None)
+
+
+class Span:
+    __slots__ = ("id", "parent_id", "name", "start", "end", "thread_id", "attrs")
+
+    def __init__(self, id: int, parent_id: Optional[int], name: str, start: float, attrs: Dict[str, Any]):
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = start
+        self.thread_id = threading.get_ident()
+        self.attrs = attrs
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """
+    Collects spans for one review. Activate it in a context and every `span()`
+    opened there (and in threads started with `in_context`) is recorded.
+    """
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        # perf_counter for durations, anchored to wall-clock time for exports
+        self._perf0 = time.perf_counter()
+        self._epoch_ns = time.time_ns()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        token = _tracer.set(self)
+        try:
+            yield self
+        finally:
+            _tracer.reset(token)
+
+    def _open(self, name: str, attrs: Dict[str, Any]) -> Span:
+        parent = _parent.get()
+        with self._lock:
+            span = Span(self._next_id, parent.id if parent else None, name, time.perf_counter(), attrs)
+            self._next_id += 1
+        return span
+
+    def _close(self, span: Span) -> None:
+        span.end = time.perf_counter()
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregate spans by name, plus LLM token usage and retries.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            entry = by_name.setdefault(span.name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            entry["count"] += 1
+            entry["total_s"] += span.duration
+            entry["max_s"] = max(entry["max_s"], span.duration)
+        for entry in by_name.values():
+            entry["total_s"] = round(entry["total_s"], 4)
+            entry["max_s"] = round(entry["max_s"], 4)
+
+        llm_spans = [s for s in spans if s.name == "llm"]
+        by_model: Dict[str, Dict[str, Any]] = {}
+        for span in llm_spans:
+            model = by_model.setdefault(str(span.attrs.get("model")), {"calls": 0, "rate_limited": 0, "input_tokens": 0, "output_tokens": 0})
+            model["calls"] += 1
+            model["rate_limited"] += span.attrs.get("status") == "rate_limited"
+            model["input_tokens"] += span.attrs.get("input_tokens") or 0
+            model["output_tokens"] += span.attrs.get("output_tokens") or 0
+
+        return {
+            "wall_s": round(max((s.end for s in spans), default=self._perf0) - min((s.start for s in spans), default=self._perf0), 4),
+            "spans": by_name,
+            "llm": {
+                "calls": len(llm_spans),
+                "retries": sum(m["rate_limited"] for m in by_model.values()),
+                "by_model": by_model,
+            },
+        }
+
+    def export(self, path: str, format: str = "chrome") -> None:
+        """
+        Write the spans as a Chrome trace (chrome://tracing, Perfetto) or as
+        OpenTelemetry OTLP/JSON.
+        """
+        if format == "chrome":
+            payload = self.chrome_trace()
+        elif format == "otel":
+            payload = self.otel_trace()
+        else:
+            raise ValueError(f"Unknown profile format: {format} (expected one of {', '.join(PROFILE_FORMATS)})")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=str)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.name.split(":", 1)[0],
+                    "ph": "X",
+                    "ts": round((span.start - self._perf0) * 1e6, 1),
+                    "dur": round(span.duration * 1e6, 1),
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": span.attrs,
+                }
+                for span in spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def otel_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        trace_id = os.urandom(16).hex()
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otel_attribute("service.name", "pr-review-agent")]},
+                "scopeSpans": [{
+                    "scope": {"name": "pr_review_agent"},
+                    "spans": [
+                        {
+                            "traceId": trace_id,
+                            "spanId": f"{span.id:016x}",
+                            **({"parentSpanId": f"{span.parent_id:016x}"} if span.parent_id else {}),
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(self._unix_ns(span.start)),
+                            "endTimeUnixNano": str(self._unix_ns(span.end)),
+                            "attributes": [_otel_attribute(k, v) for k, v in span.attrs.items()],
+                        }
+                        for span in spans
+                    ],
+                }],
+            }]
+        }
+
+    def _unix_ns(self, perf: float) -> int:
+        return self._epoch_ns + int((perf - self._perf0) * 1e9)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """
+    Time a block as a span of the active tracer. Without one this is a no-op,
+    so instrumented code costs next to nothing outside a traced review.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield _NOOP
+        return
+    current = tracer._open(name, attrs)
+    token = _parent.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _parent.reset(token)
+        tracer._close(current)
+
+
+def in_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Bind `fn` to a copy of the caller's context, so spans opened on a worker
+    thread are recorded under the caller's tracer and parent span.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> T:
+        # A context can't be entered twice at once, so each call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _otel_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
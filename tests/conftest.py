@@ -1,8 +1,15 @@
+import subprocess
 import pytest
 from unittest.mock import MagicMock
 from pr_review_agent.agent.client import GroqClient
 from pr_review_agent.schemas import ReviewRequest, ModelSettings
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    # Keep on-disk caches out of the user's home directory
+    monkeypatch.setenv("PR_AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
 @pytest.fixture
 def mock_groq_client():
     client = MagicMock(spec=GroqClient)
@@ -17,3 +24,17 @@ def basic_review_request():
         diff="diff --git a/file.py b/file.py...",
         settings=ModelSettings(verbose=False)
     )
+
+@pytest.fixture
+def git_repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    def git(*args):
+        subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+    git("init", "-q")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "Test")
+    (repo / "app.py").write_text("print('hello')\n")
+    git("add", "app.py")
+    git("commit", "-q", "-m", "initial")
+    return repo
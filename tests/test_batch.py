@@ -0,0 +1,64 @@
+import io
+import json
+from pr_review_agent.agent.batch import BatchRunner, percentile, read_manifest, summarize
+from pr_review_agent.schemas import BatchItem, ModelSettings
+
+
+class TestManifest:
+    def test_invalid_lines_become_errors(self):
+        stream = io.StringIO(
+            '{"repo_root": "/a", "mode": "branch", "base_ref": "main"}\n'
+            '\n'
+            'not json\n'
+            '{"mode": "branch"}\n'
+        )
+        items = read_manifest(stream)
+
+        assert isinstance(items[0], BatchItem)
+        assert items[1].startswith("manifest line 3")
+        assert items[2].startswith("manifest line 4")
+
+
+class TestSummary:
+    def test_percentile(self):
+        values = [float(v) for v in range(1, 21)]
+        assert percentile(values, 50) == 10.0
+        assert percentile(values, 95) == 19.0
+        assert percentile([], 50) is None
+
+    def test_summarize_counts_statuses(self):
+        results = [
+            {"status": "ok", "latency_s": 2.0},
+            {"status": "no_changes", "latency_s": 0.1},
+            {"status": "error", "error": "manifest line 1: bad"},
+        ]
+        summary = summarize(results, 3.0)
+
+        assert summary["total"] == 3
+        assert (summary["ok"], summary["no_changes"], summary["error"]) == (1, 1, 1)
+        assert summary["throughput_per_min"] == 60.0
+        assert summary["latency_p50_s"] == 0.1
+
+
+class TestBatchRunner:
+    def test_streams_one_result_per_item(self, mock_groq_client, git_repo):
+        (git_repo / "app.py").write_text("print('changed')\n")
+        mock_groq_client.chat_completion.side_effect = [
+            '{"hypotheses": [], "tools": []}',
+            '{"summary": ["ok"], "comments": []}',
+        ]
+        items = [
+            BatchItem(id="dirty", repo_root=str(git_repo), mode="unstaged"),
+            BatchItem(id="clean", repo_root=str(git_repo), mode="staged"),
+            "manifest line 3: bad",
+        ]
+        out = io.StringIO()
+
+        summary = BatchRunner(mock_groq_client, ModelSettings(), concurrency=1).run(items, out)
+        results = {r["index"]: r for r in map(json.loads, out.getvalue().splitlines())}
+
+        assert results[0]["status"] == "ok"
+        assert results[0]["review"]["summary"] == ["ok"]
+        assert results[1]["status"] == "no_changes"
+        assert results[2]["status"] == "error"
+        assert (summary["ok"], summary["no_changes"], summary["error"]) == (1, 1, 1)
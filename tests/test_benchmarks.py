@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+class TestReviewGraphBenchmark:
+    def test_tiny_run_reports_per_node_timings(self, tmp_path):
+        out = tmp_path / "bench.json"
+        subprocess.run(
+            [sys.executable, os.path.join(BENCHMARKS, "review_graph.py"), "--sizes", "tiny", "--latency-ms", "0", "--out", str(out)],
+            check=True, capture_output=True
+        )
+        result = json.loads(out.read_text())["results"][0]
+
+        assert set(result["node_s"]) == {"plan", "execute_tools", "review"}
+        assert result["iterations"] == 2
+        assert result["comments"] == 1
+        assert result["plan_prompt_tokens"]["max"] > 0
+
+    def test_compare_flags_regressions(self, tmp_path):
+        out = tmp_path / "bench.json"
+        script = os.path.join(BENCHMARKS, "review_graph.py")
+        subprocess.run([sys.executable, script, "--sizes", "tiny", "--latency-ms", "0", "--out", str(out)], check=True, capture_output=True)
+        baseline = json.loads(out.read_text())
+        baseline["results"][0]["graph_s"] = 0.0
+        (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+
+        run = subprocess.run(
+            [sys.executable, script, "--sizes", "tiny", "--latency-ms", "50", "--compare", str(tmp_path / "baseline.json"), "--out", str(out)],
+            capture_output=True, text=True
+        )
+
+        assert run.returncode == 1
+        assert "tiny.graph_s" in run.stderr
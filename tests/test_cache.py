@@ -0,0 +1,275 @@
+import json
+import os
+import time
+import pytest
+from unittest.mock import patch
+from pr_review_agent.agent.client import GroqClient
+from pr_review_agent.agent.graph import ReviewGraph
+from pr_review_agent.cache import BlobStore, LLMCacheMiss, LLMResponseCache, ToolResultCache
+from pr_review_agent.schemas import AgentState, ModelSettings, ReviewRequest
+from pr_review_agent.tools.git import tree_fingerprint
+
+
+class TestToolResultCache:
+    def test_hit_and_miss(self, tmp_path):
+        cache = ToolResultCache(str(tmp_path))
+        key = cache.key("run_command", {"command": "pytest"}, str(tmp_path), "tree-1")
+
+        assert cache.get(key) is None
+        cache.put(key, {"exit_code": 0, "stdout": "ok"})
+
+        assert cache.get(key) == {"exit_code": 0, "stdout": "ok"}
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+
+    def test_key_depends_on_tree(self, tmp_path):
+        args = {"command": "pytest"}
+        assert ToolResultCache.key("run_command", args, ".", "a") != ToolResultCache.key("run_command", args, ".", "b")
+
+    def test_expired_entries_miss(self, tmp_path):
+        cache = ToolResultCache(str(tmp_path), ttl=0)
+        cache.put("k", {"exit_code": 0})
+        time.sleep(0.01)
+
+        assert cache.get("k") is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ToolResultCache(str(tmp_path), max_bytes=350)
+        cache.put("old", {"stdout": "x" * 100})
+        cache.put("new", {"stdout": "y" * 100})
+        # Age "new" so it becomes the least recently used entry
+        os.utime(os.path.join(str(tmp_path), "new.json"), (0, 0))
+        cache.put("newest", {"stdout": "z" * 100})
+
+        assert cache.get("new") is None
+        assert cache.get("old") is not None
+        assert cache.stats["evictions"] == 1
+
+
+class TestBlobStore:
+    @pytest.mark.parametrize("backend", ["memory", "file"])
+    def test_content_addressed_round_trip(self, tmp_path, backend):
+        store = BlobStore(str(tmp_path / "blobs") if backend == "file" else None)
+        digest = store.put("x" * 10000)
+
+        assert store.put(b"x" * 10000) == digest and len(store) == 1
+        view = store.get(digest)
+        assert isinstance(view, memoryview) and view.nbytes == 10000
+        assert store.text(digest) == "x" * 10000
+        with pytest.raises(KeyError):
+            store.get("0" * 64)
+        store.close()
+
+    def test_offload_keeps_handles_only(self):
+        store = BlobStore()
+        result = {"exit_code": 1, "stdout": "line\n" * 2000, "stderr": "short"}
+
+        offloaded = store.offload(result, 4096)
+
+        assert offloaded["stdout"] == {"blob": store.put(result["stdout"]), "bytes": 10000}
+        assert offloaded["stderr"] == "short" and offloaded["exit_code"] == 1
+        assert store.resolve(offloaded) == result
+
+        fingerprinted = store.offload(result, 4096, fingerprint=len)
+        assert fingerprinted["stdout"]["fingerprint"] == 10000
+        assert store.resolve(fingerprinted) == result
+
+    def test_temporary_directory_removed_on_close(self):
+        store = BlobStore.temporary()
+        store.put("output")
+        assert os.path.isdir(store.directory)
+
+        store.close()
+
+        assert not os.path.exists(store.directory) and len(store) == 0
+
+
+class TestTreeFingerprint:
+    def test_changes_with_dirty_and_untracked_files(self, git_repo):
+        clean = tree_fingerprint(str(git_repo))
+        (git_repo / "app.py").write_text("print('changed')\n")
+        dirty = tree_fingerprint(str(git_repo))
+        (git_repo / "new.py").write_text("x = 1\n")
+
+        assert clean != dirty != tree_fingerprint(str(git_repo))
+
+    def test_stable_for_unchanged_tree(self, git_repo):
+        assert tree_fingerprint(str(git_repo)) == tree_fingerprint(str(git_repo))
+
+    def test_not_a_repo(self, tmp_path):
+        assert tree_fingerprint(str(tmp_path)) is None
+
+
+class TestGraphToolCache:
+    def test_run_command_replayed_from_cache(self, mock_groq_client, git_repo):
+        request = ReviewRequest(repo_root=str(git_repo), mode="staged", diff="", settings=ModelSettings())
+        call = {"name": "run_command", "args": {"command": "pytest", "repo_root": str(git_repo)}}
+        state = AgentState(diff="", candidates=[call])
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.return_value = {"exit_code": 0, "stdout": "1 passed", "stderr": ""}
+            first = ReviewGraph(request, mock_groq_client)
+            first.execute_tools_step(state)
+            second = ReviewGraph(request, mock_groq_client)
+            observation = second.execute_tools_step(state)["tool_observations"][0]
+
+        assert mock_tool.invoke.call_count == 1
+        assert observation["cached"] is True
+        assert observation["result"]["stdout"] == "1 passed"
+        assert second.tool_cache_stats == {"hits": 1, "misses": 0}
+
+    def test_shell_state_commands_are_not_cached(self, mock_groq_client, git_repo):
+        request = ReviewRequest(repo_root=str(git_repo), mode="staged", diff="", settings=ModelSettings())
+        call = {"name": "run_command", "args": {"command": "source .venv/bin/activate", "repo_root": str(git_repo)}}
+        state = AgentState(diff="", candidates=[call])
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.return_value = {"exit_code": 0, "stdout": "", "stderr": ""}
+            for _ in range(2):
+                graph = ReviewGraph(request, mock_groq_client)
+                graph.execute_tools_step(state)
+                graph.close()
+
+        # Replaying it would leave the new review's shell unactivated
+        assert mock_tool.invoke.call_count == 2
+
+    def test_compound_shell_state_commands_are_not_cached(self, mock_groq_client, git_repo):
+        request = ReviewRequest(repo_root=str(git_repo), mode="staged", diff="", settings=ModelSettings())
+        setup_call = {"name": "run_command", "args": {"command": "export X=1; pytest", "repo_root": str(git_repo)}}
+        pytest_call = {"name": "run_command", "args": {"command": "pytest", "repo_root": str(git_repo)}}
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.return_value = {"exit_code": 0, "stdout": "", "stderr": ""}
+            for _ in range(2):
+                graph = ReviewGraph(request, mock_groq_client)
+                for call in (setup_call, pytest_call):
+                    graph.execute_tools_step(AgentState(diff="", candidates=[call]))
+                graph.close()
+
+        # `pytest` after the export ran in a changed environment, so it is not stored either
+        assert mock_tool.invoke.call_count == 4
+
+    def test_install_bypasses_cache_for_rest_of_review(self, mock_groq_client, git_repo):
+        request = ReviewRequest(repo_root=str(git_repo), mode="staged", diff="", settings=ModelSettings())
+        pytest_call = {"name": "run_command", "args": {"command": "pytest", "repo_root": str(git_repo)}}
+        install_call = {"name": "run_command", "args": {"command": "pip install -e .", "repo_root": str(git_repo)}}
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.return_value = {"exit_code": 0, "stdout": "", "stderr": ""}
+            for _ in range(2):
+                graph = ReviewGraph(request, mock_groq_client)
+                for call in (pytest_call, install_call, pytest_call):
+                    graph.execute_tools_step(AgentState(diff="", candidates=[call]))
+                graph.close()
+
+        ran = [call.args[0]["command"] for call in mock_tool.invoke.call_args_list]
+        # The second review replays only the pytest run from before its install
+        assert ran == ["pytest", "pip install -e .", "pytest", "pip install -e .", "pytest"]
+
+    def test_commands_that_edit_files_refresh_the_key(self, mock_groq_client, git_repo):
+        request = ReviewRequest(repo_root=str(git_repo), mode="staged", diff="", settings=ModelSettings())
+        fix_call = {"name": "run_command", "args": {"command": "ruff check --fix", "repo_root": str(git_repo)}}
+        pytest_call = {"name": "run_command", "args": {"command": "pytest", "repo_root": str(git_repo)}}
+
+        def run(args):
+            if args["command"] == "ruff check --fix":
+                (git_repo / "fixed.py").write_text("x = 1\n")
+            return {"exit_code": 0, "stdout": "", "stderr": ""}
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.side_effect = run
+            for _ in range(2):
+                graph = ReviewGraph(request, mock_groq_client)
+                for call in (fix_call, pytest_call):
+                    graph.execute_tools_step(AgentState(diff="", candidates=[call]))
+                graph.close()
+
+        ran = [call.args[0]["command"] for call in mock_tool.invoke.call_args_list]
+        # The first fix isn't stored, and pytest was keyed on the fixed tree
+        assert ran == ["ruff check --fix", "pytest", "ruff check --fix"]
+
+
+MESSAGES = [{"role": "user", "content": "review this"}]
+
+
+class TestLLMResponseCache:
+    def test_on_mode_round_trip(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+        key = cache.key(["model-a"], 0.1, True, MESSAGES)
+
+        assert cache.lookup(key) is None
+        cache.store(key, "model-a", '{"ok": true}')
+
+        assert cache.lookup(key) == '{"ok": true}'
+        assert cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+    def test_key_covers_request_parameters(self):
+        base = LLMResponseCache.key(["m"], 0.1, True, MESSAGES)
+
+        assert base != LLMResponseCache.key(["m"], 0.2, True, MESSAGES)
+        assert base != LLMResponseCache.key(["m"], 0.1, False, MESSAGES)
+        assert base != LLMResponseCache.key(["other"], 0.1, True, MESSAGES)
+        assert base != LLMResponseCache.key(["m"], 0.1, True, [{"role": "user", "content": "other"}])
+
+    def test_replay_miss_raises(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), mode="replay")
+
+        with pytest.raises(LLMCacheMiss):
+            cache.lookup("missing")
+
+    def test_evicts_least_recently_accessed(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_entries=2)
+        cache.store("a", "m", "1")
+        cache.store("b", "m", "2")
+        cache.store("c", "m", "3")
+
+        assert cache.lookup("a") is None
+        assert cache.lookup("c") == "3"
+        assert cache.stats["evictions"] == 1
+
+    def test_expired_entries_are_called_again(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_age=60)
+        cache.store("a", "m", "1")
+
+        with patch("pr_review_agent.cache.llm.time.time", return_value=time.time() + 61):
+            assert cache.lookup("a") is None
+        assert cache.lookup("a") is None
+
+    def test_client_stores_only_parsed_responses(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+        client = GroqClient(model="model-a", llm_cache=cache)
+        with patch.object(GroqClient, "_get_llm") as get_llm:
+            get_llm.return_value.invoke.return_value.content = '{"summary": ['
+            assert client.chat_completion(MESSAGES, validate=json.loads) == '{"summary": ['
+            get_llm.return_value.invoke.return_value.content = '{"summary": []}'
+            # The truncated response was not kept: the API is called again
+            assert client.chat_completion(MESSAGES, validate=json.loads) == '{"summary": []}'
+            assert client.chat_completion(MESSAGES, validate=json.loads) == '{"summary": []}'
+
+        assert get_llm.return_value.invoke.call_count == 2
+
+    def test_client_drops_cached_responses_that_fail_to_parse(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+        client = GroqClient(model="model-a", llm_cache=cache)
+        cache.store(client._cache_key(MESSAGES, True, 0.1), "model-a", "not json")
+        with patch.object(GroqClient, "_get_llm") as get_llm:
+            get_llm.return_value.invoke.return_value.content = '{"summary": []}'
+            assert client.chat_completion(MESSAGES, validate=json.loads) == '{"summary": []}'
+
+        assert cache.lookup(client._cache_key(MESSAGES, True, 0.1)) == '{"summary": []}'
+
+    def test_client_replays_offline(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "llm.sqlite3")
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        recorder = GroqClient(model="model-a", llm_cache=LLMResponseCache(path, mode="record"))
+        with patch.object(GroqClient, "_get_llm") as get_llm:
+            get_llm.return_value.invoke.return_value.content = '{"summary": []}'
+            assert recorder.chat_completion(MESSAGES) == '{"summary": []}'
+
+        monkeypatch.delenv("GROQ_API_KEY")
+        replayer = GroqClient(model="model-a", llm_cache=LLMResponseCache(path, mode="replay"))
+        with patch.object(GroqClient, "_get_llm") as get_llm:
+            assert replayer.chat_completion(MESSAGES) == '{"summary": []}'
+            get_llm.assert_not_called()
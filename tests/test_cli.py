@@ -0,0 +1,59 @@
+import json
+import subprocess
+from unittest.mock import MagicMock, patch
+from typer.testing import CliRunner
+from pr_review_agent.agent.client import GroqClient
+from pr_review_agent.cli import app
+
+REVIEW = {"summary": ["Adds a greeting"], "comments": [
+    {"file": "app.py", "start_line": 2, "end_line": 2, "severity": "low", "message": "Unused variable"},
+]}
+
+
+class TestJsonlOutput:
+    def test_stdout_carries_only_events(self, git_repo, monkeypatch):
+        (git_repo / "app.py").write_text("print('hello')\nx = 1\n")
+        subprocess.run(["git", "-C", str(git_repo), "add", "app.py"], check=True)
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        llm = MagicMock()
+        llm.invoke.side_effect = [
+            Exception("Error code: 429 - rate_limit_exceeded"),
+            MagicMock(content=json.dumps({"hypotheses": [], "tools": []})),
+            MagicMock(content=json.dumps(REVIEW)),
+        ]
+        llm.stream.return_value = iter([MagicMock(content=json.dumps(REVIEW))])
+
+        with patch.object(GroqClient, "_get_llm", return_value=llm):
+            result = CliRunner().invoke(app, [
+                "review", "--repo-root", str(git_repo), "--format", "jsonl", "--verbose",
+                "--no-server", "--llm-cache", "off", "--model", "model-a,model-b", "--no-detect-project",
+            ])
+
+        assert result.exit_code == 0, result.output
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        assert events[-1]["event"] == "review"
+        assert events[-1]["review"]["comments"][0]["message"] == "Unused variable"
+        assert "Rate limit hit for model-a" in result.stderr
+
+
+class TestServerForwarding:
+    def test_client_only_flags_review_locally(self, git_repo, monkeypatch):
+        (git_repo / "app.py").write_text("print('hello')\nx = 1\n")
+        subprocess.run(["git", "-C", str(git_repo), "add", "app.py"], check=True)
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        llm = MagicMock()
+        llm.invoke.side_effect = [
+            MagicMock(content=json.dumps({"hypotheses": [], "tools": []})),
+            MagicMock(content=json.dumps(REVIEW)),
+        ]
+
+        with patch.object(GroqClient, "_get_llm", return_value=llm), \
+                patch("pr_review_agent.cli.forward_review") as forward:
+            result = CliRunner().invoke(app, [
+                "review", "--repo-root", str(git_repo), "--format", "json",
+                "--llm-cache", "off", "--no-detect-project",
+            ])
+
+        assert result.exit_code == 0, result.output
+        forward.assert_not_called()
+        assert json.loads(result.stdout)["comments"][0]["message"] == "Unused variable"
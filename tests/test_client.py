@@ -0,0 +1,166 @@
+import asyncio
+import json
+import httpx
+import pytest
+from pr_review_agent.agent.client import GroqClient
+from pr_review_agent.agent.router import ModelRouter, parse_duration
+from pr_review_agent.tracing import Tracer
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    return GroqClient(model="model-a, model-b")
+
+
+class TestGroqClient:
+    def test_parses_model_fallback_chain(self, client):
+        assert client.models == ["model-a", "model-b"]
+
+    def test_llms_are_reused_per_key(self, client):
+        llm = client._get_llm("model-a", 0.1, True)
+
+        assert client._get_llm("model-a", 0.1, True) is llm
+        assert client._get_llm("model-a", 0.1, False) is not llm
+        assert client._get_llm("model-b", 0.1, True) is not llm
+
+    def test_llms_share_one_connection_pool(self, client):
+        llm_a = client._get_llm("model-a", 0.1, False)
+        llm_b = client._get_llm("model-b", 0.5, False)
+
+        assert llm_a.http_client is client._http_client
+        assert llm_b.http_client is client._http_client
+
+    def test_async_llms_are_reused_within_a_loop(self, client):
+        async def get_twice():
+            first = client._get_async_llm("model-a", 0.1, False)
+            second = client._get_async_llm("model-a", 0.1, False)
+            await client.aclose()
+            return first, second
+
+        first, second = asyncio.run(get_twice())
+        assert first is second
+
+
+def _completion(model):
+    return {
+        "id": "c1", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": f"from {model}"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+class TestRateLimitRouting:
+    def test_skips_rate_limited_model_after_429(self, client):
+        calls = []
+
+        def handler(request):
+            model = json.loads(request.content)["model"]
+            calls.append(model)
+            if model == "model-a":
+                return httpx.Response(429, headers={"retry-after": "30"}, json={"error": {"message": "rate_limit_exceeded"}})
+            return httpx.Response(200, headers={"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "5000",
+                                                "x-ratelimit-reset-tokens": "10s"}, json=_completion(model))
+
+        client._http_client._transport = httpx.MockTransport(handler)
+
+        assert client.chat_completion([{"role": "user", "content": "hi"}], json_mode=False) == "from model-b"
+        assert client.chat_completion([{"role": "user", "content": "hi again"}], json_mode=False) == "from model-b"
+        # model-a's circuit stays open, so the second call makes no wasted request
+        assert calls == ["model-a", "model-b", "model-b"]
+        assert client.router.snapshot()["model-a"]["open_for_s"] > 25
+
+    def test_records_a_span_per_attempt(self, client):
+        def handler(request):
+            model = json.loads(request.content)["model"]
+            if model == "model-a":
+                return httpx.Response(429, json={"error": {"message": "rate_limit_exceeded"}})
+            return httpx.Response(200, json=_completion(model))
+
+        client._http_client._transport = httpx.MockTransport(handler)
+        tracer = Tracer()
+        with tracer.activate():
+            client.chat_completion([{"role": "user", "content": "hi"}], json_mode=False)
+
+        attempts = [(s.attrs["model"], s.attrs["attempt"], s.attrs["status"]) for s in tracer.spans if s.name == "llm"]
+        assert attempts == [("model-a", 0, "rate_limited"), ("model-b", 1, "ok")]
+        assert tracer.summary()["llm"]["by_model"]["model-b"]["output_tokens"] == 1
+
+    def test_gives_up_after_wait_budget(self, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        client = GroqClient(model="model-a", max_rate_limit_wait=0)
+        client._http_client._transport = httpx.MockTransport(lambda request: httpx.Response(429, json={}))
+
+        with pytest.raises(Exception, match="All models failed due to rate limits"):
+            client.chat_completion([{"role": "user", "content": "hi"}], json_mode=False)
+
+
+class TestModelRouter:
+    def test_token_budget_from_headers(self):
+        now = [0.0]
+        router = ModelRouter(["a", "b"], clock=lambda: now[0])
+        router.observe("a", {"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "100",
+                             "x-ratelimit-reset-tokens": "59s"})
+
+        assert router.candidates(500) == ["b"]
+        now[0] = 59.0
+        assert router.candidates(500) == ["a", "b"]
+
+    def test_full_budget_refills_reservations(self):
+        now = [0.0]
+        router = ModelRouter(["a", "b"], clock=lambda: now[0])
+        router.observe("a", {"x-ratelimit-limit-requests": "2", "x-ratelimit-remaining-requests": "2",
+                             "x-ratelimit-reset-requests": "10s"})
+
+        # Both reservations belong to calls that fail without rate-limit headers
+        assert router.candidates(10)[0] == "a"
+        assert router.candidates(10)[0] == "a"
+        assert router.candidates(10) == ["b"]
+        now[0] = 5.0
+        assert router.candidates(10) == ["a", "b"]
+
+    def test_backoff_waits_for_earliest_model(self):
+        now = [0.0]
+        router = ModelRouter(["a", "b"], clock=lambda: now[0], rng=lambda: 0.0)
+        router.record_rate_limit("a", retry_after=10)
+        router.record_rate_limit("b", retry_after=3)
+
+        assert router.candidates(10) == []
+        assert router.backoff(10, attempt=0) == 3.0
+
+    def test_consecutive_429s_extend_cooldown(self):
+        now = [0.0]
+        router = ModelRouter(["a"], clock=lambda: now[0])
+        router.record_rate_limit("a")
+        now[0] = 2.0
+        router.record_rate_limit("a")
+
+        assert router.snapshot()["a"]["open_for_s"] == 4.0
+
+    def test_parse_duration(self):
+        assert parse_duration("2m59.5s") == 179.5
+        assert parse_duration("120ms") == 0.12
+        assert parse_duration("7") == 7.0
+        assert parse_duration(None) is None
+
+
+class TestStreaming:
+    def test_streams_chunks_and_falls_back_before_first_chunk(self, client):
+        def handler(request):
+            model = json.loads(request.content)["model"]
+            if model == "model-a":
+                return httpx.Response(429, json={"error": {"message": "rate_limit_exceeded"}})
+            events = "".join(
+                "data: " + json.dumps({
+                    "id": "c1", "object": "chat.completion.chunk", "created": 0, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}],
+                }) + "\n\n"
+                for part in ["{\"summary\"", ": []}"]
+            ) + "data: [DONE]\n\n"
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events.encode())
+
+        client._http_client._transport = httpx.MockTransport(handler)
+
+        chunks = list(client.stream_chat_completion([{"role": "user", "content": "hi"}]))
+        assert "".join(chunks) == '{"summary": []}'
+        assert len(chunks) == 2
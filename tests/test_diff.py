@@ -0,0 +1,99 @@
+from unittest.mock import patch
+from pr_review_agent.agent.orchestrator import ReviewOrchestrator
+from pr_review_agent.diff import parse_diff
+from pr_review_agent.schemas import ReviewRequest
+
+DIFF = """diff --git a/app.py b/app.py
+index 1111111..2222222 100644
+--- a/app.py
++++ b/app.py
+@@ -1,4 +1,5 @@
+ import os
+-x = 1
++x = 2
++y = 3
+ 
+ def main():
+@@ -20,3 +21,2 @@ def main():
+ a = 1
+--- not a header
+ b = 2
+diff --git a/old name.py b/new name.py
+similarity index 90%
+rename from old name.py
+rename to new name.py
+--- a/old name.py
++++ b/new name.py
+@@ -1 +1 @@
+-print('a')
++print('b')
+diff --git a/gone.txt b/gone.txt
+deleted file mode 100644
+index 3333333..0000000
+--- a/gone.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-bye
+diff --git a/logo.png b/logo.png
+new file mode 100644
+index 0000000..4444444
+Binary files /dev/null and b/logo.png differ
+"""
+
+
+class TestParseDiff:
+    def test_files_and_statuses(self):
+        index = parse_diff(DIFF)
+
+        assert index.changed_files == ["app.py", "new name.py", "gone.txt", "logo.png"]
+        assert [f.status for f in index] == ["modified", "renamed", "deleted", "added"]
+        assert index.file("old name.py") is index.file("new name.py")
+        assert index.file("logo.png").binary
+
+    def test_hunks_and_line_ranges(self):
+        app = parse_diff(DIFF).file("app.py")
+
+        assert len(app.hunks) == 2
+        assert app.hunks[0].added == [(2, 3)]
+        assert app.hunks[0].removed == [(2, 2)]
+        # A removed line that looks like a file header stays inside the hunk
+        assert app.hunks[1].removed == [(21, 21)]
+        assert app.added_lines == 2
+        assert app.removed_lines == 2
+
+    def test_line_lookups(self):
+        index = parse_diff(DIFF)
+        app = index.file("app.py")
+
+        assert app.is_added(3) and not app.is_added(1)
+        assert index.contains_line("app.py", 22)
+        assert not index.contains_line("app.py", 10)
+        assert not index.contains_line("missing.py", 1)
+
+    def test_old_to_new_mapping(self):
+        app = parse_diff(DIFF).file("app.py")
+
+        assert app.old_to_new(1) == 1
+        assert app.old_to_new(2) is None
+        assert app.old_to_new(3) == 4
+        # Between hunks: shifted by the first hunk's net +1
+        assert app.old_to_new(10) == 11
+        assert app.old_to_new(22) == 22
+
+    def test_sections_slice_original_text(self):
+        index = parse_diff(DIFF)
+
+        assert "".join(index.section(f) for f in index) == DIFF
+        assert index.hunk_text(index.file("gone.txt").hunks[0]) == "@@ -1 +0,0 @@\n-bye\n"
+
+
+class TestOrchestratorDiffIndex:
+    @patch("subprocess.run")
+    def test_changed_files_come_from_the_index(self, mock_run, mock_groq_client):
+        request = ReviewRequest(repo_root="/tmp/fake-repo", mode="staged", diff=DIFF)
+
+        orchestrator = ReviewOrchestrator(request, mock_groq_client)
+
+        assert orchestrator.initial_state.changed_files == ["app.py", "new name.py", "gone.txt", "logo.png"]
+        assert orchestrator.initial_state.diff_index.text is DIFF
+        mock_run.assert_not_called()
@@ -1,8 +1,10 @@
+import asyncio
 import pytest
 import json
-from unittest.mock import MagicMock
+import time
+from unittest.mock import MagicMock, patch
 from pr_review_agent.agent.graph import ReviewGraph
-from pr_review_agent.schemas import AgentState
+from pr_review_agent.schemas import AgentState, ModelSettings, ReviewRequest
 
 class TestReviewGraph:
     def test_plan_step(self, mock_groq_client, basic_review_request):
@@ -50,3 +52,257 @@ class TestReviewGraph:
         # Case 2: No candidates -> review
         state_review = AgentState(diff="", candidates=[])
         assert graph.should_continue(state_review) == "review"
+
+    def test_execute_tools_step_keeps_plan_order(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        state = AgentState(
+            diff="foo",
+            candidates=[
+                {"name": "run_command", "args": {"command": "slow"}},
+                {"name": "run_command", "args": {"command": "fast"}},
+            ],
+        )
+
+        def fake_invoke(args):
+            if args["command"] == "slow":
+                time.sleep(0.2)
+            return {"exit_code": 0, "stdout": args["command"], "stderr": ""}
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.side_effect = fake_invoke
+            start = time.monotonic()
+            results = graph.execute_tools_step(state)
+            elapsed = time.monotonic() - start
+
+        stdouts = [obs["result"]["stdout"] for obs in results["tool_observations"]]
+        assert stdouts == ["slow", "fast"]
+        # Both tools ran in parallel, so the iteration costs ~the slowest one
+        assert elapsed < 0.35
+
+    def test_execute_tools_step_isolates_failures(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        state = AgentState(
+            diff="foo",
+            candidates=[
+                {"name": "explore_workspace", "args": {}},
+                {"name": "run_command", "args": {"command": "echo ok"}},
+            ],
+        )
+
+        with patch("pr_review_agent.agent.graph.explore_workspace") as mock_explore, \
+             patch("pr_review_agent.agent.graph.run_command") as mock_run:
+            mock_explore.invoke.side_effect = RuntimeError("boom")
+            mock_run.invoke.return_value = {"exit_code": 0, "stdout": "ok", "stderr": ""}
+            results = graph.execute_tools_step(state)
+
+        observations = results["tool_observations"]
+        assert observations[0]["result"] == {"error": "boom"}
+        assert observations[1]["result"]["stdout"] == "ok"
+        # Injected settings must not mutate the planner's candidates
+        assert "unsafe_mode" not in state.candidates[1]["args"]
+
+    def test_workflow_runs_async(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        mock_groq_client.achat_completion.side_effect = [
+            json.dumps({"hypotheses": [], "tools": []}),
+            json.dumps({"summary": ["LGTM"], "comments": []}),
+        ]
+
+        final_state = asyncio.run(graph.workflow.ainvoke(AgentState(diff="foo")))
+
+        assert final_state["review_draft"].summary == ["LGTM"]
+        assert mock_groq_client.achat_completion.await_count == 2
+        mock_groq_client.chat_completion.assert_not_called()
+
+    def test_review_step_map_reduces_large_diffs(self, mock_groq_client, basic_review_request):
+        basic_review_request.settings.review_shard_max_lines = 4
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        diff = "".join(
+            f"diff --git a/{n} b/{n}\n--- a/{n}\n+++ b/{n}\n@@ -1 +1 @@\n+x\n" for n in ("a.py", "b.py")
+        )
+        mock_groq_client.chat_completion.side_effect = [
+            json.dumps({"summary": ["s"], "comments": [{"file": "a.py", "severity": "low", "message": "m"}]}),
+            RuntimeError("context length exceeded"),
+        ]
+
+        review = graph.review_step(AgentState(diff=diff))["review_draft"]
+
+        assert mock_groq_client.chat_completion.call_count == 2
+        assert [c.file for c in review.comments] == ["a.py"]
+        assert review.metadata["review_shards"] == 2
+        assert len(review.metadata["failed_shards"]) == 1
+
+
+class TestConvergence:
+    def _run_rounds(self, graph, rounds, outputs=None):
+        """Run each list of commands as one tool round, threading state between them."""
+        state = AgentState(diff="foo")
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.side_effect = lambda args: {"exit_code": 0, "stdout": (outputs or {}).get(args["command"], args["command"]), "stderr": ""}
+            for commands in rounds:
+                state = state.model_copy(update={"candidates": [{"name": "run_command", "args": {"command": c}} for c in commands]})
+                update = graph.execute_tools_step(state)
+                # As the state's reducer does: the step returns only the new observations
+                update["tool_observations"] = state.tool_observations + update["tool_observations"]
+                state = state.model_copy(update=update)
+            return state, [call.args[0]["command"] for call in mock_tool.invoke.call_args_list]
+
+    def test_repeated_calls_are_memoized(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+
+        state, ran = self._run_rounds(graph, [["pytest", "pytest"], ["python -m pytest -q", "ruff check ."]])
+
+        assert sorted(ran) == ["pytest", "ruff check ."]
+        last_round = [o for o in state.tool_observations if o["iteration"] == 1]
+        assert last_round[0]["memoized_from"] == 0 and last_round[0]["result"]["stdout"] == "pytest"
+        assert state.tool_observations[1]["memoized_from"] == 0
+        assert state.metadata["memoized_tool_calls"] == 2
+        assert "stop_reason" not in state.metadata
+        assert graph.check_iteration(state) == "continue"
+
+    def test_new_call_with_known_output_does_not_converge(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        outputs = {"ruff check .": "All checks passed in 0.12s", "ruff check src": "All checks passed in 0.09s"}
+
+        state, _ = self._run_rounds(graph, [["ruff check ."], ["ruff check src"]], outputs)
+
+        # Same output, but the planner asked something new
+        assert "stop_reason" not in state.metadata
+        assert graph.check_iteration(state) == "continue"
+
+    def test_round_of_repeats_converges(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+
+        state, ran = self._run_rounds(graph, [["ruff check .", "pytest"], ["pytest -q", "ruff check ."]])
+
+        assert sorted(ran) == ["pytest", "ruff check ."]
+        assert state.metadata["stop_reason"] == "converged"
+        assert graph.check_iteration(state) == "end"
+
+    def test_install_invalidates_earlier_results(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+
+        _, ran = self._run_rounds(graph, [["pytest"], ["pip install -e ."], ["pytest"]])
+
+        assert ran == ["pytest", "pip install -e .", "pytest"]
+
+    def test_workflow_stops_when_plan_repeats(self, mock_groq_client, basic_review_request):
+        plan = json.dumps({"hypotheses": [], "tools": [{"name": "run_command", "args": {"command": "pytest"}}]})
+        mock_groq_client.chat_completion.side_effect = [plan, plan, json.dumps({"summary": ["LGTM"], "comments": []})]
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.return_value = {"exit_code": 0, "stdout": "1 passed", "stderr": ""}
+            final_state = graph.workflow.invoke(AgentState(diff="foo"))
+
+        review = final_state["review_draft"]
+        assert mock_tool.invoke.call_count == 1
+        assert mock_groq_client.chat_completion.call_count == 3
+        assert review.metadata["stop_reason"] == "converged"
+        assert review.metadata["memoized_tool_calls"] == 1
+
+
+class TestSpeculativeChecks:
+    def test_planned_check_uses_speculative_run(self, mock_groq_client, tmp_path):
+        request = ReviewRequest(repo_root=str(tmp_path), mode="staged", diff="", settings=ModelSettings())
+        plan = {"hypotheses": [], "tools": [{"name": "run_command", "args": {"command": "echo checked", "repo_root": str(tmp_path)}}]}
+        mock_groq_client.chat_completion.side_effect = [
+            json.dumps(plan),
+            json.dumps({"hypotheses": [], "tools": []}),
+            json.dumps({"summary": ["LGTM"], "comments": []}),
+        ]
+        graph = ReviewGraph(request, mock_groq_client)
+        state = AgentState(diff="foo", repo_facts={"speculative_checks": ["echo checked", "sleep 30"]})
+
+        start = time.monotonic()
+        try:
+            final_state = graph.workflow.invoke(state)
+        finally:
+            graph.close()
+
+        observation = final_state["tool_observations"][0]
+        assert observation["speculative"] and observation["result"]["stdout"] == "checked\n"
+        assert final_state["review_draft"].metadata["speculative_checks"] == {"started": 2, "used": 1}
+        # The check nobody asked for was killed before the review
+        assert time.monotonic() - start < 10
+
+
+class TestDiffScopedLint:
+    DIFF = "diff --git a/app.py b/app.py\n--- a/app.py\n+++ b/app.py\n@@ -1,1 +1,2 @@\n x = 1\n+import os\n"
+
+    def test_linter_runs_on_changed_files_and_reports_hunk_findings(self, mock_groq_client, tmp_path):
+        (tmp_path / "app.py").write_text("x = 1\nimport os\n")
+        (tmp_path / "legacy.py").write_text("")
+        request = ReviewRequest(repo_root=str(tmp_path), mode="staged", diff=self.DIFF, settings=ModelSettings())
+        graph = ReviewGraph(request, mock_groq_client)
+        output = "app.py:2:8: F401 [*] `os` imported but unused\nlegacy.py:1:1: D100 Missing docstring in public module\n"
+        state = AgentState(diff=self.DIFF, candidates=[{"name": "run_command", "args": {"command": "ruff check .", "repo_root": str(tmp_path)}}])
+
+        with patch.object(graph, "_invoke_tool", return_value={"exit_code": 1, "stdout": output, "stderr": ""}) as invoke:
+            observation = graph.execute_tools_step(state)["tool_observations"][0]
+
+        assert invoke.call_args.args[1]["command"] == "ruff check --force-exclude app.py"
+        assert observation["args"]["command"] == "ruff check ."
+        assert observation["result"]["findings"] == {"app.py": [{"line": 2, "column": 8, "code": "F401", "severity": "warning", "message": "`os` imported but unused"}]}
+        assert observation["result"]["findings_outside_diff"] == 1
+
+    def test_disabled(self, mock_groq_client, tmp_path):
+        (tmp_path / "app.py").write_text("")
+        request = ReviewRequest(repo_root=str(tmp_path), mode="staged", diff=self.DIFF, settings=ModelSettings(diff_scoped_lint=False))
+        graph = ReviewGraph(request, mock_groq_client)
+        raw = {"exit_code": 1, "stdout": "legacy.py:1:1: D100 Missing docstring in public module\n", "stderr": ""}
+        state = AgentState(diff=self.DIFF, candidates=[{"name": "run_command", "args": {"command": "ruff check .", "repo_root": str(tmp_path)}}])
+
+        with patch.object(graph, "_invoke_tool", return_value=raw) as invoke:
+            observation = graph.execute_tools_step(state)["tool_observations"][0]
+
+        assert invoke.call_args.args[1]["command"] == "ruff check ."
+        assert observation["result"] == raw
+
+
+class TestStateReducers:
+    def test_observations_appended_and_output_offloaded(self, mock_groq_client, basic_review_request):
+        plans = [{"hypotheses": [], "tools": [{"name": "run_command", "args": {"command": f"check {i}"}}]} for i in range(2)]
+        mock_groq_client.chat_completion.side_effect = [json.dumps(p) for p in plans] + [
+            json.dumps({"hypotheses": [], "tools": []}),
+            json.dumps({"summary": ["LGTM"], "comments": []}),
+        ]
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        big = "FAILED test_app.py::test_main\n" + "." * 50000
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            mock_tool.invoke.side_effect = lambda args: {"exit_code": 1, "stdout": f"{args['command']}\n{big}", "stderr": ""}
+            fresh = ReviewGraph(basic_review_request, mock_groq_client)
+            step = fresh.execute_tools_step(AgentState(diff="foo", candidates=plans[0]["tools"], tool_observations=[{"tool": "earlier"}]))
+            fresh.close()
+            final_state = graph.workflow.invoke(AgentState(diff="foo"))
+            review_prompt = mock_groq_client.chat_completion.call_args.args[0][0]["content"]
+
+        # A step returns only its own observations; the reducer appends them
+        assert len(step["tool_observations"]) == 1
+        observations = final_state["tool_observations"]
+        assert [o["args"]["command"] for o in observations] == ["check 0", "check 1"]
+        # The state holds a handle, the prompt the text read back from the store
+        handle = observations[1]["result"]["stdout"]
+        assert set(handle) == {"blob", "bytes", "fingerprint"} and handle["bytes"] > 50000
+        assert "FAILED test_app.py::test_main" in review_prompt
+        graph.close()
+        assert len(graph.blobs) == 0
+
+    def test_offloaded_reruns_differing_in_durations_converge(self, mock_groq_client, basic_review_request):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        log = "collected 900 items\n" + "." * 8000
+        timings = iter(["12.31s", "12.87s"])
+        state = AgentState(diff="foo", candidates=[{"name": "run_command", "args": {"command": "pytest"}}])
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_tool:
+            # Timed out, so not memoized: the planner retries it
+            mock_tool.invoke.side_effect = lambda args: {"exit_code": None, "stdout": f"{log}\nslowest test: {next(timings)}", "stderr": "", "error": "Command timed out"}
+            first = graph.execute_tools_step(state)
+            second = graph.execute_tools_step(state.model_copy(update={"iteration": 1}))
+        graph.close()
+
+        handles = [step["tool_observations"][0]["result"]["stdout"] for step in (first, second)]
+        assert handles[0]["blob"] != handles[1]["blob"]
+        assert "stop_reason" not in first["metadata"]
+        assert second["metadata"]["stop_reason"] == "converged"
@@ -0,0 +1,195 @@
+import subprocess
+from unittest.mock import patch
+from pr_review_agent.index import RepoIndex, impacted_tests
+from pr_review_agent.index.extract import extract
+from pr_review_agent.tools.index import find_impacted_tests, read_file_range
+
+SOURCE = '''import os
+
+
+class Greeter:
+    def greet(self, name):
+        return format_name(name)
+
+
+def format_name(name):
+    return os.path.basename(name).title()
+
+
+DEFAULT = Greeter()
+'''
+
+
+def _commit(repo, message="change"):
+    subprocess.run(["git", "-C", str(repo), "add", "-A"], check=True)
+    subprocess.run(["git", "-C", str(repo), "commit", "-q", "-m", message], check=True)
+
+
+class TestExtract:
+    def test_python_symbols_and_references(self):
+        symbols, references, imports = extract(SOURCE, "python")
+
+        assert [(s.name, s.kind, s.line, s.parent) for s in symbols] == [
+            ("Greeter", "class", 4, None),
+            ("greet", "method", 5, "Greeter"),
+            ("format_name", "function", 9, None),
+            ("DEFAULT", "variable", 13, None),
+        ]
+        assert references["format_name"] == [6]
+        assert references["os"] == [1, 10]
+        assert references["basename"] == [10]
+        assert imports == ["os"]
+
+    def test_tokenizer_definitions(self):
+        source = "export function render(props) {\n  return helper(props);\n}\nclass Widget extends Base {}\n"
+        symbols, references, imports = extract(source, "typescript")
+
+        assert [(s.name, s.kind, s.line) for s in symbols] == [("render", "function", 1), ("Widget", "class", 4)]
+        assert references["helper"] == [2]
+        assert imports == []
+
+
+class TestRepoIndex:
+    def test_lookups(self, git_repo):
+        (git_repo / "greet.py").write_text(SOURCE)
+        (git_repo / "main.py").write_text("from greet import format_name\n\nprint(format_name('x'))\n")
+        _commit(git_repo)
+        index = RepoIndex(str(git_repo))
+
+        assert index.find_symbol("format_name")[0]["path"] == "greet.py"
+        assert [d["name"] for d in index.find_symbol("Gree*")] == ["Greeter"]
+        references = index.find_references("format_name")
+        assert [(r["path"], r["line"]) for r in references["references"]] == [("greet.py", 6), ("main.py", 1), ("main.py", 3)]
+        assert references["references"][2]["text"] == "print(format_name('x'))"
+        assert index.find_files("*.py")["files"] == ["app.py", "greet.py", "main.py"]
+
+    def test_refresh_only_parses_changed_files(self, git_repo):
+        (git_repo / "greet.py").write_text(SOURCE)
+        _commit(git_repo)
+        index = RepoIndex(str(git_repo))
+        assert index.refresh(force=True)["parsed"] == 2
+        assert index.refresh(force=True)["parsed"] == 0
+
+        # Uncommitted edit, new untracked file, deleted file
+        (git_repo / "greet.py").write_text(SOURCE.replace("format_name", "render_name"))
+        (git_repo / "extra.py").write_text("def extra():\n    pass\n")
+        (git_repo / "app.py").unlink()
+
+        assert index.refresh(force=True) == {"parsed": 2, "removed": 1, "files": 2}
+        assert index.find_symbol("format_name") == []
+        assert index.find_symbol("render_name")[0]["line"] == 9
+        assert index.find_symbol("extra")[0]["path"] == "extra.py"
+
+        # Committing the same content swaps the stat key for the blob hash
+        _commit(git_repo)
+        assert index.refresh(force=True)["parsed"] == 2
+
+    def test_working_tree_changes_refresh_only_dirty_files(self, git_repo):
+        (git_repo / "greet.py").write_text(SOURCE)
+        _commit(git_repo)
+        index = RepoIndex(str(git_repo))
+        index.refresh(force=True)
+
+        with patch.object(RepoIndex, "_full_delta", side_effect=AssertionError("full scan")):
+            (git_repo / "greet.py").write_text(SOURCE.replace("format_name", "render_name"))
+            (git_repo / "extra.py").write_text("def extra():\n    pass\n")
+            assert index.refresh(force=True) == {"parsed": 2, "removed": 0, "files": 3}
+
+            # Reverted and removed: back to the committed blob, untracked file dropped
+            (git_repo / "greet.py").write_text(SOURCE)
+            (git_repo / "extra.py").unlink()
+            assert index.refresh(force=True) == {"parsed": 1, "removed": 1, "files": 2}
+        assert index.find_symbol("format_name")[0]["path"] == "greet.py"
+        assert index.find_symbol("extra") == []
+
+    def test_parallel_parse(self, git_repo):
+        for i in range(4):
+            (git_repo / f"mod{i}.py").write_text(f"def func{i}():\n    pass\n")
+        _commit(git_repo)
+
+        with patch("pr_review_agent.index.store.PARALLEL_THRESHOLD", 2):
+            assert RepoIndex(str(git_repo)).refresh(force=True)["parsed"] == 5
+
+        assert RepoIndex(str(git_repo)).find_symbol("func3")[0]["path"] == "mod3.py"
+
+    def test_index_persists_across_instances(self, git_repo):
+        RepoIndex(str(git_repo)).refresh()
+
+        assert RepoIndex(str(git_repo)).refresh()["parsed"] == 0
+
+
+class TestReadFileRange:
+    def test_numbered_lines(self, git_repo):
+        (git_repo / "greet.py").write_text(SOURCE)
+
+        result = read_file_range.invoke({"path": "greet.py", "start_line": 9, "end_line": 10, "repo_root": str(git_repo)})
+
+        assert result["content"] == "9: def format_name(name):\n10:     return os.path.basename(name).title()"
+        assert result["total_lines"] == 13
+
+    def test_rejects_paths_outside_repo(self, git_repo):
+        result = read_file_range.invoke({"path": "../secret.txt", "repo_root": str(git_repo)})
+
+        assert "outside the repository" in result["error"]
+
+
+def _write(repo, files):
+    for path, text in files.items():
+        (repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / path).write_text(text)
+
+
+class TestImpactedTests:
+    PYTHON = {
+        "pkg/__init__.py": "",
+        "pkg/core.py": "def base():\n    return 1\n",
+        "pkg/util.py": "from .core import base\n",
+        "pkg/json.py": "",
+        "tests/conftest.py": "",
+        "tests/test_util.py": "from pkg.util import base\n",
+        "tests/test_other.py": "import json\n",
+        "lib/orphan.py": "",
+    }
+
+    def test_python_transitive_imports(self, git_repo):
+        _write(git_repo, self.PYTHON)
+        index = RepoIndex(str(git_repo))
+
+        impact = impacted_tests(index, ["pkg/core.py", "lib/orphan.py", "README.md"], ["uv run pytest -q"])
+
+        assert impact == {
+            "tests": ["tests/test_util.py"],
+            "selected": 1,
+            "total_tests": 2,
+            "commands": ["uv run pytest -q tests/test_util.py"],
+            "unmapped": ["lib/orphan.py"],
+        }
+
+    def test_conftest_and_config_changes(self, git_repo):
+        _write(git_repo, self.PYTHON)
+        index = RepoIndex(str(git_repo))
+
+        assert impacted_tests(index, ["tests/conftest.py"])["commands"] == ["python -m pytest -q tests/test_other.py tests/test_util.py"]
+        assert impacted_tests(index, ["pyproject.toml", "pkg/core.py"])["full_suite"] == "test configuration changed: pyproject.toml"
+
+    def test_javascript_imports_and_go_packages(self, git_repo):
+        _write(git_repo, {
+            "src/math.ts": "export const add = (a, b) => a + b;\n",
+            "src/calc.ts": "import { add } from './math';\nexport const sum = add;\n",
+            "src/calc.test.ts": "import { sum } from './calc.js';\n",
+            "svc/handler.go": "package svc\n",
+            "svc/handler_test.go": "package svc\n",
+        })
+        index = RepoIndex(str(git_repo))
+
+        impact = impacted_tests(index, ["src/math.ts", "svc/handler.go"], ["npm test"])
+
+        assert impact["tests"] == ["src/calc.test.ts", "svc/handler_test.go"]
+        assert impact["commands"] == ["npm test -- src/calc.test.ts", "go test ./svc"]
+
+    def test_tool(self, git_repo):
+        _write(git_repo, self.PYTHON)
+
+        result = find_impacted_tests.invoke({"changed_files": ["pkg/util.py"], "repo_root": str(git_repo), "test_command": "pytest"})
+
+        assert result["commands"] == ["pytest tests/test_util.py"]
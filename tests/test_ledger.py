@@ -0,0 +1,60 @@
+from pr_review_agent.agent.ledger import IncrementalReview, ReviewLedger, hunk_fingerprints
+from pr_review_agent.diff import parse_diff
+from pr_review_agent.schemas import ReviewComment, ReviewRequest, ReviewResponse
+
+HEADER = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n"
+X_HUNK = "@@ -9,2 +{start},3 @@\n ctx\n+x = 1\n ctx\n"
+Y_HUNK = "@@ -49,2 +{start},3 @@\n ctx\n+{line}\n ctx\n"
+TOP_HUNK = "@@ -1,1 +1,3 @@\n ctx\n+import os\n+import sys\n"
+
+
+def _request(tmp_path, diff):
+    return ReviewRequest(repo_root=str(tmp_path), mode="branch", base_ref="main", head_ref="feature", diff=diff)
+
+
+class FakeReviewer:
+    def __init__(self, comments):
+        self.comments = comments
+        self.diffs = []
+
+    def __call__(self, request):
+        self.diffs.append(request.diff)
+        return ReviewResponse(summary=["reviewed"], comments=self.comments)
+
+
+class TestIncrementalReview:
+    def test_reviews_only_new_hunks_and_reanchors_old_comments(self, tmp_path):
+        incremental = IncrementalReview(ReviewLedger(str(tmp_path / "ledger")))
+        first = HEADER + X_HUNK.format(start=9) + Y_HUNK.format(start=50, line="y = 2")
+        comment = ReviewComment(file="a.py", start_line=10, end_line=10, severity="medium", message="x is unused")
+        incremental.run(_request(tmp_path, first), FakeReviewer([comment]))
+
+        # A fixup adds two lines at the top (moving the x hunk) and edits the y hunk
+        second = HEADER + TOP_HUNK + X_HUNK.format(start=11) + Y_HUNK.format(start=52, line="y = 3")
+        reviewer = FakeReviewer([])
+        result = incremental.run(_request(tmp_path, second), reviewer)
+
+        assert "x = 1" not in reviewer.diffs[0]
+        assert "import os" in reviewer.diffs[0] and "y = 3" in reviewer.diffs[0]
+        assert [(c.message, c.start_line) for c in result.comments] == [("x is unused", 12)]
+        assert result.metadata["incremental"]["reviewed_hunks"] == 2
+        assert result.metadata["incremental"]["carried_hunks"] == 1
+
+    def test_unchanged_diff_needs_no_review(self, tmp_path):
+        incremental = IncrementalReview(ReviewLedger(str(tmp_path / "ledger")))
+        diff = HEADER + X_HUNK.format(start=9)
+        comment = ReviewComment(file="a.py", start_line=10, severity="low", message="nit")
+        incremental.run(_request(tmp_path, diff), FakeReviewer([comment]))
+
+        reviewer = FakeReviewer([])
+        result = incremental.run(_request(tmp_path, diff), reviewer)
+
+        assert reviewer.diffs == []
+        assert result.summary == ["reviewed"]
+        assert [c.message for c in result.comments] == ["nit"]
+
+    def test_fingerprints_ignore_hunk_position(self):
+        moved = hunk_fingerprints(parse_diff(HEADER + X_HUNK.format(start=30)))
+        original = hunk_fingerprints(parse_diff(HEADER + X_HUNK.format(start=9)))
+
+        assert moved == original
@@ -0,0 +1,122 @@
+from pr_review_agent.diff import parse_diff
+from pr_review_agent.lint import Finding, lint_tool, parse_findings, scope_command, scope_result
+
+DIFF = """diff --git a/src/app.py b/src/app.py
+--- a/src/app.py
++++ b/src/app.py
+@@ -10,2 +10,3 @@ def main():
+     run()
++    import os
+     return 0
+"""
+
+RUFF = """src/app.py:1:1: D100 Missing docstring in public module
+src/app.py:11:12: F401 [*] `os` imported but unused
+src/other.py:3:5: E501 Line too long (120 > 100)
+Found 3 errors.
+"""
+
+
+class TestParseFindings:
+    def test_python_tools(self):
+        assert parse_findings("ruff", RUFF)[1] == Finding("ruff", "src/app.py", 11, 12, "F401", "warning", "`os` imported but unused")
+        mypy = 'src/app.py:3: error: Incompatible return value type (got "str", expected "int")  [return-value]\n'
+        assert parse_findings("mypy", mypy) == [
+            Finding("mypy", "src/app.py", 3, None, "return-value", "error", 'Incompatible return value type (got "str", expected "int")'),
+        ]
+
+    def test_ruff_full_format(self):
+        output = "F401 [*] `os` imported but unused\n --> src/app.py:11:12\n   |\n11 |     import os\n   |            ^^\n"
+        assert parse_findings("ruff", output) == [Finding("ruff", "src/app.py", 11, 12, "F401", "warning", "`os` imported but unused")]
+
+    def test_eslint_stylish_with_absolute_paths(self, tmp_path):
+        output = f"{tmp_path}/src/app.js\n  4:7  error  'x' is assigned a value but never used  no-unused-vars\n\n✖ 1 problem (1 error, 0 warnings)\n"
+        assert parse_findings("eslint", output, str(tmp_path)) == [
+            Finding("eslint", "src/app.js", 4, 7, "no-unused-vars", "error", "'x' is assigned a value but never used"),
+        ]
+
+    def test_tsc_plain_and_pretty(self):
+        output = "src/a.ts(3,5): error TS2322: Type 'string' is not assignable to type 'number'.\nsrc/b.ts:8:1 - error TS2304: Cannot find name 'y'.\n"
+        assert [(f.path, f.line, f.code) for f in parse_findings("tsc", output)] == [("src/a.ts", 3, "TS2322"), ("src/b.ts", 8, "TS2304")]
+
+    def test_clippy(self):
+        output = (
+            "warning: unneeded `return` statement\n --> src/main.rs:4:5\n  |\n4 |     return x;\n  |     ^^^^^^^^^\n"
+            "  = note: `#[warn(clippy::needless_return)]` on by default\n\n"
+            "error[E0308]: mismatched types\n --> src/lib.rs:9:12\n\n"
+            "warning: `demo` (bin \"demo\") generated 1 warning\n"
+        )
+        assert parse_findings("clippy", output) == [
+            Finding("clippy", "src/main.rs", 4, 5, None, "warning", "unneeded `return` statement"),
+            Finding("clippy", "src/lib.rs", 9, 12, "E0308", "error", "mismatched types"),
+        ]
+
+    def test_recognized_commands(self):
+        assert lint_tool("uv run ruff check .") == "ruff"
+        assert lint_tool("npx --yes eslint src") == "eslint"
+        assert lint_tool("pnpm exec tsc --noEmit") == "tsc"
+        assert lint_tool("cargo clippy --all-targets") == "clippy"
+        assert lint_tool("npm run lint") == "lint"
+        assert lint_tool("pytest -q") is None
+
+
+class TestScopeResult:
+    def test_keeps_only_findings_in_changed_hunks(self):
+        result = {"exit_code": 1, "stdout": RUFF, "stderr": "", "stdout_lines": 4, "stderr_lines": 0}
+        scoped = scope_result("ruff check .", result, parse_diff(DIFF))
+        assert scoped == {
+            "exit_code": 1,
+            "tool": "ruff",
+            "findings": {"src/app.py": [{"line": 11, "column": 12, "code": "F401", "severity": "warning", "message": "`os` imported but unused"}]},
+            "findings_total": 3,
+            "findings_outside_diff": 2,
+        }
+
+    def test_type_checker_keeps_errors_in_unchanged_callers(self):
+        diff = (
+            "diff --git a/src/app.py b/src/app.py\n--- a/src/app.py\n+++ b/src/app.py\n"
+            "@@ -1,2 +1,2 @@\n-def parse(value: str) -> int:\n+def parse(value: int) -> int:\n     return int(value)\n"
+        )
+        output = (
+            "src/legacy.py:7: error: Missing return statement  [return]\n"
+            'src/caller.py:12: error: Argument 1 to "parse" has incompatible type "str"; expected "int"  [arg-type]\n'
+            "Found 2 errors in 2 files (checked 4 source files)\n"
+        )
+        scoped = scope_result("mypy src", {"exit_code": 1, "stdout": output, "stderr": ""}, parse_diff(diff))
+
+        assert scoped["findings"] == {}
+        assert scoped["findings_outside_diff"] == 2
+        # The caller broken by the new signature comes first
+        assert scoped["findings_elsewhere"] == [
+            'src/caller.py:12: Argument 1 to "parse" has incompatible type "str"; expected "int"',
+            "src/legacy.py:7: Missing return statement",
+        ]
+        # File-level linters can't report errors caused elsewhere
+        ruff = scope_result("ruff check .", {"exit_code": 1, "stdout": RUFF, "stderr": ""}, parse_diff(DIFF))
+        assert "findings_elsewhere" not in ruff
+
+    def test_other_output_is_unchanged(self):
+        index = parse_diff(DIFF)
+        clean = {"exit_code": 0, "stdout": "All checks passed!\n", "stderr": ""}
+        assert scope_result("ruff check .", clean, index) is clean
+        tests = {"exit_code": 1, "stdout": "src/app.py:11: AssertionError\n", "stderr": ""}
+        assert scope_result("pytest -q", tests, index) is tests
+
+
+class TestScopeCommand:
+    def test_narrows_directory_targets_to_changed_files(self, tmp_path):
+        (tmp_path / "src").mkdir()
+        for name in ("src/app.py", "src/util.py", "setup.py"):
+            (tmp_path / name).write_text("")
+        changed = ["src/app.py", "setup.py", "README.md", "src/deleted.py"]
+
+        assert scope_command("uv run ruff check src --select E", changed, str(tmp_path)) == "uv run ruff check --select E --force-exclude src/app.py"
+        assert scope_command("flake8", changed, str(tmp_path)) == "flake8 setup.py src/app.py"
+        assert scope_command("eslint .", changed, str(tmp_path)) is None
+
+    def test_leaves_file_targets_and_type_checkers(self, tmp_path):
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "app.py").write_text("")
+        assert scope_command("ruff check src/app.py", ["src/app.py"], str(tmp_path)) is None
+        assert scope_command("ruff format .", ["src/app.py"], str(tmp_path)) is None
+        assert scope_command("mypy src", ["src/app.py"], str(tmp_path)) is None
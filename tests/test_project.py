@@ -0,0 +1,154 @@
+import json
+from pr_review_agent.agent.orchestrator import ReviewOrchestrator
+from pr_review_agent.index import index_exists, repo_index
+from pr_review_agent.project import detect_project, speculative_checks
+from pr_review_agent.schemas import DiffFileStat, ModelSettings, ReviewRequest
+
+PYPROJECT = '''
+[project]
+name = "demo"
+dependencies = ["requests>=2"]
+
+[dependency-groups]
+dev = ["pytest>=8", "mypy"]
+
+[tool.ruff]
+line-length = 100
+'''
+
+WORKFLOW = '''
+jobs:
+  test:
+    steps:
+      - uses: actions/checkout@v4
+      - run: uv sync
+      - run: uv run pytest -q
+      - name: Lint
+        run: |
+          uv run ruff check .
+          echo done
+'''
+
+
+class TestDetectProject:
+    def test_python_uv_project(self, tmp_path):
+        (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+        (tmp_path / "uv.lock").write_text("")
+        (tmp_path / "src").mkdir()
+        (tmp_path / ".github" / "workflows").mkdir(parents=True)
+        (tmp_path / ".github" / "workflows" / "ci.yml").write_text(WORKFLOW)
+
+        profile = detect_project(str(tmp_path))
+
+        assert profile == {
+            "languages": ["python"],
+            "package_managers": ["uv"],
+            "manifests": ["pyproject.toml", "uv.lock"],
+            "commands": {"test": ["uv run pytest -q"], "lint": ["uv run ruff check ."], "typecheck": ["uv run mypy src"]},
+            "ci": [".github/workflows/ci.yml"],
+            "ci_commands": ["uv run pytest -q", "uv run ruff check ."],
+        }
+
+    def test_node_scripts_and_lockfile(self, tmp_path):
+        (tmp_path / "package.json").write_text(json.dumps({
+            "scripts": {"test": "vitest run", "lint": "eslint src"},
+            "devDependencies": {"typescript": "^5", "eslint": "^9"},
+        }))
+        (tmp_path / "pnpm-lock.yaml").write_text("")
+
+        profile = detect_project(str(tmp_path))
+
+        assert profile["languages"] == ["typescript"]
+        assert profile["package_managers"] == ["pnpm"]
+        assert profile["commands"] == {"test": ["pnpm run test"], "lint": ["pnpm run lint"], "typecheck": ["pnpm exec tsc --noEmit"]}
+
+    def test_npm_placeholder_test_script_is_ignored(self, tmp_path):
+        (tmp_path / "package.json").write_text(json.dumps({
+            "scripts": {"test": "echo \"Error: no test specified\" && exit 1"},
+            "devDependencies": {"jest": "^29"},
+        }))
+
+        assert detect_project(str(tmp_path))["commands"] == {"test": ["npx --yes jest"]}
+
+    def test_polyglot_repo_with_makefile(self, tmp_path):
+        (tmp_path / "Cargo.toml").write_text("[package]\nname = \"demo\"\n")
+        (tmp_path / "go.mod").write_text("module example.com/demo\n")
+        (tmp_path / "Makefile").write_text("VAR := 1\ntest: build\n\tcargo test\nlint:\n\tcargo clippy\n")
+
+        profile = detect_project(str(tmp_path))
+
+        assert profile["languages"] == ["rust", "go"]
+        assert profile["commands"]["test"] == ["cargo test", "go test ./...", "make test"]
+        assert profile["commands"]["lint"] == ["cargo clippy --all-targets", "go vet ./...", "make lint"]
+
+    def test_unknown_project(self, tmp_path):
+        (tmp_path / "index.html").write_text("<html></html>")
+        (tmp_path / "pyproject.toml.bak").write_text("")
+
+        assert detect_project(str(tmp_path)) == {}
+        assert detect_project(str(tmp_path / "missing")) == {}
+
+    def test_invalid_manifests_do_not_raise(self, tmp_path):
+        (tmp_path / "pyproject.toml").write_text("[project\n")
+        (tmp_path / "package.json").write_text("{not json")
+
+        assert detect_project(str(tmp_path))["languages"] == ["python", "javascript"]
+
+
+class TestSpeculativeChecks:
+    PROFILE = {
+        "languages": ["typescript", "python"],
+        "commands": {"test": ["pnpm run test", "uv run pytest -q"], "lint": ["pnpm run lint"], "typecheck": ["pnpm exec tsc --noEmit"]},
+    }
+
+    def test_first_command_per_kind(self):
+        assert speculative_checks(self.PROFILE, ["src/app.js"]) == ["pnpm run test", "pnpm run lint", "pnpm exec tsc --noEmit"]
+        assert speculative_checks(self.PROFILE, ["src/app.js"], limit=1) == ["pnpm run test"]
+
+    def test_nothing_when_change_is_outside_the_profile(self):
+        assert speculative_checks(self.PROFILE, ["README.md", "main.go"]) == []
+
+
+class TestOrchestratorProfile:
+    def test_profile_in_repo_facts(self, tmp_path, mock_groq_client):
+        (tmp_path / "go.mod").write_text("module example.com/demo\n")
+
+        def facts(detect: bool):
+            request = ReviewRequest(repo_root=str(tmp_path), mode="staged", diff="", settings=ModelSettings(detect_project=detect))
+            return ReviewOrchestrator(request, mock_groq_client).initial_state.repo_facts
+
+        assert facts(True)["project"]["languages"] == ["go"]
+        assert "project" not in facts(False)
+
+    def test_speculative_checks_for_changed_languages(self, tmp_path, mock_groq_client):
+        (tmp_path / "go.mod").write_text("module example.com/demo\n")
+        request = ReviewRequest(
+            repo_root=str(tmp_path), mode="staged", diff="",
+            diff_stats=[DiffFileStat(path="main.go", added=1, removed=0)],
+            settings=ModelSettings(speculative_max_commands=2),
+        )
+
+        facts = ReviewOrchestrator(request, mock_groq_client).initial_state.repo_facts
+
+        assert facts["speculative_checks"] == ["go test ./...", "go vet ./..."]
+
+    def test_impacted_tests_narrow_speculative_run(self, git_repo, mock_groq_client):
+        (git_repo / "pyproject.toml").write_text('[project]\nname = "demo"\n\n[tool.pytest.ini_options]\n')
+        (git_repo / "tests").mkdir()
+        (git_repo / "tests" / "test_app.py").write_text("import app\n")
+        (git_repo / "tests" / "test_unrelated.py").write_text("")
+        request = ReviewRequest(
+            repo_root=str(git_repo), mode="staged", diff="",
+            diff_stats=[DiffFileStat(path="app.py", added=1, removed=0)],
+        )
+
+        # Not indexed yet: the review doesn't wait for a full index build
+        facts = ReviewOrchestrator(request, mock_groq_client).initial_state.repo_facts
+        assert "impacted_tests" not in facts
+        assert not index_exists(str(git_repo))
+
+        repo_index(str(git_repo)).refresh()
+        facts = ReviewOrchestrator(request, mock_groq_client).initial_state.repo_facts
+
+        assert facts["impacted_tests"] == {"selected": 1, "total_tests": 2, "commands": ["pytest -q tests/test_app.py"]}
+        assert facts["speculative_checks"] == ["pytest -q tests/test_app.py"]
@@ -0,0 +1,79 @@
+import json
+from unittest.mock import patch
+from pr_review_agent.cache import BlobStore
+from pr_review_agent.prompts.builder import PromptBuilder, compact_observation, compact_text, estimate_tokens
+from pr_review_agent.schemas import AgentState, ModelSettings
+
+
+def _pytest_log(lines=5000):
+    body = [f"tests/test_mod.py::test_{i} PASSED" for i in range(lines)]
+    body[2500] = "E   AssertionError: expected 1, got 2"
+    return "\n".join(["============ test session starts ============"] + body + ["==== 1 failed, 4999 passed ===="])
+
+
+class TestCompaction:
+    def test_short_text_untouched(self):
+        assert compact_text("ok", 10) == "ok"
+
+    def test_keeps_head_tail_and_error_lines(self):
+        compacted = compact_text(_pytest_log(), 300)
+
+        assert estimate_tokens(compacted) <= 330
+        assert compacted.startswith("============ test session starts")
+        assert compacted.endswith("==== 1 failed, 4999 passed ====")
+        assert "AssertionError: expected 1, got 2" in compacted
+        assert "lines omitted" in compacted
+
+    def test_observation_keeps_exit_code(self):
+        observation = {"tool": "run_command", "result": {"exit_code": 1, "stdout": _pytest_log(), "stderr": ""}}
+
+        compacted = compact_observation(observation, 200)
+
+        assert compacted["result"]["exit_code"] == 1
+        assert len(compacted["result"]["stdout"]) < len(observation["result"]["stdout"])
+
+    def test_blob_compacted_without_reading_it_whole(self):
+        store = BlobStore.temporary()
+        log = _pytest_log()
+        observation = {"tool": "run_command", "result": store.offload({"exit_code": 1, "stdout": log, "stderr": ""}, 4096)}
+
+        try:
+            with patch.object(store, "resolve", side_effect=AssertionError), patch.object(store, "text", side_effect=AssertionError):
+                compacted = compact_observation(observation, 300, store)
+        finally:
+            store.close()
+
+        stdout = compacted["result"]["stdout"]
+        assert estimate_tokens(stdout) <= 330
+        assert stdout.startswith("============ test session starts")
+        assert stdout.endswith("==== 1 failed, 4999 passed ====")
+        assert "E   AssertionError: expected 1, got 2" in stdout
+        assert "bytes omitted" in stdout
+
+
+class TestPromptBuilder:
+    def test_planning_prompt_stays_within_budgets(self):
+        settings = ModelSettings(prompt_diff_tokens=500, prompt_observation_tokens=800, prompt_facts_tokens=100)
+        observations = [
+            {"tool": "run_command", "args": {"command": "pytest"}, "iteration": i,
+             "result": {"exit_code": 1, "stdout": _pytest_log(), "stderr": ""}}
+            for i in range(7)
+        ]
+        state = AgentState(diff="+x\n" * 10000, tool_observations=observations, repo_facts={"language": "python"})
+
+        prompt, usage = PromptBuilder(settings).planning(state)
+
+        assert usage["diff"] <= 550
+        assert usage["observations"] <= 800
+        assert usage["facts"] <= 100
+        assert usage["total"] == estimate_tokens(prompt)
+        assert "diff truncated" in prompt
+
+    def test_review_prompt_renders_observations_as_json(self):
+        observation = {"tool": "run_command", "args": {"command": "ruff check"}, "result": {"exit_code": 0}}
+        state = AgentState(diff="+x\n", tool_observations=[observation])
+
+        prompt, usage = PromptBuilder(ModelSettings()).review(state)
+
+        assert json.dumps(observation) in prompt
+        assert set(usage) == {"diff", "observations", "reflections", "total"}
@@ -0,0 +1,134 @@
+import os
+import socket
+import threading
+import pytest
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+from pr_review_agent.schemas import ModelSettings, ReviewRequest
+from pr_review_agent.server import (
+    ReviewService, ServerBusy, ServerUnavailable, forward_review, make_server, server_health
+)
+
+
+@pytest.fixture
+def running_server(tmp_path, mock_groq_client):
+    service = ReviewService(workers=1)
+    service.client_for = lambda model: mock_groq_client
+    address = str(tmp_path / "server.sock")
+    server = make_server(service, address)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, address
+    server.shutdown()
+    server.server_close()
+
+
+@contextmanager
+def fake_server(address, reply):
+    """Serve one connection on `address`, answering with the raw bytes `reply`."""
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(1)
+
+    def answer():
+        connection, _ = listener.accept()
+        with connection:
+            connection.recv(65536)
+            connection.sendall(reply)
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        thread.join(timeout=5)
+        listener.close()
+
+
+class TestReviewServer:
+    def test_forwards_review(self, running_server, mock_groq_client):
+        service, address = running_server
+        mock_groq_client.chat_completion.side_effect = [
+            '{"hypotheses": [], "tools": []}',
+            '{"summary": ["from server"], "comments": []}',
+        ]
+        request = ReviewRequest(repo_root=".", mode="staged", diff="diff --git a/x b/x\n", settings=ModelSettings(tool_cache=False))
+
+        response = forward_review(request, address)
+
+        assert response.summary == ["from server"]
+        assert server_health(address)["completed"] == 1
+
+    def test_failed_review_is_reported(self, running_server, mock_groq_client):
+        _, address = running_server
+        mock_groq_client.chat_completion.side_effect = ValueError("boom")
+        request = ReviewRequest(repo_root=".", mode="staged", diff="x", settings=ModelSettings(tool_cache=False))
+
+        with pytest.raises(RuntimeError, match="boom"):
+            forward_review(request, address)
+
+    def test_unavailable_without_server(self, tmp_path, basic_review_request):
+        with pytest.raises(ServerUnavailable):
+            forward_review(basic_review_request, str(tmp_path / "missing.sock"))
+        assert server_health(str(tmp_path / "missing.sock")) is None
+
+    def test_dropped_connection_is_unavailable(self, tmp_path, basic_review_request):
+        address = str(tmp_path / "server.sock")
+        with fake_server(address, b""):
+            with pytest.raises(ServerUnavailable, match="dropped"):
+                forward_review(basic_review_request, address)
+
+    def test_invalid_body_is_a_failure(self, tmp_path, basic_review_request):
+        address = str(tmp_path / "server.sock")
+        with fake_server(address, b"HTTP/1.0 200 OK\r\nContent-Length: 9\r\n\r\nnot json!"):
+            with pytest.raises(RuntimeError, match="invalid body"):
+                forward_review(basic_review_request, address)
+
+    def test_rejects_when_queue_is_full(self, basic_review_request):
+        service = ReviewService(workers=1, max_pending=0)
+        service.stats["active"] = 1
+
+        with pytest.raises(ServerBusy):
+            service.review(basic_review_request)
+        assert service.stats["rejected"] == 1
+
+    def test_busy_server_is_unavailable(self, running_server, basic_review_request):
+        service, address = running_server
+        service.max_pending = 0
+        service.stats["active"] = 1
+
+        with pytest.raises(ServerUnavailable, match="busy"):
+            forward_review(basic_review_request, address)
+        assert service.stats["rejected"] == 1
+
+    def test_server_settings_decide_unsafe_mode(self, mock_groq_client, basic_review_request):
+        service = ReviewService(workers=1)
+        service.client_for = lambda model: mock_groq_client
+        seen = []
+        request = basic_review_request.model_copy(update={"settings": ModelSettings(unsafe_mode=True, tool_cache=False)})
+
+        with patch("pr_review_agent.agent.orchestrator.ReviewOrchestrator") as orchestrator:
+            orchestrator.side_effect = lambda request, *args, **kwargs: seen.append(request) or MagicMock()
+            service.review(request)
+
+        assert seen[0].settings.unsafe_mode is False
+
+    def test_tcp_needs_token_off_loopback(self, monkeypatch):
+        monkeypatch.delenv("PR_AGENT_SERVER_TOKEN", raising=False)
+        with pytest.raises(ValueError, match="token"):
+            make_server(ReviewService(), "http://0.0.0.0:0")
+
+    def test_token_is_required_when_set(self, tmp_path, monkeypatch):
+        address = str(tmp_path / "server.sock")
+        server = make_server(ReviewService(), address, token="secret")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            assert oct(os.stat(address).st_mode & 0o777) == oct(0o600)
+            monkeypatch.delenv("PR_AGENT_SERVER_TOKEN", raising=False)
+            assert server_health(address) is None
+            monkeypatch.setenv("PR_AGENT_SERVER_TOKEN", "secret")
+            assert server_health(address)["status"] == "ok"
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,56 @@
+from pr_review_agent.agent.sharding import merge_reviews, split_diff
+from pr_review_agent.diff import parse_diff
+from pr_review_agent.schemas import ReviewComment, ReviewResponse
+
+
+def _file_diff(name, hunks, lines_per_hunk=3):
+    out = [f"diff --git a/{name} b/{name}\n", f"--- a/{name}\n", f"+++ b/{name}\n"]
+    for h in range(hunks):
+        start = h * 100 + 1
+        out.append(f"@@ -{start},0 +{start},{lines_per_hunk} @@\n")
+        out.extend(f"+line {i}\n" for i in range(lines_per_hunk))
+    return "".join(out)
+
+
+class TestSplitDiff:
+    def test_small_files_are_packed_together(self):
+        diff = _file_diff("a.py", 1) + _file_diff("b.py", 1)
+
+        assert split_diff(parse_diff(diff), max_lines=100) == [diff]
+
+    def test_files_split_across_shards(self):
+        a, b = _file_diff("a.py", 1), _file_diff("b.py", 1)
+
+        assert split_diff(parse_diff(a + b), max_lines=8) == [a, b]
+
+    def test_oversized_file_split_by_hunk_with_header(self):
+        diff = _file_diff("big.py", 3)
+
+        shards = split_diff(parse_diff(diff), max_lines=8)
+
+        assert len(shards) == 3
+        for shard in shards:
+            assert shard.startswith("diff --git a/big.py b/big.py\n--- a/big.py\n+++ b/big.py\n@@")
+        # No hunk is lost or duplicated
+        assert sum(s.count("@@ -") for s in shards) == 3
+
+
+class TestMergeReviews:
+    def test_dedupes_comments_and_summary(self):
+        comment = dict(file="a.py", start_line=1, end_line=2, message="Possible bug")
+        first = ReviewResponse(
+            summary=["Adds feature"],
+            comments=[ReviewComment(severity="low", **comment)],
+        )
+        second = ReviewResponse(
+            summary=["adds  feature", "Touches b.py"],
+            comments=[
+                ReviewComment(severity="high", **{**comment, "message": "possible bug"}),
+                ReviewComment(file="b.py", severity="medium", message="Other"),
+            ],
+        )
+
+        merged = merge_reviews([first, second])
+
+        assert merged.summary == ["Adds feature", "Touches b.py"]
+        assert [(c.file, c.severity) for c in merged.comments] == [("a.py", "high"), ("b.py", "medium")]
@@ -0,0 +1,141 @@
+from pr_review_agent.agent.graph import ReviewGraph
+from pr_review_agent.schemas import AgentState, ModelSettings
+from pr_review_agent.shell import ShellPool, ShellSession
+
+
+class TestShellSession:
+    def test_keeps_cwd_and_environment(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        shell = ShellSession(str(tmp_path))
+        try:
+            shell.run("export GREETING=hello")
+            shell.run("cd sub")
+            result = shell.run("echo $GREETING; pwd")
+        finally:
+            shell.close()
+
+        assert result.exit_code == 0
+        assert result.stdout.text() == f"hello\n{tmp_path / 'sub'}\n"
+
+    def test_frames_exit_code_and_streams(self, tmp_path):
+        shell = ShellSession(str(tmp_path))
+        try:
+            failed = shell.run("echo out; echo err >&2; false")
+            partial = shell.run("printf 'no newline'")
+            syntax = shell.run("echo 'unbalanced")
+            after = shell.run("echo still here")
+        finally:
+            shell.close()
+
+        assert (failed.exit_code, failed.stdout.text(), failed.stderr.text()) == (1, "out\n", "err\n")
+        assert partial.stdout.text() == "no newline"
+        assert syntax.exit_code != 0
+        assert after.stdout.text() == "still here\n"
+
+    def test_timeout_kills_session(self, tmp_path):
+        shell = ShellSession(str(tmp_path))
+        result = shell.run("echo started; sleep 30", timeout=2)
+
+        assert result.timed_out and result.exit_code is None
+        assert result.stdout.text() == "started\n"
+        assert not shell.alive
+
+    def test_exit_ends_session(self, tmp_path):
+        shell = ShellSession(str(tmp_path))
+        result = shell.run("exit 3")
+
+        assert result.exit_code == 3
+        assert not shell.alive
+
+
+class TestShellPool:
+    def test_reuses_idle_session_and_recycles(self, tmp_path):
+        pool = ShellPool(max_commands=2)
+        try:
+            with pool.session(str(tmp_path)) as first:
+                first.run("export MARK=1")
+            with pool.session(str(tmp_path)) as second:
+                assert second.run("echo $MARK").stdout.text() == "1\n"
+            with pool.session(str(tmp_path)) as third:
+                # Two commands is the limit, so this is a fresh shell
+                assert third.run("echo ${MARK:-unset}").stdout.text() == "unset\n"
+        finally:
+            pool.close()
+
+        assert first is second and third is not first
+        assert pool.stats == {"started": 2, "reused": 1, "recycled": 1}
+
+    def test_replaces_dead_session(self, tmp_path):
+        pool = ShellPool()
+        try:
+            with pool.session(str(tmp_path)) as shell:
+                shell.run("sleep 30", timeout=0.2)
+            with pool.session(str(tmp_path)) as fresh:
+                assert fresh.run("echo ok").exit_code == 0
+        finally:
+            pool.close()
+
+        assert fresh is not shell
+
+    def test_review_shares_shell_across_iterations(self, mock_groq_client, basic_review_request, tmp_path):
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        try:
+            graph.execute_tools_step(AgentState(
+                diff="", iteration=0,
+                candidates=[{"name": "run_command", "args": {"command": "export VENV=active", "repo_root": str(tmp_path)}}],
+            ))
+            updates = graph.execute_tools_step(AgentState(
+                diff="", iteration=1,
+                candidates=[{"name": "run_command", "args": {"command": "echo $VENV", "repo_root": str(tmp_path)}}],
+            ))
+        finally:
+            graph.close()
+
+        assert updates["tool_observations"][0]["result"]["stdout"] == "active\n"
+
+    def test_commands_start_in_repo_root(self, mock_groq_client, basic_review_request, tmp_path):
+        (tmp_path / "sub").mkdir()
+        graph = ReviewGraph(basic_review_request, mock_groq_client)
+        try:
+            graph.execute_tools_step(AgentState(
+                diff="", iteration=0,
+                candidates=[{"name": "run_command", "args": {"command": "make -v >/dev/null; cd sub", "repo_root": str(tmp_path)}}],
+            ))
+            updates = graph.execute_tools_step(AgentState(
+                diff="", iteration=1,
+                candidates=[{"name": "run_command", "args": {"command": "pwd", "repo_root": str(tmp_path)}}],
+            ))
+        finally:
+            graph.close()
+
+        assert updates["tool_observations"][0]["result"]["stdout"] == f"{tmp_path}\n"
+
+    def test_planned_commands_overlap(self, mock_groq_client, basic_review_request, tmp_path):
+        # Compound commands need unsafe mode
+        request = basic_review_request.model_copy(update={"settings": ModelSettings(unsafe_mode=True)})
+        graph = ReviewGraph(request, mock_groq_client)
+        command = "date +%s.%N; sleep 1; date +%s.%N"
+        candidates = [{"name": "run_command", "args": {"command": f"{command} # {i}", "repo_root": str(tmp_path)}} for i in range(2)]
+        try:
+            updates = graph.execute_tools_step(AgentState(diff="", candidates=candidates))
+        finally:
+            graph.close()
+
+        spans = [[float(t) for t in o["result"]["stdout"].split()] for o in updates["tool_observations"]]
+        # Each started before the other finished
+        assert spans[0][0] < spans[1][1] and spans[1][0] < spans[0][1]
+
+    def test_setup_command_orders_its_round(self, mock_groq_client, basic_review_request, tmp_path):
+        # Compound commands need unsafe mode
+        request = basic_review_request.model_copy(update={"settings": ModelSettings(unsafe_mode=True)})
+        graph = ReviewGraph(request, mock_groq_client)
+        candidates = [
+            {"name": "run_command", "args": {"command": "sleep 0.5; export STAGE=ready", "repo_root": str(tmp_path)}},
+            {"name": "run_command", "args": {"command": "echo $STAGE", "repo_root": str(tmp_path)}},
+        ]
+        try:
+            updates = graph.execute_tools_step(AgentState(diff="", candidates=candidates))
+        finally:
+            graph.close()
+
+        assert updates["tool_observations"][1]["result"]["stdout"] == "ready\n"
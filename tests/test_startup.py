@@ -0,0 +1,36 @@
+import json
+import subprocess
+import sys
+
+# Loaded only once there is a diff to review (see benchmarks/startup.py)
+HEAVY_MODULES = ["langgraph", "langchain_groq", "langchain_community", "langchain_core", "groq", "httpx"]
+
+REPORT = "import json, sys; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+
+
+def _heavy_modules_loaded(code: str) -> list:
+    result = subprocess.run(
+        [sys.executable, "-c", code + "\n" + REPORT.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartup:
+    def test_cli_import_is_light(self):
+        assert _heavy_modules_loaded("import pr_review_agent.cli") == []
+
+    def test_package_exports_are_lazy(self):
+        assert _heavy_modules_loaded("import pr_review_agent; pr_review_agent.ReviewRequest") == []
+
+    def test_no_changes_exits_before_loading_the_agent(self, git_repo, tmp_path):
+        code = (
+            "import sys\n"
+            f"sys.argv = ['pr-agent', 'review', '--repo-root', {str(git_repo)!r}, '--no-server']\n"
+            "from pr_review_agent.cli import main\n"
+            "try:\n"
+            "    main()\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        assert _heavy_modules_loaded(code) == []
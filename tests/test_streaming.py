@@ -0,0 +1,88 @@
+import json
+import pytest
+from pr_review_agent.agent.orchestrator import ReviewOrchestrator
+from pr_review_agent.agent.streaming import CommentStreamParser, extract_json_object
+
+REVIEW = {
+    "summary": ['mentions "comments": [{"file": "x"}] in text'],
+    "comments": [
+        {"file": "a.py", "start_line": 1, "end_line": 1, "severity": "low", "message": "brace } in message"},
+        {"file": "b.py", "start_line": 2, "end_line": 3, "severity": "high", "message": "m",
+         "suggestion": "x = {\"k\": [1]}"},
+    ],
+    "metadata": {"comments": [{"file": "ignored"}]},
+}
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestCommentStreamParser:
+    @pytest.mark.parametrize("size", [1, 4, 17, 10000])
+    def test_yields_each_comment_once_complete(self, size):
+        parser = CommentStreamParser()
+        files = []
+        for chunk in _chunks(json.dumps(REVIEW), size):
+            files += [c.file for c in parser.feed(chunk)]
+
+        assert files == ["a.py", "b.py"]
+
+    def test_comment_is_emitted_before_the_review_ends(self):
+        text = json.dumps(REVIEW)
+        cut = text.index('{"file": "b.py"')
+        parser = CommentStreamParser()
+
+        assert [c.file for c in parser.feed(text[:cut])] == ["a.py"]
+
+    def test_skips_reasoning_and_code_fences(self):
+        text = "<think>maybe {not json}</think>\n```json\n" + json.dumps(REVIEW) + "\n```"
+        parser = CommentStreamParser()
+
+        assert len([c for chunk in _chunks(text, 5) for c in parser.feed(chunk)]) == 2
+        assert json.loads(extract_json_object(text)) == REVIEW
+
+
+class TestOrchestratorStream:
+    def test_streams_progress_and_comments(self, mock_groq_client, basic_review_request):
+        mock_groq_client.chat_completion.return_value = '{"hypotheses": ["h"], "tools": []}'
+        mock_groq_client.stream_chat_completion.return_value = iter(_chunks(json.dumps(REVIEW), 8))
+
+        events = list(ReviewOrchestrator(basic_review_request, mock_groq_client).stream())
+
+        assert [e["event"] for e in events] == ["plan", "comment", "comment", "review"]
+        assert events[0]["hypotheses"] == ["h"]
+        assert events[1]["comment"]["file"] == "a.py"
+        assert [c["file"] for c in events[-1]["review"]["comments"]] == ["a.py", "b.py"]
+
+    def test_unparsable_stream_falls_back_to_json_mode(self, mock_groq_client, basic_review_request):
+        mock_groq_client.chat_completion.side_effect = ['{"hypotheses": [], "tools": []}', json.dumps(REVIEW)]
+        mock_groq_client.stream_chat_completion.return_value = iter(["Sorry, I can't produce JSON here."])
+
+        events = list(ReviewOrchestrator(basic_review_request, mock_groq_client).stream())
+
+        assert [c["file"] for c in events[-1]["review"]["comments"]] == ["a.py", "b.py"]
+        assert mock_groq_client.chat_completion.call_count == 2
+
+    def test_fallback_retracts_comments_the_review_drops(self, mock_groq_client, basic_review_request):
+        dropped = {"file": "c.py", "start_line": 5, "end_line": 5, "severity": "low", "message": "gone"}
+        kept = REVIEW["comments"][0]
+        mock_groq_client.chat_completion.side_effect = ['{"hypotheses": [], "tools": []}', json.dumps(REVIEW)]
+        # Both comments complete, then the reply breaks off before the object closes
+        truncated = json.dumps({"summary": [], "comments": [kept, dropped]})[:-2]
+        mock_groq_client.stream_chat_completion.return_value = iter(_chunks(truncated, 8))
+
+        events = list(ReviewOrchestrator(basic_review_request, mock_groq_client).stream())
+
+        assert [(e["event"], e.get("comment", {}).get("file")) for e in events[1:]] == [
+            ("comment", "a.py"), ("comment", "c.py"), ("retract", "c.py"), ("comment", "b.py"), ("review", None),
+        ]
+        assert [c["file"] for c in events[-1]["review"]["comments"]] == ["a.py", "b.py"]
+
+    def test_run_does_not_stream(self, mock_groq_client, basic_review_request):
+        mock_groq_client.chat_completion.side_effect = ['{"hypotheses": [], "tools": []}', json.dumps(REVIEW)]
+
+        review = ReviewOrchestrator(basic_review_request, mock_groq_client).run()
+
+        assert len(review.comments) == 2
+        mock_groq_client.stream_chat_completion.assert_not_called()
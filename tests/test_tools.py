@@ -1,7 +1,13 @@
+import io
+import subprocess
+import sys
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
+from pr_review_agent.process import MAX_OUTPUT_BYTES, CommandResult, OutputCapture, run_bounded
 from pr_review_agent.tools.terminal import SecurityManager, run_command
-from pr_review_agent.tools.git import git_diff
+from pr_review_agent.tools.git import FileStat, git_diff, read_diff
 
 class TestSecurityManager:
     def test_safe_command(self):
@@ -23,23 +29,21 @@ class TestSecurityManager:
             assert "Forbidden pattern" in reason
 
 class TestRunCommand:
-    @patch("subprocess.run")
-    def test_run_command_success(self, mock_run):
-        mock_run.return_value = MagicMock(returncode=0, stdout="output", stderr="")
-        
+    def test_run_command_success(self):
         result = run_command.invoke({"command": "echo hello"})
         
         assert result["exit_code"] == 0
-        assert result["stdout"] == "output"
-        mock_run.assert_called_once()
+        assert result["stdout"] == "hello\n"
+        assert result["stdout_lines"] == 1
+        assert "truncated" not in result
     
     def test_run_command_security_block(self):
         result = run_command.invoke({"command": "rm -rf /"})
         assert "Security Error" in result["error"]
 
-    @patch("subprocess.run")
+    @patch("pr_review_agent.tools.terminal.run_bounded")
     def test_run_command_unsafe_override(self, mock_run):
-        mock_run.return_value = MagicMock(returncode=0, stdout="deleted", stderr="")
+        mock_run.return_value = CommandResult(0, OutputCapture(), OutputCapture(), False)
         
         # Should proceed because unsafe_mode=True
         result = run_command.invoke({"command": "rm -rf /", "unsafe_mode": True})
@@ -47,22 +51,121 @@ class TestRunCommand:
         assert result["exit_code"] == 0
         mock_run.assert_called_once()
 
+    def test_large_output_keeps_head_and_tail(self, tmp_path):
+        script = tmp_path / "noisy.py"
+        script.write_text("for i in range(200000):\n    print(f'line {i}')\n")
+
+        result = run_command.invoke({"command": f"{sys.executable} {script}", "repo_root": str(tmp_path)})
+
+        assert result["exit_code"] == 0
+        assert result["truncated"] == ["stdout"]
+        assert result["stdout_lines"] == 200000
+        assert len(result["stdout"]) < MAX_OUTPUT_BYTES + 200
+        assert result["stdout"].startswith("line 0\n")
+        assert result["stdout"].endswith("line 199999\n")
+        assert "bytes omitted" in result["stdout"]
+
+    def test_timeout_kills_the_process_group(self, tmp_path):
+        marker = tmp_path / "survived"
+        # The grandchild would outlive a kill of just the shell
+        script = tmp_path / "spawn.py"
+        script.write_text(
+            "import subprocess, sys, time\n"
+            "subprocess.Popen([sys.executable, '-c', 'import sys, time; time.sleep(2); open(sys.argv[1], \"w\")', sys.argv[1]])\n"
+            "print('started', flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        chunks = []
+
+        result = run_bounded(f"{sys.executable} {script} {marker}", cwd=str(tmp_path), timeout=1,
+                             on_output=lambda stream, text: chunks.append((stream, text)))
+
+        assert result.timed_out and result.exit_code is None
+        assert result.stdout.text() == "started\n"
+        assert "".join(text for stream, text in chunks if stream == "stdout") == "started\n"
+        time.sleep(2.5)
+        assert not marker.exists()
+
+    def test_niceness_and_cancel(self, tmp_path):
+        cancel = threading.Event()
+        # `; true` makes the shell fork the child right away instead of exec-ing it
+        niced = run_bounded(f"{sys.executable} -c 'import os; print(os.nice(0))'; true", cwd=str(tmp_path), niceness=5, cancel=cancel)
+        threading.Timer(0.2, cancel.set).start()
+        start = time.monotonic()
+
+        cancelled = run_bounded("echo started; sleep 30", cwd=str(tmp_path), cancel=cancel)
+
+        assert int(niced.stdout.text()) >= 5 and niced.exit_code == 0
+        assert cancelled.cancelled and not cancelled.timed_out and cancelled.exit_code is None
+        assert cancelled.stdout.text() == "started\n"
+        assert time.monotonic() - start < 5
+
+def _fake_popen(stdout=b""):
+    proc = MagicMock()
+    proc.stdout = io.BytesIO(stdout)
+    proc.wait.return_value = 0
+    return proc
+
 class TestGitDiff:
-    @patch("subprocess.run")
-    def test_staged_diff(self, mock_run):
-        mock_run.return_value = MagicMock(stdout="diff content")
+    @patch("subprocess.Popen")
+    def test_staged_diff(self, mock_popen):
+        mock_popen.return_value = _fake_popen()
         
         git_diff.invoke({"repo_root": ".", "mode": "staged"})
         
-        args = mock_run.call_args[0][0]
+        args = mock_popen.call_args[0][0]
         assert "diff" in args
         assert "--cached" in args
 
-    @patch("subprocess.run")
-    def test_branch_diff(self, mock_run):
-        mock_run.return_value = MagicMock(stdout="diff content")
+    @patch("subprocess.Popen")
+    def test_branch_diff(self, mock_popen):
+        mock_popen.return_value = _fake_popen()
         
         git_diff.invoke({"repo_root": ".", "mode": "branch", "base_ref": "feature-branch"})
         
-        args = mock_run.call_args[0][0]
+        args = mock_popen.call_args[0][0]
         assert "feature-branch" in args
+
+    def test_commit_range_requires_refs(self):
+        with pytest.raises(ValueError):
+            read_diff(".", "commit-range", base_ref="main")
+
+class TestReadDiff:
+    def test_patch_and_numstat_in_one_pass(self, git_repo):
+        (git_repo / "app.py").write_text("print('hello')\nprint('bye')\n")
+        subprocess.run(["git", "-C", str(git_repo), "mv", "app.py", "main.py"], check=True)
+        subprocess.run(["git", "-C", str(git_repo), "add", "-A"], check=True)
+
+        with patch("subprocess.Popen", wraps=subprocess.Popen) as popen:
+            output = read_diff(str(git_repo), "staged")
+
+        assert popen.call_count == 1
+        assert output.files == [FileStat("main.py", "app.py", 1, 0)]
+        assert output.text.startswith("diff --git a/app.py b/main.py\n")
+        assert "+print('bye')\n" in output.text
+        assert output.truncated_files == []
+
+    def test_per_file_cap_keeps_headers(self, git_repo):
+        (git_repo / "big.lock").write_text("".join(f"line {i}\n" for i in range(5000)))
+        (git_repo / "small.py").write_text("x = 1\n")
+        subprocess.run(["git", "-C", str(git_repo), "add", "-A"], check=True)
+
+        output = read_diff(str(git_repo), "staged", max_file_bytes=1024)
+
+        assert output.truncated_files == ["big.lock"]
+        assert [f.added for f in output.files] == [5000, 1]
+        assert "+++ b/big.lock\n" in output.text
+        assert "\\ [pr-review-agent] truncated" in output.text
+        assert "+x = 1\n" in output.text
+
+    def test_total_cap_stops_reading(self, git_repo):
+        for name in ("a.txt", "b.txt"):
+            (git_repo / name).write_text("".join(f"{name} {i}\n" for i in range(2000)))
+        subprocess.run(["git", "-C", str(git_repo), "add", "-A"], check=True)
+
+        output = read_diff(str(git_repo), "staged", max_total_bytes=4096)
+
+        assert output.total_bytes <= 4096
+        assert [f.path for f in output.files] == ["a.txt", "b.txt"]
+        assert output.truncated_files == ["a.txt", "b.txt"]
+        assert "total size cap" in output.text
@@ -0,0 +1,98 @@
+import json
+import threading
+from unittest.mock import patch
+from pr_review_agent.agent.orchestrator import ReviewOrchestrator
+from pr_review_agent.tracing import Tracer, in_context, span
+
+
+class TestTracer:
+    def test_span_is_noop_without_active_tracer(self):
+        tracer = Tracer()
+        with span("outside") as s:
+            s.set(ignored=True)
+
+        assert tracer.spans == []
+
+    def test_nested_spans_record_parent(self):
+        tracer = Tracer()
+        with tracer.activate():
+            with span("outer"):
+                with span("inner", n=1):
+                    pass
+
+        inner, outer = tracer.spans
+        assert inner.name == "inner" and inner.attrs == {"n": 1}
+        assert inner.parent_id == outer.id
+        assert outer.parent_id is None
+
+    def test_in_context_carries_tracer_to_threads(self):
+        tracer = Tracer()
+        with tracer.activate(), span("parent") as parent:
+            run = in_context(lambda: _record("child"))
+            threads = [threading.Thread(target=run) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        children = [s for s in tracer.spans if s.name == "child"]
+        assert len(children) == 3
+        assert all(s.parent_id == parent.id for s in children)
+
+    def test_summary_aggregates_llm_usage(self):
+        tracer = Tracer()
+        with tracer.activate():
+            with span("llm", model="a") as s:
+                s.set(status="rate_limited")
+            with span("llm", model="b") as s:
+                s.set(status="ok", input_tokens=100, output_tokens=20)
+
+        summary = tracer.summary()
+        assert summary["spans"]["llm"]["count"] == 2
+        assert summary["llm"]["retries"] == 1
+        assert summary["llm"]["by_model"]["b"]["input_tokens"] == 100
+
+    def test_exports_chrome_and_otel(self, tmp_path):
+        tracer = Tracer()
+        with tracer.activate(), span("plan"), span("llm", model="a", streamed=True):
+            pass
+
+        tracer.export(str(tmp_path / "trace.json"), "chrome")
+        events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+        assert [e["name"] for e in events] == ["llm", "plan"]
+        assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+        tracer.export(str(tmp_path / "otel.json"), "otel")
+        spans = json.loads((tmp_path / "otel.json").read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        llm, plan = spans
+        assert llm["parentSpanId"] == plan["spanId"]
+        assert {"key": "streamed", "value": {"boolValue": True}} in llm["attributes"]
+        assert int(llm["endTimeUnixNano"]) >= int(llm["startTimeUnixNano"])
+
+
+class TestReviewTimings:
+    def test_review_metadata_has_node_and_tool_timings(self, mock_groq_client, basic_review_request):
+        mock_groq_client.chat_completion.side_effect = [
+            json.dumps({"hypotheses": [], "tools": [{"name": "run_command", "args": {"command": "ls"}}]}),
+            json.dumps({"hypotheses": [], "tools": []}),
+            json.dumps({"summary": ["ok"], "comments": []}),
+        ]
+        orchestrator = ReviewOrchestrator(basic_review_request, mock_groq_client)
+
+        with patch("pr_review_agent.agent.graph.run_command") as mock_run:
+            mock_run.invoke.return_value = {"exit_code": 0, "stdout": "", "stderr": ""}
+            response = orchestrator.run()
+
+        spans = response.metadata["timings"]["spans"]
+        assert spans["plan"]["count"] == 2
+        assert spans["execute_tools"]["count"] == 1
+        assert spans["tool:run_command"]["count"] == 1
+        assert spans["review"]["count"] == 1
+        tool = next(s for s in orchestrator.tracer.spans if s.name == "tool:run_command")
+        execute = next(s for s in orchestrator.tracer.spans if s.name == "execute_tools")
+        assert tool.parent_id == execute.id
+
+
+def _record(name):
+    with span(name):
+        pass